@@ -3,6 +3,7 @@ import datetime
 from sqlalchemy import (
     and_,
     or_,
+    Select,
     select,
     update as update_,
     delete as delete_,
@@ -61,22 +62,25 @@ async def delete(
     return result.scalars().first()
 
 
-async def get_first_unfinished(
-    session: AsyncSession, user_id: str | int, activity_name: str
-) -> DiscordActivitySession | None:
-    user_id = str(user_id)
-    stmt = (
+def first_unfinished_stmt(user_id: str | int, activity_name: str) -> Select:
+    return (
         select(DiscordActivitySession)
         .where(
             and_(
-                user_id == DiscordActivitySession.user_id,
+                str(user_id) == DiscordActivitySession.user_id,
                 activity_name == DiscordActivitySession.activity_name,
+                DiscordActivitySession.finished_at.is_(None),
             )
         )
         .order_by(DiscordActivitySession.started_at.desc())
         .limit(1)
     )
-    result = await session.execute(stmt)
+
+
+async def get_first_unfinished(
+    session: AsyncSession, user_id: str | int, activity_name: str
+) -> DiscordActivitySession | None:
+    result = await session.execute(first_unfinished_stmt(user_id, activity_name))
     return result.scalars().first()
 
 
@@ -107,7 +111,7 @@ async def get_list(
         if unfinished:
             where_stmts.append(DiscordActivitySession.finished_at.is_(None))
         else:
-            where_stmts.extend(DiscordActivitySession.finished_at.isnot(None))
+            where_stmts.append(DiscordActivitySession.finished_at.isnot(None))
 
     stmt = select(DiscordActivitySession).where(and_(*where_stmts))
     result = await session.scalars(stmt)
@@ -0,0 +1,200 @@
+"""
+Measures the open session lookups with and without the partial indexes
+on `finished_at IS NULL`.
+
+Every user gets `--rows` finished sessions and one open session in all
+four session tables, then every lookup is run with EXPLAIN ANALYZE
+`--repeat` times. The partial indexes are dropped inside a savepoint
+and the lookups are measured again. Everything runs in one transaction
+that is rolled back, so the database is left as it was, but the DROP
+INDEX locks the session tables while it runs. Use a scratch database:
+
+    SRVC_CONFIG=etc/local.json python db_bench.py \\
+        --users 200 --rows 2000 --repeat 20 --out db.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Any
+
+from sqlalchemy import Select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import (
+    activity_sessions as activity_sessions_db,
+    status_sessions as status_sessions_db,
+    steam as steam_db,
+)
+from app.utils.config import Config
+from app.utils.db import init_db
+
+PARTIAL_INDEXES = (
+    "ix_discord_activity_sessions_user_id_activity_name_unfinished",
+    "ix_discord_status_sessions_user_id_status_unfinished",
+    "ix_steam_activity_sessions_user_id_activity_name_unfinished",
+    "ix_steam_status_sessions_user_id_status_unfinished",
+)
+
+SEED_DISCORD = """
+INSERT INTO {table} (started_at, finished_at, user_id, user_name, {column})
+SELECT started_at, started_at + interval '1 minute', 'bench-' || u, 'bench',
+       'bench-' || (g % 5)
+FROM generate_series(1, :users) u, generate_series(1, :rows) g,
+     LATERAL (SELECT now() at time zone 'utc'
+                     - make_interval(mins => (g * :days * 1440) / :rows)
+                     AS started_at) s
+UNION ALL
+SELECT now() at time zone 'utc', NULL, 'bench-' || u, 'bench', 'bench-0'
+FROM generate_series(1, :users) u
+"""
+
+SEED_STEAM = """
+INSERT INTO {table} (started_at, finished_at, user_id, steam_id, {column})
+SELECT started_at, started_at + interval '1 minute', su.id, su.steam_id,
+       'bench-' || (g % 5)
+FROM steam_users su, generate_series(1, :rows) g,
+     LATERAL (SELECT now() at time zone 'utc'
+                     - make_interval(mins => (g * :days * 1440) / :rows)
+                     AS started_at) s
+WHERE su.steam_id LIKE 'bench-%'
+UNION ALL
+SELECT now() at time zone 'utc', NULL, su.id, su.steam_id, 'bench-0'
+FROM steam_users su
+WHERE su.steam_id LIKE 'bench-%'
+"""
+
+
+async def seed(session: AsyncSession, args: argparse.Namespace):
+    params = {"users": args.users, "rows": args.rows, "days": args.days}
+    await session.execute(
+        text(
+            "INSERT INTO steam_users (steam_id, username) "
+            "SELECT 'bench-' || u, 'bench' FROM generate_series(1, :users) u"
+        ),
+        params,
+    )
+    for table, column in (
+        ("discord_activity_sessions", "activity_name"),
+        ("discord_status_sessions", "status"),
+    ):
+        await session.execute(
+            text(SEED_DISCORD.format(table=table, column=column)), params
+        )
+    for table, column in (
+        ("steam_activity_sessions", "activity_name"),
+        ("steam_status_sessions", "status"),
+    ):
+        await session.execute(
+            text(SEED_STEAM.format(table=table, column=column)), params
+        )
+    for table in (
+        "discord_activity_sessions",
+        "discord_status_sessions",
+        "steam_activity_sessions",
+        "steam_status_sessions",
+    ):
+        await session.execute(text(f"ANALYZE {table}"))
+
+
+async def lookups(session: AsyncSession) -> dict[str, Select]:
+    steam_user_id = await session.scalar(
+        text("SELECT id FROM steam_users WHERE steam_id = 'bench-1'")
+    )
+    return {
+        "discord_activity": activity_sessions_db.first_unfinished_stmt(
+            "bench-1", "bench-0"
+        ),
+        "discord_status": status_sessions_db.first_unfinished_stmt(
+            "bench-1", "bench-0"
+        ),
+        "steam_activity": steam_db.current_activity_stmt(steam_user_id),
+        "steam_status": steam_db.current_status_stmt(steam_user_id),
+    }
+
+
+def _indexes(plan: dict) -> set[str]:
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= _indexes(child)
+    return names
+
+
+async def measure(session: AsyncSession, stmt: Select, repeat: int) -> dict[str, Any]:
+    sql = str(
+        stmt.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    times, buffers, indexes = [], [], set()
+    for _ in range(repeat):
+        result = await session.execute(
+            text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+        )
+        [explain] = result.scalar()
+        plan = explain["Plan"]
+        times.append(explain["Execution Time"])
+        buffers.append(
+            plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+        )
+        indexes |= _indexes(plan)
+    return {
+        "execution_ms": statistics.median(times),
+        "buffers": statistics.median(buffers),
+        "indexes": sorted(indexes),
+    }
+
+
+async def run(args: argparse.Namespace, conf: Config) -> list[dict[str, Any]]:
+    db_helper = await init_db(conf.db)
+    results = []
+    try:
+        async with db_helper.get_session() as session:
+            try:
+                await seed(session, args)
+                stmts = await lookups(session)
+                for partial in (True, False):
+                    savepoint = await session.begin_nested()
+                    if not partial:
+                        for index in PARTIAL_INDEXES:
+                            await session.execute(text(f"DROP INDEX IF EXISTS {index}"))
+                    for name, stmt in stmts.items():
+                        result = {"lookup": name, "partial_indexes": partial}
+                        result |= await measure(session, stmt, args.repeat)
+                        print(
+                            f"{name} partial_indexes={partial}: "
+                            f"{result['execution_ms']:.3f}ms, "
+                            f"{result['buffers']} buffers, "
+                            f"indexes {', '.join(result['indexes']) or '-'}"
+                        )
+                        results.append(result)
+                    await savepoint.rollback()
+            finally:
+                await session.rollback()
+    finally:
+        await db_helper.close()
+    return results
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Open session lookup benchmark")
+    parser.add_argument("--config", default=os.environ.get("SRVC_CONFIG"))
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=2000, help="finished per user")
+    parser.add_argument("--days", type=int, default=60, help="history spread")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--out", help="JSON results file")
+    return parser
+
+
+def main(args: argparse.Namespace, conf: Config):
+    results = asyncio.run(run(args, conf))
+    if args.out:
+        with open(args.out, "w") as f:
+            report = {"timestamp": time.time(), "args": vars(args), "runs": results}
+            json.dump(report, f, indent=2)
+    return results
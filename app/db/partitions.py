@@ -0,0 +1,53 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DISCORD_SESSION_TABLES = (
+    "discord_activity_sessions",
+    "discord_status_sessions",
+)
+STEAM_SESSION_TABLES = (
+    "steam_activity_sessions",
+    "steam_status_sessions",
+)
+
+MONTHS_AHEAD = 3
+
+
+async def create_future(
+    session: AsyncSession, table: str, months_ahead: int = MONTHS_AHEAD
+) -> list[str]:
+    """Create monthly partitions from the current month up to `months_ahead`"""
+    result = await session.execute(
+        text("SELECT create_monthly_partitions(:parent, NULL, :months_ahead)"),
+        {"parent": table, "months_ahead": months_ahead},
+    )
+    names = list(result.scalars().all())
+    await session.commit()
+    return names
+
+
+async def drop_expired(
+    session: AsyncSession, table: str, keep_months: int
+) -> list[str]:
+    """Drop whole monthly partitions older than `keep_months`"""
+    result = await session.execute(
+        text("SELECT drop_monthly_partitions(:parent, :keep_months)"),
+        {"parent": table, "keep_months": keep_months},
+    )
+    names = list(result.scalars().all())
+    await session.commit()
+    return names
+
+
+async def maintain(
+    session: AsyncSession,
+    retention: dict[str, int | None],
+    months_ahead: int = MONTHS_AHEAD,
+) -> tuple[list[str], list[str]]:
+    """`retention` maps a table to the months it keeps, None keeps all"""
+    created, dropped = [], []
+    for table, keep_months in retention.items():
+        created += await create_future(session, table, months_ahead)
+        if keep_months:
+            dropped += await drop_expired(session, table, keep_months)
+    return created, dropped
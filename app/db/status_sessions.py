@@ -3,6 +3,7 @@ import datetime
 from sqlalchemy import (
     and_,
     or_,
+    Select,
     select,
     update as update_,
     delete as delete_,
@@ -85,31 +86,34 @@ async def get_list(
         )
     if unfinished is not None:
         if unfinished:
-            where_stmts.append(DiscordStatusSession.finished_at is None)
+            where_stmts.append(DiscordStatusSession.finished_at.is_(None))
         else:
-            where_stmts.extend(DiscordStatusSession.finished_at is not None)
+            where_stmts.append(DiscordStatusSession.finished_at.isnot(None))
 
     stmt = select(DiscordStatusSession).where(and_(*where_stmts))
     result = await session.scalars(stmt)
     return list(result.all())
 
 
-async def get_first_unfinished(
-    session: AsyncSession, user_id: str | int, status: str
-) -> DiscordStatusSession | None:
-    user_id = str(user_id)
-    stmt = (
+def first_unfinished_stmt(user_id: str | int, status: str) -> Select:
+    return (
         select(DiscordStatusSession)
         .where(
             and_(
-                user_id == DiscordStatusSession.user_id,
+                str(user_id) == DiscordStatusSession.user_id,
                 status == DiscordStatusSession.status,
+                DiscordStatusSession.finished_at.is_(None),
             )
         )
         .order_by(DiscordStatusSession.started_at.desc())
         .limit(1)
     )
-    result = await session.execute(stmt)
+
+
+async def get_first_unfinished(
+    session: AsyncSession, user_id: str | int, status: str
+) -> DiscordStatusSession | None:
+    result = await session.execute(first_unfinished_stmt(user_id, status))
     return result.scalars().first()
 
 
@@ -1,6 +1,7 @@
 import datetime
 
 from sqlalchemy import (
+    Select,
     select,
     and_,
     or_,
@@ -20,32 +21,46 @@ async def get_users(session: AsyncSession) -> list[SteamUser]:
     return list(result.all())
 
 
+def current_activity_stmt(user_id: int) -> Select:
+    return (
+        select(SteamActivitySession)
+        .where(
+            and_(
+                SteamActivitySession.user_id == user_id,
+                SteamActivitySession.finished_at.is_(None),
+            )
+        )
+        .order_by(SteamActivitySession.started_at.desc())
+        .limit(1)
+    )
+
+
 async def get_current_activity(
     session: AsyncSession, user_id: int
 ) -> SteamActivitySession | None:
-    stmt = select(SteamActivitySession).where(
-        and_(
-            SteamActivitySession.user_id == user_id,
-            SteamActivitySession.finished_at.is_(None),
+    result = await session.scalars(current_activity_stmt(user_id))
+    return result.first()
+
+
+def current_status_stmt(user_id: int) -> Select:
+    return (
+        select(SteamStatusSession)
+        .where(
+            and_(
+                SteamStatusSession.user_id == user_id,
+                SteamStatusSession.finished_at.is_(None),
+            )
         )
+        .order_by(SteamStatusSession.started_at.desc())
+        .limit(1)
     )
-    result = await session.scalars(stmt)
-    if result:
-        return result.first()
 
 
 async def get_current_status(
     session: AsyncSession, user_id: int
 ) -> SteamStatusSession | None:
-    stmt = select(SteamStatusSession).where(
-        and_(
-            SteamStatusSession.user_id == user_id,
-            SteamStatusSession.finished_at.is_(None),
-        )
-    )
-    result = await session.scalars(stmt)
-    if result:
-        return result.first()
+    result = await session.scalars(current_status_stmt(user_id))
+    return result.first()
 
 
 async def get_users_data(session: AsyncSession) -> list:
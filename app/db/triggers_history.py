@@ -1,9 +1,10 @@
-from sqlalchemy import select, or_, cast, String, and_
+from sqlalchemy import Select, select, or_, cast, Text, and_
 
 from app.models.triggers_history import TriggerHistory, TriggerAnswer
 from app.schemas.triggers_history import TriggersHistoryNew
 
 from app.utils import db
+from app.utils.consts import LIMIT_PER_PAGE
 
 
 async def create(session: db.Session, model: TriggersHistoryNew) -> TriggerHistory:
@@ -14,27 +15,49 @@ async def create(session: db.Session, model: TriggersHistoryNew) -> TriggerHisto
 
 
 async def get_list(
-    session: db.Session, q_words: list[str] | None = None
+    session: db.Session,
+    q_words: list[str] | None = None,
+    limit: int = LIMIT_PER_PAGE,
+    before_id: int | None = None,
 ) -> list[TriggerHistory]:
+    """
+    Newest first, keyset paginated by `before_id`.
+    Each word is matched by trigram indexes on vk_id, trigger and answer
+    """
+    result = await session.execute(list_stmt(q_words, limit, before_id))
+    return list(result.scalars().all())
+
+
+def list_stmt(
+    q_words: list[str] | None = None,
+    limit: int = LIMIT_PER_PAGE,
+    before_id: int | None = None,
+) -> Select:
     if q_words is None:
         q_words = []
 
-    search_fields = {
-        cast(TriggerHistory.vk_id, String),
-        TriggerAnswer.trigger,
-        TriggerAnswer.answer,
-        # KnowId.name
-    }
-
-    stmt = (
-        select(TriggerHistory)
-        .join(TriggerAnswer)
-        .where(
-            and_(
-                *[or_(*[s_f.ilike(f"%{q}%") for s_f in search_fields]) for q in q_words]
+    where_stmts = []
+    for q in q_words:
+        pattern = f"%{q}%"
+        answers_ids = select(TriggerAnswer.id).where(
+            or_(
+                TriggerAnswer.trigger.ilike(pattern),
+                TriggerAnswer.answer.ilike(pattern),
             )
         )
-    )
+        where_stmts.append(
+            or_(
+                TriggerHistory.trigger_answer_id.in_(answers_ids),
+                # Text renders as ::text, the expression of the trigram index
+                cast(TriggerHistory.vk_id, Text).ilike(pattern),
+            )
+        )
+    if before_id is not None:
+        where_stmts.append(TriggerHistory.id < before_id)
 
-    result = await session.execute(stmt)
-    return list(result.scalars().all())
+    return (
+        select(TriggerHistory)
+        .where(and_(*where_stmts))
+        .order_by(TriggerHistory.id.desc())
+        .limit(limit)
+    )
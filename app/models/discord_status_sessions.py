@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, TIMESTAMP, JSON, text
+from sqlalchemy import BigInteger, Index, TIMESTAMP, JSON, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -9,13 +9,23 @@ from .base import Base, utc_now_default
 
 class DiscordStatusSession(Base):
     __tablename__ = "discord_status_sessions"
+    __table_args__ = (
+        Index("ix_discord_status_sessions_user_id_started_at", "user_id", "started_at"),
+        Index(
+            "ix_discord_status_sessions_user_id_status_unfinished",
+            "user_id",
+            "status",
+            postgresql_where=text("finished_at IS NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (started_at)"},
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     started_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP, server_default=utc_now_default
+        TIMESTAMP, primary_key=True, server_default=utc_now_default
     )
     finished_at: Mapped[datetime | None] = mapped_column(TIMESTAMP, default=None)
-    user_id: Mapped[str] = mapped_column(index=True)
+    user_id: Mapped[str]
     user_name: Mapped[str]
     status: Mapped[str]
     extra_data: Mapped[dict | None] = mapped_column(
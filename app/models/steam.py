@@ -6,6 +6,7 @@ from sqlalchemy import (
     TIMESTAMP,
     text,
     ForeignKey,
+    Index,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import (
@@ -35,15 +36,23 @@ class SteamUser(Base):
 
 class SteamActivitySession(Base):
     __tablename__ = "steam_activity_sessions"
+    __table_args__ = (
+        Index("ix_steam_activity_sessions_user_id_started_at", "user_id", "started_at"),
+        Index(
+            "ix_steam_activity_sessions_user_id_activity_name_unfinished",
+            "user_id",
+            "activity_name",
+            postgresql_where=text("finished_at IS NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (started_at)"},
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     started_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP, server_default=utc_now_default
+        TIMESTAMP, primary_key=True, server_default=utc_now_default
     )
     finished_at: Mapped[datetime | None] = mapped_column(TIMESTAMP, default=None)
-    user_id: Mapped[int] = mapped_column(
-        ForeignKey("steam_users.id"), nullable=False, index=True
-    )
+    user_id: Mapped[int] = mapped_column(ForeignKey("steam_users.id"), nullable=False)
     steam_id: Mapped[str] = mapped_column(String, nullable=False)
     activity_name: Mapped[str]
     extra_data: Mapped[dict | None] = mapped_column(
@@ -65,15 +74,23 @@ class SteamActivitySession(Base):
 
 class SteamStatusSession(Base):
     __tablename__ = "steam_status_sessions"
+    __table_args__ = (
+        Index("ix_steam_status_sessions_user_id_started_at", "user_id", "started_at"),
+        Index(
+            "ix_steam_status_sessions_user_id_status_unfinished",
+            "user_id",
+            "status",
+            postgresql_where=text("finished_at IS NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (started_at)"},
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     started_at: Mapped[datetime] = mapped_column(
-        TIMESTAMP, server_default=utc_now_default
+        TIMESTAMP, primary_key=True, server_default=utc_now_default
     )
     finished_at: Mapped[datetime | None] = mapped_column(TIMESTAMP, default=None)
-    user_id: Mapped[int] = mapped_column(
-        ForeignKey("steam_users.id"), nullable=False, index=True
-    )
+    user_id: Mapped[int] = mapped_column(ForeignKey("steam_users.id"), nullable=False)
     steam_id: Mapped[str] = mapped_column(String, nullable=False)
     status: Mapped[str]
     extra_data: Mapped[dict | None] = mapped_column(
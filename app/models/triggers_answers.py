@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import BaseTable
@@ -5,6 +6,20 @@ from .base import BaseTable
 
 class TriggerAnswer(BaseTable):
     __tablename__ = "triggers_answers"
+    __table_args__ = (
+        Index(
+            "ix_triggers_answers_trigger_trgm",
+            "trigger",
+            postgresql_using="gin",
+            postgresql_ops={"trigger": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_triggers_answers_answer_trgm",
+            "answer",
+            postgresql_using="gin",
+            postgresql_ops={"answer": "gin_trgm_ops"},
+        ),
+    )
 
     trigger: Mapped[str] = mapped_column(index=True, unique=True)
     answer: Mapped[str | None] = mapped_column(default=None)
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, TIMESTAMP, JSON
+from sqlalchemy import ForeignKey, Index, TIMESTAMP, JSON, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -11,10 +11,19 @@ from .triggers_answers import TriggerAnswer
 
 class TriggerHistory(Base):
     __tablename__ = "triggers_history"
+    __table_args__ = (
+        Index(
+            "ix_triggers_history_vk_id_trgm",
+            text("(vk_id::text) gin_trgm_ops"),
+            postgresql_using="gin",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     ctime: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=utc_now_default)
-    trigger_answer_id: Mapped[int] = mapped_column(ForeignKey("triggers_answers.id"))
+    trigger_answer_id: Mapped[int] = mapped_column(
+        ForeignKey("triggers_answers.id"), index=True
+    )
     vk_id: Mapped[int]
     message_data: Mapped[dict] = mapped_column(JSONB)
 
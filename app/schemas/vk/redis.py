@@ -9,6 +9,8 @@ class RedisCommands(StrEnum):
     SERVICE_STOP = "service_stop"
     SERVICE_RESTART = "service_restart"
     SEND_ON_SCHEDULE_RESTART = "send_on_schedule_restart"
+    PROFILE_START = "profile_start"
+    PROFILE_STOP = "profile_stop"
 
 
 class RedisCommandData(BaseModel):
@@ -1,7 +1,9 @@
 import asyncio
 import logging
 
+from app.utils import metrics
 from app.utils.config import Config
+from app.utils.db import init_db
 from app.services.db_dumper.service import DumperService
 
 logger = logging.getLogger(__name__)
@@ -18,9 +20,12 @@ def main(args, config: Config):
     except Exception as exc:
         if service:
             service.close()
+            loop.run_until_complete(service.db_helper.close())
         logging.exception(exc)
 
 
 async def init(args, config: Config, loop: asyncio.AbstractEventLoop):
-    service = DumperService(loop, config)
+    metrics.start(config.metrics)
+    db_helper = await init_db(config.db)
+    service = DumperService(loop, config, db_helper)
     return service
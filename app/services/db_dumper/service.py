@@ -5,13 +5,17 @@ import os
 
 import croniter
 
+from app.db import partitions as partitions_db
+from app.utils import metrics
 from app.utils.config import Config
+from app.utils.db import DBHelper
 from app.utils.vk_client import VkClient
 from app.schemas.vk import Message
 
 logger = logging.getLogger(__name__)
 
 PG_DUMP_COMMAND_TEMPLATE = "pg_dump -U {user} -d {database} -h {host} > {filepath}"
+PARTITIONS_CRON = "0 1 * * *"
 
 
 class DumperService:
@@ -19,11 +23,16 @@ class DumperService:
         self,
         loop: asyncio.AbstractEventLoop,
         config: Config,
+        db_helper: DBHelper,
     ):
         self.loop = loop
         self.config = config
+        self.db_helper = db_helper
         self.tries = 3
         self.task: asyncio.Task | None = loop.create_task(self.dump_task())
+        self.partitions_task: asyncio.Task | None = loop.create_task(
+            self.maintain_partitions_task()
+        )
 
     async def dump_task(self):
         while True:
@@ -36,7 +45,10 @@ class DumperService:
                     f"dump_{datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')}.sql"
                 )
                 for _ in range(self.tries):
-                    success = await self.dump_db(filepath=filepath)
+                    with metrics.HANDLER_SECONDS.labels(
+                        service="db_dumper", handler="dump_db"
+                    ).time():
+                        success = await self.dump_db(filepath=filepath)
                     logger.info(f"Dumped {success=}")
                     if success:
                         break
@@ -55,6 +67,42 @@ class DumperService:
             except Exception as e:
                 logger.error(e)
 
+    async def maintain_partitions_task(self):
+        """
+        The only place session partitions are created and dropped. Rows of
+        a month without a partition land in the DEFAULT one, a failed run
+        is alerted, so it is fixed before that partition grows
+        """
+        retention = {
+            **dict.fromkeys(
+                partitions_db.DISCORD_SESSION_TABLES,
+                self.config.discord.sessions_retention_months,
+            ),
+            **dict.fromkeys(
+                partitions_db.STEAM_SESSION_TABLES,
+                self.config.steam.sessions_retention_months,
+            ),
+        }
+        while True:
+            try:
+                async with self.db_helper.get_session() as session:
+                    created, dropped = await partitions_db.maintain(session, retention)
+                if created or dropped:
+                    logger.info(f"Session partitions {created=} {dropped=}")
+            except (StopIteration, GeneratorExit, asyncio.CancelledError):
+                break
+            except Exception as e:
+                logger.exception(e)
+                metrics.PARTITION_MAINTENANCE_FAILURES.inc()
+                await self.send_alert(f"Session partitions maintenance failed: {e!r}")
+
+            try:
+                sleep = self.get_seconds_to_next_event_by_cron(PARTITIONS_CRON)
+                logger.info(f"Schedule maintain session partitions {sleep=}")
+                await asyncio.sleep(sleep)
+            except (StopIteration, GeneratorExit, asyncio.CancelledError):
+                break
+
     async def dump_db(self, filepath: str) -> bool:
         command = PG_DUMP_COMMAND_TEMPLATE.format(
             user=self.config.dumper.user,
@@ -90,6 +138,19 @@ class DumperService:
             await client.close()
         return success
 
+    async def send_alert(self, text: str) -> bool:
+        success = True
+        client = VkClient(self.config.vk)
+        try:
+            peer_id = self.config.dumper.vk_peer_id or self.config.vk.main_user_id
+            await client.messages.send(peer_id=peer_id, message=Message(text=text))
+        except Exception as e:
+            logger.error(e)
+            success = False
+        finally:
+            await client.close()
+        return success
+
     @staticmethod
     def get_seconds_to_next_event_by_cron(cron: str) -> float:
         now = datetime.datetime.utcnow()
@@ -102,3 +163,6 @@ class DumperService:
         if self.task:
             self.task.cancel()
             self.task = None
+        if self.partitions_task:
+            self.partitions_task.cancel()
+            self.partitions_task = None
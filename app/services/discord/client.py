@@ -0,0 +1,32 @@
+import aio_pika
+
+from app.utils.asynctask.client import Client
+from app.utils.asynctask.serializer import JsonSerializer
+from .config import WORKER_QUEUE_NAME, SEND_MESSAGE, ROUTES
+from .models.asynctask import SendMessage
+
+
+class DiscordClient(Client):
+
+    @classmethod
+    async def create(
+        cls,
+        conn: (
+            aio_pika.RobustConnection
+            | aio_pika.Connection
+            | aio_pika.abc.AbstractRobustConnection
+        ),
+        **kwargs,
+    ) -> "Client":
+        return await super().create(
+            conn, WORKER_QUEUE_NAME, JsonSerializer(), routes=ROUTES, **kwargs
+        )
+
+    async def send_message(self, channel_id: int, text: str):
+        return await self.call(
+            method=SEND_MESSAGE,
+            data=SendMessage(channel_id=channel_id, text=text),
+            response_class=None,
+            nullable_response=True,
+            expiration=30,
+        )
@@ -6,6 +6,7 @@ from discord import VoiceClient, Guild, ChannelType
 from discord.ext.commands import Context
 
 from app.db import reply_commands as reply_commands_db
+from app.utils import log
 from .service import DiscordService
 from .utils.voice_channels import connect_to_voice_channel, play_yt_url, play_file
 
@@ -13,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 
 async def test(ctx: Context):
-    logger.info(pformat(vars(ctx)))
+    logger.info("%s", log.Lazy(lambda: pformat(vars(ctx))))
     await ctx.reply(content="test")
 
 
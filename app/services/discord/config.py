@@ -0,0 +1,9 @@
+from app.utils.asynctask.models import PriorityClass
+
+WORKER_QUEUE_NAME = "discord_service_queue"
+
+SEND_MESSAGE = "send_message"
+
+ROUTES = {
+    SEND_MESSAGE: PriorityClass.INTERACTIVE,
+}
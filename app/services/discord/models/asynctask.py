@@ -0,0 +1,6 @@
+from pydantic import BaseModel
+
+
+class SendMessage(BaseModel):
+    channel_id: int
+    text: str
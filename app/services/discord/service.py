@@ -2,8 +2,10 @@ import asyncio
 import logging
 
 from discord import (
+    Forbidden,
     Intents,
     Message,
+    NotFound,
 )
 from discord.ext.commands import Bot
 from discord.ext.commands.core import Command
@@ -12,10 +14,16 @@ from redis.asyncio import Redis
 from app.db import reply_commands as reply_commands_db
 from app.services.utils.client import UtilsClient
 from app.services.vk_bot.client import VkBotClient
+from app.utils.asynctask.claim_check import ClaimCheck, RedisClaimStore
+from app.utils.asynctask.models import ErrorData
+from app.utils.asynctask.serializer import JsonSerializer
+from app.utils.asynctask.worker import Worker, Context
 from app.utils.db import DBHelper, init_db
-from app.utils import redis
+from app.utils import metrics, redis, tracing
 from app.utils.config import Config
 from app.utils.service import BaseService
+from .config import WORKER_QUEUE_NAME, SEND_MESSAGE
+from .models.asynctask import SendMessage
 
 # https://discordpy.readthedocs.io/en/stable/api.html
 
@@ -37,6 +45,7 @@ class DiscordService(BaseService):
 
         self.vk_pot_client: VkBotClient | None = None
         self.utils_client: UtilsClient | None = None
+        self.asynctask_worker: Worker | None = None
 
         self._intents: Intents | None = None
         self._bot: Bot | None = None
@@ -55,8 +64,11 @@ class DiscordService(BaseService):
         self.db_helper = await init_db(self.config.db)
         self.redis_conn = await redis.init(self.config.redis)
 
-        self.vk_pot_client = await VkBotClient.create(self.amqp)
-        self.utils_client = await UtilsClient.create(self.amqp)
+        claim_check = ClaimCheck(RedisClaimStore(self.redis_conn))
+        self.vk_pot_client = await VkBotClient.create(
+            self.amqp, claim_check=claim_check
+        )
+        self.utils_client = await UtilsClient.create(self.amqp, claim_check=claim_check)
 
         self._intents = Intents.all()
         self._intents.messages = True
@@ -64,6 +76,30 @@ class DiscordService(BaseService):
         await self._register_commands()
         self._register_events()
 
+        self.asynctask_worker = await Worker.create(
+            self.amqp, WORKER_QUEUE_NAME, JsonSerializer(), claim_check=claim_check
+        )
+        self._register_handlers_worker()
+
+    def _register_handlers_worker(self):
+        self.asynctask_worker.register(SEND_MESSAGE, self.on_send_message, SendMessage)
+
+    async def on_send_message(self, ctx: Context):
+        data: SendMessage = ctx.data
+        if not self._bot or not self._bot.is_ready():
+            return await ctx.error(ErrorData(message="Bot is not ready"))
+
+        channel = self._bot.get_channel(data.channel_id)
+        if not channel:
+            try:
+                channel = await self._bot.fetch_channel(data.channel_id)
+            except (NotFound, Forbidden) as e:
+                logger.error(e)
+                return await ctx.error(ErrorData(message="Channel not found"))
+
+        await channel.send(data.text)
+        await ctx.success()
+
     async def start(self):
         logger.info("Starting Discord Service")
         self.stopping = False
@@ -150,17 +186,25 @@ class DiscordService(BaseService):
     def _register_events(self) -> None:
         from . import events
 
+        def timer(handler: str):
+            return metrics.HANDLER_SECONDS.labels(
+                service=self.controller_name, handler=handler
+            ).time()
+
         async def on_message(message: Message):
-            return await events.on_message(self, message)
+            with timer("on_message"), tracing.span("discord on_message"):
+                return await events.on_message(self, message)
 
         # async def on_raw_reaction_add(payload):
         #     return await events.on_raw_reaction_add(self, payload)
 
         async def on_voice_state_update(member, before, after):
-            return await events.on_voice_state_update(self, member, before, after)
+            with timer("on_voice_state_update"):
+                return await events.on_voice_state_update(self, member, before, after)
 
         async def on_presence_update(before, after):
-            return await events.on_presence_update(self, before, after)
+            with timer("on_presence_update"):
+                return await events.on_presence_update(self, before, after)
 
         async def on_ready(*args, **kwargs):
             return await events.on_ready_event(*args, **kwargs)
@@ -204,5 +248,8 @@ class DiscordService(BaseService):
         if self.utils_client:
             await self.utils_client.close()
             self.utils_client = None
+        if self.asynctask_worker:
+            await self.asynctask_worker.close()
+            self.asynctask_worker = None
 
         await super().close()
@@ -1,14 +1,18 @@
-import logging
-
 from discord import (
     Message,
 )
 
-logger = logging.getLogger(__name__)
+from app.utils import log
+
+logger = log.throttle(__name__, rate=5, burst=20)
 
 
 def log_message(message: Message):
-    logger.info(f"{message.author=}")
-    logger.info(f"{message.content=}")
-    logger.info(f"{message.attachments=}")
-    logger.info(f"{message.stickers=}")
+    # formatted in the logging thread, only if not throttled
+    logger.info(
+        "Message author=%r content=%r attachments=%r stickers=%r",
+        message.author,
+        message.content,
+        message.attachments,
+        message.stickers,
+    )
@@ -11,13 +11,17 @@ from fastapi import (
 from starlette.staticfiles import StaticFiles
 
 from app.services.utils.client import UtilsClient
+from app.utils.asynctask.claim_check import ClaimCheck, RedisClaimStore
 from app.utils.config import Config
 from app.utils.fastapi.depends.session import get as get_session
 from app.schemas.base import ErrorResponse, UpdateErrorResponse
 from app.services.vk_bot.client import VkBotClient
 from app.utils.fastapi.handlers import register_exception_handler
+from app.utils.fastapi.metrics import register_metrics
+from app.utils.fastapi.tracing import register_tracing
 from app.utils.fastapi.state import State
-from app.utils import config, ctrl, redis, smtp, db
+from app.utils import config, ctrl, redis, smtp, db, tracing
+from app.utils.s3 import S3_ERRORS, S3Client
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +51,11 @@ def main(args, config: Config):
     state.app = app
     check_folders(config)
     register_exception_handler(app)
+    if config.metrics.enabled:
+        register_metrics(app)
+    if config.tracing.enabled:
+        tracing.init(config.tracing, "rest_api")
+        register_tracing(app)
 
     register_routers(app)
     # register_startup(app)
@@ -84,6 +93,7 @@ async def handler_shutdown(app):
 
 
 async def startup(app):
+    app = await startup_jinja(app)
     state: State = app.state
 
     state.db_helper = await db.init_db(state.config.db)
@@ -94,13 +104,26 @@ async def startup(app):
         aio_pika.connect_robust(str(state.config.amqp), loop=state.loop, timeout=300),
         timeout=30,
     )
-    state.vk_bot_client = await VkBotClient.create(state.amqp)
-    state.utils_client = await UtilsClient.create(state.amqp)
+    claim_check = ClaimCheck(RedisClaimStore(state.redis_pool))
+    state.vk_bot_client = await VkBotClient.create(state.amqp, claim_check=claim_check)
+    state.utils_client = await UtilsClient.create(state.amqp, claim_check=claim_check)
 
-    app = await startup_jinja(app)
+    state.s3_client = S3Client(**state.config.s3.model_dump())
+    await state.s3_client.init()
+
+    await startup_blobs_bucket(app)
     return app
 
 
+async def startup_blobs_bucket(app):
+    """Best effort, only uploads sent as blob refs need the bucket"""
+    state: State = app.state
+    try:
+        await state.s3_client.create_bucket(state.config.blobs.bucket)
+    except S3_ERRORS as e:
+        logger.error(f"Blobs bucket {state.config.blobs.bucket} is unavailable: {e}")
+
+
 async def shutdown(app):
     state: State = app.state
     if state.db_helper:
@@ -119,6 +142,9 @@ async def shutdown(app):
     if state.utils_client:
         await state.utils_client.close()
         state.utils_client = None
+    if state.s3_client:
+        await state.s3_client.close()
+        state.s3_client = None
 
 
 async def startup_jinja(app):
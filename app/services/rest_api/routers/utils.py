@@ -1,4 +1,3 @@
-import base64
 import logging
 
 from fastapi import (
@@ -13,9 +12,14 @@ from fastapi.responses import (
 
 from app.schemas.utils import SpeechToTextResponse
 from app.services.utils.client import UtilsClient
+from app.utils import blobs
+from app.utils.config import Config
 from app.utils.dataurl import DataURL
+from app.utils.fastapi.depends.conf import get as get_conf
+from app.utils.fastapi.depends.s3_client import get as get_s3_client
 from app.utils.fastapi.depends.utils_clinet import get as get_utils_client
 from app.utils.fastapi.handlers import error_400
+from app.utils.s3 import S3Client
 
 logger = logging.getLogger(__name__)
 
@@ -35,18 +39,29 @@ SUPPORTED_FORMATS = [
 )
 async def api_speech_to_text(
     file: UploadFile = File(...),
+    conf: Config = Depends(get_conf),
     utils_client: UtilsClient = Depends(get_utils_client),
+    s3_client: S3Client = Depends(get_s3_client),
 ) -> SpeechToTextResponse | JSONResponse:
+    """Small files are sent inline, larger ones through S3 as a reference"""
     if not any([f in file.filename for f in SUPPORTED_FORMATS]):
         return await error_400("Format not supported")
 
-    response = await utils_client.speech_to_text(
-        file.filename,
-        DataURL.make(
-            mimetype=file.content_type,
-            charset=None,
-            base64=True,
-            data=base64.b64encode(file.file.read()).decode("ascii"),
-        ),
-    )
+    if file.size is not None and file.size <= conf.blobs.inline_limit:
+        response = await utils_client.speech_to_text(
+            file.filename,
+            base64=DataURL.make(
+                mimetype=file.content_type,
+                charset=None,
+                base64=True,
+                data=await file.read(),
+            ),
+        )
+        return SpeechToTextResponse(text=response.text)
+
+    blob = await blobs.put_upload(s3_client, conf.blobs.bucket, file)
+    try:
+        response = await utils_client.speech_to_text(file.filename, blob=blob)
+    finally:
+        await blobs.delete(s3_client, blob)
     return SpeechToTextResponse(text=response.text)
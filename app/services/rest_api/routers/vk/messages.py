@@ -1,11 +1,12 @@
 import datetime
 import logging
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, File, Form, UploadFile
 from fastapi.responses import JSONResponse
 
 from app.business_logic import vk as vk_bl
 from app.db import tasks as tasks_db
+from app.schemas.base import AttachmentType
 from app.schemas.vk import Message, SendMessage
 from app.schemas.vk.io import (
     SendMessageInput,
@@ -16,11 +17,11 @@ from app.services.vk_bot.models.vk import VkMessage
 from app.utils.db import (
     Session as DBSession,
 )
-from app.utils.fastapi.depends.db import get as get_db
+from app.utils.fastapi.depends.db import get_readonly as get_db_readonly
 from app.utils.fastapi.depends.session import get as get_session
 from app.utils.fastapi.depends.vk_client import get as get_vk_client
-from app.utils.files import TempBase64File
-from app.utils.fastapi.handlers import error_403
+from app.utils.files import TempBase64File, TempUploadFile
+from app.utils.fastapi.handlers import error_400, error_403
 from app.utils.fastapi.session import Session
 from app.utils.vk_client import VkClient
 
@@ -59,13 +60,45 @@ async def api_send_message_vk(
     return SendMessageResponse(data=SendMessage(peer_id=data.peer_id, message=message))
 
 
+@admin_router.post("/send/upload", response_model=SendMessageResponse)
+async def api_send_message_vk_upload(
+    peer_id: int = Form(),
+    text: str = Form(default=""),
+    files: list[UploadFile] = File(default=[]),
+    vk_client: VkClient = Depends(get_vk_client),
+) -> SendMessageResponse | JSONResponse:
+    """Same as /send, but attachments are raw multipart files instead of base64"""
+    files = [f for f in files if f.size != 0]
+    if not text and not files:
+        return await error_400("Field 'text' is required when there are no files")
+
+    vk_attachments = []
+    for f in files:
+        async with TempUploadFile(f) as tmp:
+            if a := await vk_bl.file_to_vk_attachment(
+                vk_client,
+                peer_id,
+                tmp.filepath,
+                AttachmentType.by_content_type(f.content_type),
+            ):
+                vk_attachments.append(a)
+
+    message = Message(
+        text=text,
+        attachment=",".join(vk_attachments) if vk_attachments else None,
+    )
+    await vk_client.messages.send(peer_id, message)
+
+    return SendMessageResponse(data=SendMessage(peer_id=peer_id, message=message))
+
+
 @router.get("/history", response_model=MessagesHistoryResponse)
 async def api_get_history(
     from_id: int | None = None,
     peer_id: int | None = None,
     from_dt: datetime.datetime = datetime.datetime.now(),
     to_dt: datetime.datetime = datetime.datetime.now(),
-    conn: DBSession = Depends(get_db),
+    conn: DBSession = Depends(get_db_readonly),
     session: Session = Depends(get_session),
 ) -> MessagesHistoryResponse | JSONResponse:
     """
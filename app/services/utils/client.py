@@ -1,10 +1,12 @@
 import aio_pika
 
 from app.utils.asynctask.client import Client
+from app.utils.blobs import BlobRef
 from app.utils.asynctask.serializer import JsonSerializer
 from app.schemas.images import ImageTags
 from .config import (
     WORKER_QUEUE_NAME,
+    ROUTES,
     GPT_CHAT,
     GET_IMAGE_TAGS,
     SPEECH_TO_TEXT,
@@ -30,7 +32,9 @@ class UtilsClient(Client):
         ),
         **kwargs,
     ) -> "Client":
-        return await super().create(conn, WORKER_QUEUE_NAME, JsonSerializer())
+        return await super().create(
+            conn, WORKER_QUEUE_NAME, JsonSerializer(), routes=ROUTES, **kwargs
+        )
 
     async def get_image_tags(self, image_url: str) -> ImageTags:
         return await self.call(
@@ -38,6 +42,7 @@ class UtilsClient(Client):
             data=ImageUrl(url=image_url),
             response_class=ImageTags,
             expiration=90,
+            single_flight=True,
         )
 
     async def gpt_chat(self, user: int | str, message_text: str) -> GptChatResponse:
@@ -51,11 +56,12 @@ class UtilsClient(Client):
     async def speech_to_text(
         self,
         filename: str,
-        base64: str,
+        base64: str | None = None,
+        blob: BlobRef | None = None,
     ) -> SpeechToTextResponse:
         return await self.call(
             method=SPEECH_TO_TEXT,
-            data=SpeechToText(filename=filename, base64=base64),
+            data=SpeechToText(filename=filename, base64=base64, blob=blob),
             response_class=SpeechToTextResponse,
             expiration=120,
         )
@@ -1,5 +1,17 @@
+from app.utils.asynctask.models import PriorityClass
+
 WORKER_QUEUE_NAME = "utils_service_queue"
 
 GET_IMAGE_TAGS = "get_image_tags"
 GPT_CHAT = "gpt_chat"
 SPEECH_TO_TEXT = "speech_to_text"
+
+ROUTES = {
+    GPT_CHAT: PriorityClass.INTERACTIVE,
+    SPEECH_TO_TEXT: PriorityClass.DEFAULT,
+    GET_IMAGE_TAGS: PriorityClass.BULK,  # selenium scrapes
+}
+# handlers of their own, the other classes share the prefetch count
+CLASS_LIMITS = {
+    PriorityClass.INTERACTIVE: 1,
+}
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 
+from app.utils.blobs import BlobRef
 from app.utils.dataurl import DataURL
 
 
@@ -18,9 +19,12 @@ class ImageUrl(BaseModel):
 
 class SpeechToText(BaseModel):
     filename: str
-    base64: DataURL
+    base64: DataURL | None = None  # small files inline
+    blob: BlobRef | None = None  # large files stored in S3
 
     def __repr__(self):
+        if self.blob:
+            return f"{self.filename} {self.blob.key} {self.blob.size}"
         return f"{self.filename} {str(self.base64)[:30]}"
 
 
@@ -8,14 +8,17 @@ from app.business_logic.images import parse_image_tags
 from app.business_logic.speech_to_text import speech_to_text
 
 from ...utils import redis
+from app.utils.asynctask.claim_check import ClaimCheck, RedisClaimStore
 from app.utils.asynctask.models import ErrorData
 from app.utils.asynctask.serializer import JsonSerializer
-from app.utils.asynctask.worker import Worker, Context
+from app.utils.asynctask.worker import FLIGHT_WINDOW, Worker, Context
+from app.utils import metrics
 from app.utils.config import Config
 from app.utils.gigachat_client import GigachatClient
 from app.utils.service import BaseService
 from app.utils.db import DBHelper, init_db
 from .config import (
+    CLASS_LIMITS,
     WORKER_QUEUE_NAME,
     GPT_CHAT,
     GET_IMAGE_TAGS,
@@ -29,7 +32,8 @@ from .models.asynctask import (
     SpeechToTextResponse,
 )
 from .selenium import SeleniumHelper
-from app.utils.files import TempBase64File
+from app.utils.files import TempBase64File, TempS3File
+from app.utils.s3 import S3Client
 
 # https://discordpy.readthedocs.io/en/stable/api.html
 
@@ -51,12 +55,16 @@ class UtilsService(BaseService):
 
         self.gigachat_client: GigachatClient | None = None
         self.asynctask_worker: Worker | None = None
+        self.s3_client: S3Client | None = None
         self._selenium_helper: SeleniumHelper = SeleniumHelper(config)
 
     async def on_get_image_tags(self, ctx: Context):
         data: ImageUrl = ctx.data
         logger.info(f"Handling image url: {data.url}")
-        result = await asyncio.to_thread(self._selenium_helper.get_image_tags, data.url)
+        with metrics.SELENIUM_SECONDS.labels(operation="image_tags").time():
+            result = await asyncio.to_thread(
+                self._selenium_helper.get_image_tags, data.url
+            )
         await ctx.success(result)
 
     async def on_gpt_chat(self, ctx: Context):
@@ -80,7 +88,16 @@ class UtilsService(BaseService):
     async def on_speech_to_text(self, ctx: Context):
         data: SpeechToText = ctx.data
         logger.info(f"Handle message: {repr(data)}")
-        async with TempBase64File(data.base64, decode=True) as tmp:
+        if data.blob:
+            tmp_file = TempS3File(data.blob.key, data.blob.bucket, self.s3_client)
+        elif data.base64:
+            tmp_file = TempBase64File(data.base64)
+        else:
+            return await ctx.error(ErrorData(message="No audio data"))
+
+        async with tmp_file as tmp:
+            if not tmp:
+                return await ctx.error(ErrorData(message="Failed to load audio"))
             with ProcessPoolExecutor() as executor:
                 text = await self.loop.run_in_executor(
                     executor, speech_to_text, tmp.filepath
@@ -99,8 +116,18 @@ class UtilsService(BaseService):
         self.redis_conn = await redis.init(self.config.redis)
         self.gigachat_client = GigachatClient(self.config.gigachat, self.db_helper)
 
+        self.s3_client = S3Client(**self.config.s3.model_dump())
+        await self.s3_client.init()
+
         self.asynctask_worker = await Worker.create(
-            self.amqp, WORKER_QUEUE_NAME, JsonSerializer()
+            self.amqp,
+            WORKER_QUEUE_NAME,
+            JsonSerializer(),
+            claim_check=ClaimCheck(RedisClaimStore(self.redis_conn)),
+            # get_image_tags is single flight
+            flight_window=FLIGHT_WINDOW,
+            # gpt_chat doesn't wait behind selenium scrapes
+            class_limits=CLASS_LIMITS,
         )
         self._register_handlers_worker()
 
@@ -121,5 +148,8 @@ class UtilsService(BaseService):
         if self.gigachat_client:
             await self.gigachat_client.close()
             self.gigachat_client = None
+        if self.s3_client:
+            await self.s3_client.close()
+            self.s3_client = None
 
         await super().close()
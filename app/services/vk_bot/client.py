@@ -19,7 +19,7 @@ class VkBotClient(Client):
         ),
         **kwargs,
     ) -> "Client":
-        return await super().create(conn, WORKER_QUEUE_NAME, JsonSerializer())
+        return await super().create(conn, WORKER_QUEUE_NAME, JsonSerializer(), **kwargs)
 
     async def vk_bot_post(
         self,
@@ -1,7 +1,6 @@
 import asyncio
 import datetime
 import logging
-import os
 import traceback
 from asyncio import AbstractEventLoop
 from typing import (
@@ -9,6 +8,7 @@ from typing import (
     Coroutine,
 )
 
+import aiohttp
 from pydantic import ValidationError
 from redis.asyncio import Redis
 from redis.asyncio.client import PubSub
@@ -21,17 +21,22 @@ from app.schemas.base import AttachmentType
 from app.schemas.vk import Message
 from app.schemas.vk.redis import RedisMessage, RedisCommands
 from ...utils import redis
+from app.utils import http, log, metrics, tracing
+from app.utils.asynctask.claim_check import ClaimCheck, RedisClaimStore
 from app.utils.asynctask.serializer import JsonSerializer
 from app.utils.asynctask.worker import Worker, Context
 from app.utils.config import Config
 from app.utils.consts import VK_SERVICE_REDIS_QUEUE
 from app.utils.db import DBHelper, init_db
-from app.utils.files import (
-    TempBase64File,
-    TempUrlFile,
-    TempSftpFile,
-    TempS3File,
+from app.utils.media import (
+    MediaSource,
+    BytesMediaSource,
+    S3MediaSource,
+    SftpMediaSource,
+    UrlMediaSource,
+    open_media,
 )
+from app.utils.media_cache import MediaCache
 from app.utils.service import BaseService
 from app.utils.sftp import SftpClient
 from app.utils.vk_client import VkClient
@@ -44,6 +49,7 @@ from app.services.utils.client import UtilsClient
 from app.utils.s3 import S3Client
 
 logger = logging.getLogger(__name__)
+events_logger = log.throttle(f"{__name__}.events", rate=5, burst=20)
 
 
 class VkBotService(BaseService):
@@ -63,6 +69,9 @@ class VkBotService(BaseService):
         self.ex: list[Exception] = []
         self.last_ex: Exception | None = None
         self._queue: asyncio.Queue = asyncio.Queue()
+        metrics.QUEUE_DEPTH.labels(service=controller_name).set_function(
+            self._queue.qsize
+        )
         self._background_tasks: BackgroundTasks = BackgroundTasks()
 
         self.client_vk: VkClient | None = None
@@ -72,6 +81,8 @@ class VkBotService(BaseService):
         self.asynctask_worker: Worker | None = None
 
         self.s3_client: S3Client | None = None
+        self.sftp_client: SftpClient | None = None
+        self.media_cache: MediaCache | None = None
 
     @classmethod
     async def create(
@@ -83,14 +94,19 @@ class VkBotService(BaseService):
         self.db_helper = await init_db(self.config.db)
         self.redis_conn = await redis.init(self.config.redis)
 
-        self.utils_client = await UtilsClient.create(self.amqp)
+        claim_check = ClaimCheck(RedisClaimStore(self.redis_conn))
+        self.utils_client = await UtilsClient.create(self.amqp, claim_check=claim_check)
         self.asynctask_worker = await Worker.create(
-            self.amqp, WORKER_QUEUE_NAME, JsonSerializer()
+            self.amqp, WORKER_QUEUE_NAME, JsonSerializer(), claim_check=claim_check
         )
 
         self.s3_client = S3Client(**self.config.s3.model_dump())
         await self.s3_client.init()
 
+        # sessions are opened on first use and then reused
+        self.sftp_client = SftpClient(self.config.sftp)
+        self.media_cache = MediaCache(self.config.media_cache)
+
         self._register_handlers_vk()
         self._register_commands_redis()
         self._register_handlers_worker()
@@ -144,7 +160,13 @@ class VkBotService(BaseService):
                 raise TypeError(f"Invalid queue item: {task}")
 
             try:
-                await execute_task(task)
+                with (
+                    metrics.HANDLER_SECONDS.labels(
+                        service=self.controller_name, handler=task.func.__name__
+                    ).time(),
+                    tracing.span(f"vk {task.func.__name__}", tries=task.tries),
+                ):
+                    await execute_task(task)
                 await self._save_task(task)
             except (GeneratorExit, asyncio.CancelledError, KeyboardInterrupt):
                 break
@@ -167,7 +189,10 @@ class VkBotService(BaseService):
         while not self.stopping:
             try:
                 async for event in self.client_vk.events_generator():
-                    logger.info(event.type)
+                    events_logger.info("Event %s", event.type)
+                    metrics.VK_EVENTS.labels(
+                        type=getattr(event.type, "value", event.type)
+                    ).inc()
                     handler = self._handlers_vk.get(event.type, None)
                     if handler:
                         await self.execute_in_worker(handler, self, event)
@@ -178,18 +203,42 @@ class VkBotService(BaseService):
 
     async def on_vk_post(self, ctx: Context):
 
-        async def handle_image(fp: str):
-            attachments = await self.client_vk.upload.photo_wall(fp)
+        async def handle_image(media: MediaSource):
+            attachments = await self.client_vk.upload.photo_wall_stream(media)
             return await vk_bl.post_in_group_wall(
                 self.client_vk, attachments=attachments
             )
 
-        async def handle_video(fp: str):
-            return await self.client_vk.upload.video_wall_and_post(fp)
+        async def handle_video(media: MediaSource):
+            return await self.client_vk.upload.video_wall_and_post_stream(media)
 
         async def handle_yt(link: str):
             return await vk_bl.post_yt_video(self.client_vk, link)
 
+        async def handle_media(
+            source: MediaSource,
+            allowed: tuple[AttachmentType, ...] = (
+                AttachmentType.PHOTO,
+                AttachmentType.VIDEO,
+            ),
+        ):
+            try:
+                async with open_media(source) as media:
+                    attachment_type = media.attachment_type()
+                    if attachment_type not in allowed:
+                        logger.error(
+                            f"Unsupported media type: {attachment_type} "
+                            f"{media.content_type}"
+                        )
+                        return
+                    match attachment_type:
+                        case AttachmentType.PHOTO:
+                            await handle_image(media)
+                        case AttachmentType.VIDEO:
+                            await handle_video(media)
+            except (aiohttp.ClientError, ValueError) as e:
+                logger.error(f"Media upload failed: {source.filename} {e}")
+
         message: VkBotPost = ctx.data
         if message.is_empty():
             logger.error("Empty MB message")
@@ -197,35 +246,14 @@ class VkBotService(BaseService):
 
         if message.sftpUrl:
             logger.info(f"Handle {message.sftpUrl=}")
-            async with SftpClient(self.config.sftp) as sftp_client:
-                async with TempSftpFile(message.sftpUrl, sftp_client, True) as tmp:
-                    attachment_type = AttachmentType.by_ext(
-                        os.path.basename(tmp.filepath).split(".")[-1]
-                    )
-                    match attachment_type:
-                        case AttachmentType.PHOTO:
-                            await handle_image(tmp.filepath)
-                        case AttachmentType.VIDEO:
-                            await handle_video(tmp.filepath)
-                        case _ as arg:
-                            logger.error(f"Unsupported media type: {arg}")
+            await handle_media(SftpMediaSource(message.sftpUrl, self.sftp_client, True))
             return await ctx.success()
 
         if message.bucket and message.filePath:
             logger.info(f"Handle {message.bucket=} {message.filePath=}")
-            async with TempS3File(
-                message.filePath, message.bucket, self.s3_client, True
-            ) as tmp:
-                attachment_type = AttachmentType.by_ext(
-                    os.path.basename(tmp.filepath).split(".")[-1]
-                )
-                match attachment_type:
-                    case AttachmentType.PHOTO:
-                        await handle_image(tmp.filepath)
-                    case AttachmentType.VIDEO:
-                        await handle_video(tmp.filepath)
-                    case _ as arg:
-                        logger.error(f"Unsupported media type: {arg}")
+            await handle_media(
+                S3MediaSource(message.filePath, message.bucket, self.s3_client, True)
+            )
             return await ctx.success()
 
         if message.yt_url:
@@ -235,47 +263,25 @@ class VkBotService(BaseService):
 
         if message.base64:
             logger.info("Handle base64 message")
-            if (
-                AttachmentType.by_content_type(message.base64.mimetype)
-                is AttachmentType.PHOTO
-            ):
-                async with TempBase64File(message.base64) as tmp:
-                    await handle_image(tmp.filepath)
-            else:
-                logger.error(
-                    f"Unsupported image base64 media type: {message.base64.mimetype}"
-                )
+            await handle_media(
+                BytesMediaSource.from_dataurl(message.base64), (AttachmentType.PHOTO,)
+            )
             return await ctx.success()
 
         if message.video_url:
             logger.info(f"Handle {message.video_url=}")
-            async with TempUrlFile(str(message.video_url)) as tmp:
-                if tmp:
-                    logger.info(tmp)
-                    if (
-                        AttachmentType.by_content_type(tmp.content_type)
-                        is AttachmentType.VIDEO
-                    ):
-                        await handle_video(tmp.filepath)
-                    else:
-                        logger.error(
-                            f"Unsupported video media type: {tmp.content_type}"
-                        )
+            await handle_media(
+                UrlMediaSource(str(message.video_url), cache=self.media_cache),
+                (AttachmentType.VIDEO,),
+            )
             return await ctx.success()
 
         if message.image_url:
             logger.info(f"Handle {message.image_url=}")
-            async with TempUrlFile(str(message.image_url)) as tmp:
-                if tmp:
-                    if (
-                        AttachmentType.by_content_type(tmp.content_type)
-                        is AttachmentType.PHOTO
-                    ):
-                        await handle_image(tmp.filepath)
-                    else:
-                        logger.error(
-                            f"Unsupported image media type: {tmp.content_type}"
-                        )
+            await handle_media(
+                UrlMediaSource(str(message.image_url), cache=self.media_cache),
+                (AttachmentType.PHOTO,),
+            )
             return await ctx.success()
 
     async def _listen_redis(self):
@@ -423,6 +429,8 @@ class VkBotService(BaseService):
         self._commands_redis[RedisCommands.SERVICE_START] = self.start_service
         self._commands_redis[RedisCommands.SERVICE_STOP] = self.stop_service
         self._commands_redis[RedisCommands.SERVICE_RESTART] = self.restart_service
+        self._commands_redis[RedisCommands.PROFILE_START] = self.start_profiler
+        self._commands_redis[RedisCommands.PROFILE_STOP] = self.stop_profiler
 
     def _register_handlers_worker(self):
         self.asynctask_worker.register(VK_BOT_POST, self.on_vk_post, VkBotPost)
@@ -485,6 +493,10 @@ class VkBotService(BaseService):
             await self.s3_client.close()
             self.s3_client = None
 
+        if self.sftp_client:
+            await self.sftp_client.close()
+            self.sftp_client = None
+
         if self.utils_client:
             await self.utils_client.close()
             self.utils_client = None
@@ -493,4 +505,6 @@ class VkBotService(BaseService):
             await self.asynctask_worker.close()
             self.asynctask_worker = None
 
+        await http.close_session()
+
         await super().close()
@@ -24,6 +24,7 @@ from app.business_logic.vk import (
 from app.models.vk_messages import (
     VkMessage as VkMessageDb,
 )
+from app.utils import log, tracing
 from app.utils.files import TempUrlFile, DOWNLOADS_DIR
 from app.utils.vk_client import VkClient
 from app.schemas.images import ImageTags
@@ -38,6 +39,8 @@ from app.services.vk_bot.service import VkBotService
 from app.services.utils.client import UtilsClient
 
 logger = logging.getLogger(__name__)
+# a dump per event, throttled so a busy chat doesn't flood the log
+dump_logger = log.throttle(f"{__name__}.dump", rate=5, burst=20)
 
 backslash_n = "\n"  # Expression fragments inside f-strings cannot include backslashes
 
@@ -54,32 +57,37 @@ async def on_new_message(service: VkBotService, event: VkBotMessageEvent):
         return
     config = service.config
 
-    logger.info(pformat(message_model.model_dump()))
+    dump_logger.info("%s", log.Lazy(lambda: pformat(message_model.model_dump())))
     from_chat = message_model.from_chat
     peer_id = message_model.peer_id if event.from_chat else message_model.from_id
     from_id = message_model.from_id
 
     async with service.db_helper.get_session() as session:
-        await _save_vk_message(session, message_model)
+        with tracing.span("save_message"):
+            await _save_vk_message(session, message_model)
 
-        if await _on_command(service, message_model):
+        with tracing.span("command"):
+            handled = await _on_command(service, message_model)
+        if handled:
             return
 
         # Find tags of images
-        tags_models = await _parse_attachments_tags(
-            service.utils_client, message_model.attachments
-        )
-        logger.info(f"{tags_models=}")
+        with tracing.span("image_tags", attachments=len(message_model.attachments)):
+            tags_models = await _parse_attachments_tags(
+                service.utils_client, message_model.attachments
+            )
+        dump_logger.info("tags_models=%r", tags_models)
         if tags_models:
             await _send_tags(service.client_vk, tags_models, peer_id)
 
         # Find triggers, send answer
 
-        find_triggers = await triggers_answers_db.get_for_like(
-            session,
-            f"{message_model.text}{''.join([t.tags_text + str(t.description) for t in tags_models])}",
-        )
-        logger.info(f"{find_triggers=}")
+        with tracing.span("triggers"):
+            find_triggers = await triggers_answers_db.get_for_like(
+                session,
+                f"{message_model.text}{''.join([t.tags_text + str(t.description) for t in tags_models])}",
+            )
+        dump_logger.info("find_triggers=%r", find_triggers)
         answers = list(set(sum([i.answers for i in find_triggers], [])))
         know_id = await know_ids_db.get_by_vk_id(session, from_id)
         know_id_place = f"({know_id.name})" if know_id else ""
@@ -136,7 +144,7 @@ async def on_new_message(service: VkBotService, event: VkBotMessageEvent):
             for a in message_model.attachments:
                 if a.type == "photo" and a.photo:
                     url = a.photo.sizes[0].url
-                    async with TempUrlFile(url) as tmp:
+                    async with TempUrlFile(url, cache=service.media_cache) as tmp:
                         if tmp:
                             await service.s3_client.upload_file("memes", "tmp/image/", tmp.filepath)
                 if a.type == "video" and a.video:
@@ -160,7 +168,7 @@ async def on_message_reply(service: VkBotService, event: VkBotMessageEvent):
     message_model = _validate_reply_message(event)
     if not message_model:
         return
-    logger.info(pformat(message_model.model_dump()))
+    dump_logger.info("%s", log.Lazy(lambda: pformat(message_model.model_dump())))
     async with service.db_helper.get_session() as session:
         await _save_vk_message(session, message_model)
 
@@ -170,7 +178,7 @@ async def on_callback_event(service: VkBotService, event: VkBotMessageEvent):
         "help_callback": callbacks.help_callback
     }
 
-    logger.info(pformat(event.object))
+    dump_logger.info("%s", log.Lazy(pformat, event.object))
     callback_str = event.object["payload"]["type"]
     callback = callbacks_map.get(callback_str, None)
     if callback is not None:
@@ -3,17 +3,22 @@ import logging
 import os
 from contextlib import asynccontextmanager
 
+import aio_pika
 from fastapi import (
     FastAPI,
     Depends,
 )
 from starlette.staticfiles import StaticFiles
 
+from app.services.discord.client import DiscordClient
+from app.utils.asynctask.claim_check import ClaimCheck, RedisClaimStore
 from app.utils.config import Config
 from app.utils.fastapi.depends.session import get as get_session
 from app.utils.fastapi.handlers import register_exception_handler
+from app.utils.fastapi.metrics import register_metrics
+from app.utils.fastapi.tracing import register_tracing
 from app.schemas.base import ErrorResponse, UpdateErrorResponse
-from app.utils import config, ctrl, redis, smtp, db
+from app.utils import config, ctrl, redis, smtp, db, tracing
 from app.utils.fastapi.state import State
 
 logger = logging.getLogger(__name__)
@@ -44,6 +49,11 @@ def main(args, config: Config):
     state.app = app
     check_folders(config)
     register_exception_handler(app)
+    if config.metrics.enabled:
+        register_metrics(app)
+    if config.tracing.enabled:
+        tracing.init(config.tracing, "web")
+        register_tracing(app)
 
     register_routers(app)
     # register_startup(app)
@@ -81,16 +91,39 @@ async def handler_shutdown(app):
 
 
 async def startup(app):
+    # every page needs the templates, set them up before any connection
+    app = await startup_jinja(app)
     state: State = app.state
 
     state.db_helper = await db.init_db(state.config.db)
     state.redis_pool = await redis.init(app.state.config.redis)
     state.smtp = await smtp.init(app.state.config.smtp)
 
-    app = await startup_jinja(app)
+    await startup_discord_client(app)
     return app
 
 
+async def startup_discord_client(app):
+    """Optional, only sending Discord messages needs RabbitMQ"""
+    state: State = app.state
+    try:
+        state.amqp = await asyncio.wait_for(
+            aio_pika.connect_robust(
+                str(state.config.amqp), loop=state.loop, timeout=300
+            ),
+            timeout=30,
+        )
+        state.discord_client = await DiscordClient.create(
+            state.amqp, claim_check=ClaimCheck(RedisClaimStore(state.redis_pool))
+        )
+    except Exception as e:
+        logger.error(f"Discord client is unavailable: {e!r}")
+        state.discord_client = None
+        if state.amqp:
+            await state.amqp.close()
+            state.amqp = None
+
+
 async def shutdown(app):
     state: State = app.state
     if state.db_helper:
@@ -100,6 +133,13 @@ async def shutdown(app):
         await redis.close(state.redis_pool)
         state.redis_pool = None
 
+    if state.discord_client:
+        await state.discord_client.close()
+        state.discord_client = None
+    if state.amqp:
+        await state.amqp.close()
+        state.amqp = None
+
 
 async def startup_jinja(app):
     from jinja2 import Environment, ChoiceLoader, FileSystemLoader, select_autoescape
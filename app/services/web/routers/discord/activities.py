@@ -8,7 +8,7 @@ from jinja2 import Environment
 
 from app.business_logic import activities as activities_bl
 from app.db import activity_sessions as activity_sessions_db
-from app.utils.fastapi.depends.db import get as get_db
+from app.utils.fastapi.depends.db import get_readonly as get_db_readonly
 from app.utils.fastapi.depends.session import get as ges_session
 from app.utils.fastapi.depends.jinja import get as get_jinja
 from app.utils.fastapi.session import Session
@@ -28,7 +28,7 @@ async def activity_sessions_view(
     # group: bool = False,
     jinja: Environment = Depends(get_jinja),
     session: Session = Depends(ges_session),
-    conn: db.Session = Depends(get_db),
+    conn: db.Session = Depends(get_db_readonly),
 ):
     tz = pytz.timezone("Europe/Moscow")
     now = datetime.datetime.now(tz=tz)
@@ -1,7 +1,6 @@
 import asyncio
 import logging
 
-from discord import Client, Intents
 from fastapi import (
     APIRouter,
     Depends,
@@ -11,8 +10,13 @@ from fastapi import (
 from fastapi.responses import HTMLResponse, RedirectResponse
 from jinja2 import Environment
 
-from app.utils.config import Config
-from app.utils.fastapi.depends.conf import get as get_config
+from app.services.discord.client import DiscordClient
+from app.utils.asynctask.exceptions import (
+    TaskBaseException,
+    TaskError,
+    TaskException,
+)
+from app.utils.fastapi.depends.discord_client import get as get_discord_client
 from app.utils.fastapi.depends.session import get as ges_session
 from app.utils.fastapi.depends.jinja import get as get_jinja
 from app.utils.fastapi.session import Session
@@ -39,25 +43,25 @@ async def send_discord_message(
     peer_id: int = Form(),
     message_text: str = Form(default=""),
     # files: list[UploadFile] = File(...),
-    config: Config = Depends(get_config),
+    discord_client: DiscordClient | None = Depends(get_discord_client),
 ):
-    intents = Intents.all()
-    intents.messages = True
-    client = Client(intents=intents)
-    task = asyncio.create_task(client.start(config.discord.token))
-    for i in range(10):
-        if client.is_ready():
-            break
-        logger.info(f"Waiting for client ready {i + 1}...")
-        await asyncio.sleep(3)
-    channel = client.get_channel(peer_id)
-    if not channel:
-        return HTMLResponse(status_code=404, content="Channel not found")
-    await channel.send(message_text)
-    await client.close()
+    if discord_client is None:
+        return HTMLResponse(status_code=503, content="Discord service is unavailable")
+
     try:
-        task.cancel()
-    except Exception as e:
+        await discord_client.send_message(peer_id, message_text)
+    except TaskError as e:
+        logger.error(e)
+        return HTMLResponse(status_code=404, content=str(e))
+    except asyncio.TimeoutError:
+        logger.error(f"Sending to {peer_id} timed out")
+        return HTMLResponse(status_code=504, content="Discord service timed out")
+    except TaskException as e:
         logger.error(e)
+        return HTMLResponse(status_code=500, content=str(e))
+    except TaskBaseException as e:
+        # returned, canceled or not handled, the service isn't serving
+        logger.error(f"Sending to {peer_id} failed: {e!r}")
+        return HTMLResponse(status_code=503, content="Discord service is unavailable")
 
     return RedirectResponse("/discord/messages", status_code=302)
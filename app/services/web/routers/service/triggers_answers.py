@@ -4,7 +4,7 @@ from jinja2 import Environment
 
 from app.db import triggers_answers as triggers_answers_db
 from app.schemas.triggers_answers import TriggerAnswerCreate
-from app.utils.fastapi.depends.db import get as get_db
+from app.utils.fastapi.depends.db import get as get_db, get_readonly as get_db_readonly
 from app.utils.fastapi.depends.session import get as ges_session
 from app.utils.fastapi.depends.jinja import get as get_jinja
 from app.utils.fastapi.session import Session
@@ -18,7 +18,7 @@ async def triggers_answers_view(
     request: Request,
     jinja: Environment = Depends(get_jinja),
     session: Session = Depends(ges_session),
-    conn: DBSession = Depends(get_db),
+    conn: DBSession = Depends(get_db_readonly),
 ):
     rows = await triggers_answers_db.get_list(conn)
     return jinja.get_template("service/triggers_answers.html").render(
@@ -6,7 +6,8 @@ from jinja2 import Environment
 
 from app.db import triggers_history as triggers_history_db
 from app.schemas.base import BaseSearchQueryParams
-from app.utils.fastapi.depends.db import get as get_db
+from app.utils.consts import LIMIT_PER_PAGE
+from app.utils.fastapi.depends.db import get_readonly as get_db_readonly
 from app.utils.fastapi.depends.session import get as ges_session
 from app.utils.fastapi.depends.jinja import get as get_jinja
 from app.utils.fastapi.session import Session
@@ -19,18 +20,27 @@ router = APIRouter(prefix="/triggers_history")
 async def triggers_history_view(
     request: Request,
     query_params: BaseSearchQueryParams = Depends(),
+    before_id: int | None = None,
     jinja: Environment = Depends(get_jinja),
     session: Session = Depends(ges_session),
-    conn: DBSession = Depends(get_db),
+    conn: DBSession = Depends(get_db_readonly),
 ):
     q = query_params.q.split("|")
-    q = [s.strip() for s in q]
-    rows = await triggers_history_db.get_list(conn, q)
+    q = [s.strip() for s in q if s.strip()]
+    rows = await triggers_history_db.get_list(
+        conn, q, limit=LIMIT_PER_PAGE, before_id=before_id
+    )
+    next_url = None
+    if len(rows) == LIMIT_PER_PAGE:
+        next_url = f"/service/triggers_history/?before_id={rows[-1].id}"
+        if query_params.q:
+            next_url += f"&q={quote_plus(query_params.q)}"
     return jinja.get_template("service/triggers_history.html").render(
         user=session.user,
         request=request,
         rows=rows,
         q=query_params.q,
+        next_url=next_url,
     )
 
 
@@ -10,7 +10,7 @@ from app.business_logic import activities as activities_bl
 from app.db import (
     steam as steam_db,
 )
-from app.utils.fastapi.depends.db import get as get_db
+from app.utils.fastapi.depends.db import get_readonly as get_db_readonly
 from app.utils.fastapi.depends.session import get as ges_session
 from app.utils.fastapi.depends.jinja import get as get_jinja
 from app.models.steam import SteamStatusSession, SteamActivitySession
@@ -31,7 +31,7 @@ async def status_sessions_view(
     # group: bool = False,
     jinja: Environment = Depends(get_jinja),
     session: Session = Depends(ges_session),
-    conn: db.Session = Depends(get_db),
+    conn: db.Session = Depends(get_db_readonly),
 ):
     tz = pytz.timezone("Europe/Moscow")
     now = datetime.datetime.now(tz=tz)
@@ -9,7 +9,7 @@ from app.schemas.base import AttachmentType
 from app.utils.db import (
     Session as DBSession,
 )
-from app.utils.fastapi.depends.db import get as get_db
+from app.utils.fastapi.depends.db import get_readonly as get_db_readonly
 from app.utils.fastapi.depends.vk_client import get as get_vk_client
 from app.utils.fastapi.depends.session import get as ges_session
 from app.utils.fastapi.depends.jinja import get as get_jinja
@@ -26,7 +26,7 @@ async def vk_messages_view(
     request: Request,
     jinja: Environment = Depends(get_jinja),
     session: Session = Depends(ges_session),
-    conn: DBSession = Depends(get_db),
+    conn: DBSession = Depends(get_db_readonly),
 ):
     know_ids = await know_ids_db.get_list(conn)
     return jinja.get_template("vk/messages.html").render(
@@ -0,0 +1,267 @@
+"""
+Load test of asynctask against a running RabbitMQ.
+
+A worker with synthetic handlers and a number of clients run in one
+process, requests are sent at a fixed rate (open loop), so latency
+includes the queueing caused by overload. Every combination of
+serializer and prefetch is run in turn on its own queues:
+
+    SRVC_CONFIG=etc/local.json python asynctask_bench.py \\
+        --handler echo --payload 4096 --rate 500 --duration 20 \\
+        --serializers json,zlib --prefetch 1,8 --out bench.json
+
+With `--confirm-windows` raw publishes are timed instead, with that many
+unconfirmed messages per channel. A window of 1 waits for every confirm
+in turn, as publishes did before the Publisher:
+
+    SRVC_CONFIG=etc/local.json python asynctask_bench.py \\
+        --confirm-windows 1,16,256 --messages 20000 --payload 1024
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import statistics
+import time
+import uuid
+from typing import Any
+
+import aio_pika
+from aio_pika import Message
+from aio_pika.abc import AbstractRobustConnection
+from pydantic import BaseModel
+
+from app.utils.config import Config
+from .client import Client
+from .models import PriorityClass, cancel_exchange_name, class_queue_name
+from .publisher import Publisher
+from .serializer import JsonSerializer, Serializer, ZlibJsonSerializer
+from .worker import Context, Worker
+
+METHOD = "bench"
+DEPTH_INTERVAL = 0.5
+
+SERIALIZERS: dict[str, type[Serializer]] = {
+    "json": JsonSerializer,
+    "zlib": ZlibJsonSerializer,
+}
+
+
+class BenchRequest(BaseModel):
+    handler: str
+    payload: str = ""
+    seconds: float = 0.0
+
+
+class BenchResponse(BaseModel):
+    payload: str = ""
+
+
+async def on_bench(context: Context):
+    data: BenchRequest = context.data
+    if data.handler == "sleep":
+        await asyncio.sleep(data.seconds)
+    elif data.handler == "cpu":
+        # blocks the loop like a CPU bound handler does
+        until = time.perf_counter() + data.seconds
+        while time.perf_counter() < until:
+            pass
+    await context.success(
+        BenchResponse(payload=data.payload if data.handler == "echo" else "")
+    )
+
+
+def percentile(values: list[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+async def run_one(
+    conn: AbstractRobustConnection,
+    args: argparse.Namespace,
+    serializer_name: str,
+    prefetch: int,
+) -> dict[str, Any]:
+    queue_name = f"asynctask.bench.{uuid.uuid4().hex[:8]}"
+    serializer = SERIALIZERS[serializer_name]()
+    worker = await Worker.create(conn, queue_name, serializer, prefetch_count=prefetch)
+    worker.register(METHOD, on_bench, BenchRequest)
+    clients = [
+        await Client.create(conn, queue_name, serializer) for _ in range(args.clients)
+    ]
+
+    request = BenchRequest(
+        handler=args.handler, payload="x" * args.payload, seconds=args.seconds
+    )
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    max_depth = 0
+
+    async def call(client: Client):
+        started = time.perf_counter()
+        try:
+            await client.call(
+                METHOD, request, BenchResponse, expiration=args.expiration
+            )
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            name = e.__class__.__name__
+            errors[name] = errors.get(name, 0) + 1
+
+    async def sample_depth():
+        nonlocal max_depth
+        while True:
+            metrics = await worker.metrics()
+            depth = sum(i.get("depth", 0) for i in metrics.values())
+            max_depth = max(max_depth, depth)
+            await asyncio.sleep(DEPTH_INTERVAL)
+
+    sampler = asyncio.create_task(sample_depth())
+    calls = []
+    started = time.perf_counter()
+    try:
+        total = int(args.rate * args.duration)
+        for i in range(total):
+            # absolute schedule, a slow iteration doesn't lower the rate
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            calls.append(asyncio.create_task(call(clients[i % len(clients)])))
+        await asyncio.gather(*calls)
+        elapsed = time.perf_counter() - started
+    finally:
+        sampler.cancel()
+        for client in clients:
+            await client.close()
+        await worker.close()
+        await cleanup(conn, queue_name)
+
+    return {
+        "handler": args.handler,
+        "serializer": serializer_name,
+        "prefetch": prefetch,
+        "clients": args.clients,
+        "payload": args.payload,
+        "rate": args.rate,
+        "sent": len(calls),
+        "ok": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max_depth": max_depth,
+    }
+
+
+async def run_publish(
+    conn: AbstractRobustConnection, args: argparse.Namespace, window: int
+) -> dict[str, Any]:
+    channel = await conn.channel(publisher_confirms=True)
+    # exclusive, so it goes away with the channel, bounded to spare the broker
+    queue = await channel.declare_queue(
+        exclusive=True, arguments={"x-max-length": 1000}
+    )
+    publisher = Publisher(channel, max_unconfirmed=window)
+    body = b"x" * args.payload
+    latencies: list[float] = []
+
+    def confirmed(sent: float, _):
+        latencies.append(time.perf_counter() - sent)
+
+    started = time.perf_counter()
+    try:
+        for _ in range(args.messages):
+            confirm = await publisher.publish(Message(body), routing_key=queue.name)
+            confirm.add_done_callback(functools.partial(confirmed, time.perf_counter()))
+        await publisher.flush()
+        elapsed = time.perf_counter() - started
+    finally:
+        await channel.close()
+
+    return {
+        "window": window,
+        "payload": args.payload,
+        "sent": args.messages,
+        "failed": publisher.failed,
+        "throughput": args.messages / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+async def cleanup(conn: AbstractRobustConnection, queue_name: str):
+    """The worker queues are not auto deleted, remove them after the run"""
+    channel = await conn.channel()
+    try:
+        for priority_class in PriorityClass:
+            await channel.queue_delete(class_queue_name(queue_name, priority_class))
+        await channel.exchange_delete(cancel_exchange_name(queue_name))
+    finally:
+        await channel.close()
+
+
+async def run(args: argparse.Namespace, conf: Config) -> list[dict[str, Any]]:
+    conn = await aio_pika.connect_robust(str(conf.amqp))
+    results = []
+    try:
+        if args.confirm_windows:
+            for window in [int(i) for i in args.confirm_windows.split(",")]:
+                result = await run_publish(conn, args, window)
+                print(
+                    f"window={window}: {result['throughput']:.1f} msg/s, "
+                    f"confirm p50={result['p50'] * 1000:.1f}ms "
+                    f"p95={result['p95'] * 1000:.1f}ms "
+                    f"p99={result['p99'] * 1000:.1f}ms, failed {result['failed']}"
+                )
+                results.append(result)
+            return results
+
+        for serializer_name in args.serializers.split(","):
+            for prefetch in [int(i) for i in args.prefetch.split(",")]:
+                result = await run_one(conn, args, serializer_name, prefetch)
+                print(
+                    f"{serializer_name} prefetch={prefetch}: "
+                    f"{result['throughput']:.1f} rps, "
+                    f"p50={result['p50'] * 1000:.1f}ms "
+                    f"p95={result['p95'] * 1000:.1f}ms "
+                    f"p99={result['p99'] * 1000:.1f}ms, "
+                    f"max depth {result['max_depth']}, errors {result['errors']}"
+                )
+                results.append(result)
+    finally:
+        await conn.close()
+    return results
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="asynctask load test")
+    parser.add_argument("--config", default=os.environ.get("SRVC_CONFIG"))
+    parser.add_argument("--handler", choices=["echo", "sleep", "cpu"], default="echo")
+    parser.add_argument("--payload", type=int, default=1024, help="bytes")
+    parser.add_argument("--seconds", type=float, default=0.01, help="sleep/cpu time")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=100, help="requests/s")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--expiration", type=int, default=30)
+    parser.add_argument("--serializers", default="json", help="json,zlib")
+    parser.add_argument("--prefetch", default="1", help="e.g. 1,4,16")
+    parser.add_argument(
+        "--confirm-windows", help="e.g. 1,256, time raw publishes instead"
+    )
+    parser.add_argument("--messages", type=int, default=10000, help="publishes")
+    parser.add_argument("--out", help="JSON results file")
+    return parser
+
+
+def main(args: argparse.Namespace, conf: Config):
+    results = asyncio.run(run(args, conf))
+    if args.out:
+        with open(args.out, "w") as f:
+            report = {"timestamp": time.time(), "args": vars(args), "runs": results}
+            json.dump(report, f, indent=2)
+    return results
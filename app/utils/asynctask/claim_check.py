@@ -0,0 +1,85 @@
+import logging
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+CLAIM_HEADER = "x-claim"
+CLAIM_ACCEPT_HEADER = "x-claim-accept"  # the sender can load a claimed reply
+KEY_PREFIX = "asynctask:claim:"
+
+DEFAULT_THRESHOLD = 256 * 1024  # 256 KB
+DEFAULT_TTL = 300
+
+
+class ClaimStore:
+    async def put(self, key: str, data: bytes, ttl: int):
+        raise NotImplementedError()
+
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError()
+
+    async def delete(self, key: str):
+        raise NotImplementedError()
+
+
+class RedisClaimStore(ClaimStore):
+    def __init__(self, conn: Redis):
+        self.conn = conn
+
+    async def put(self, key: str, data: bytes, ttl: int):
+        await self.conn.set(key, data, ex=ttl)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.conn.get(key)
+
+    async def delete(self, key: str):
+        await self.conn.delete(key)
+
+
+class ClaimCheck:
+    """
+    Keeps large message bodies out of RabbitMQ.
+
+    Bodies above `threshold` are put to the store and the message carries
+    only the key in the `x-claim` header. The receiver loads the body
+    back before unpacking it. Request payloads are removed by the client
+    once it got the reply, reply payloads by the client after loading
+    them, anything left expires with the TTL
+    """
+
+    def __init__(
+        self,
+        store: ClaimStore,
+        threshold: int = DEFAULT_THRESHOLD,
+        ttl: int = DEFAULT_TTL,
+    ):
+        self.store = store
+        self.threshold = threshold
+        self.ttl = ttl
+
+    async def offload(
+        self, body: bytes, headers: dict, key: str, ttl: int | None = None
+    ) -> bytes:
+        if len(body) <= self.threshold:
+            return body
+        key = f"{KEY_PREFIX}{key}"
+        await self.store.put(key, body, ttl or self.ttl)
+        headers[CLAIM_HEADER] = key
+        return b""
+
+    async def restore(self, body: bytes, headers: dict | None) -> bytes | None:
+        """Message body, None when the claimed payload has expired"""
+        key = (headers or {}).get(CLAIM_HEADER)
+        if not key:
+            return body
+        return await self.store.get(key)
+
+    async def release(self, headers: dict | None):
+        key = (headers or {}).get(CLAIM_HEADER)
+        if not key:
+            return
+        try:
+            await self.store.delete(key)
+        except Exception as e:
+            logger.error(f"Failed to release claim {key}: {e}")
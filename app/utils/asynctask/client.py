@@ -10,26 +10,34 @@ from typing import (
 )
 
 from aio_pika import (
-    RobustQueue,
     RobustConnection,
-    RobustChannel,
     Message,
     DeliveryMode,
     IncomingMessage,
 )
 from aio_pika.message import ReturnedMessage
-from aio_pika.abc import ConsumerTag, AbstractQueueIterator, AbstractIncomingMessage
+from aio_pika.abc import AbstractIncomingMessage
 from aiormq.abc import ExceptionType
 
+from app.utils import metrics, tracing
+from .inflight import MAX_IN_FLIGHT, InFlight, Task
+from .mux import RpcMux
+from .claim_check import CLAIM_ACCEPT_HEADER, CLAIM_HEADER, ClaimCheck
 from .serializer import (
     Serializer,
 )
 from .models import (
+    DEADLINE_HEADER,
+    FLIGHT_HEADER,
     METHOD_HEADER,
     ErrorData,
     ModelClass,
     MessageType,
     ExceptionData,
+    PriorityClass,
+    cancel_exchange_name,
+    class_queue_name,
+    flight_key,
 )
 from .exceptions import (
     TaskCanceled,
@@ -42,95 +50,83 @@ from .exceptions import (
 logger = logging.getLogger(__name__)
 
 
-class Task:
-    def __init__(
-        self,
-        method: str,
-        data: bytes,
-        response_class: Type[ModelClass],
-        priority: int | None = None,
-        nullable_response: bool = False,
-    ):
-        self.id = uuid.uuid4().hex
-        self.method = method
-        self.data = data
-        self.priority = priority
-        self.response_class = response_class
-        self.nullable_response = nullable_response
-        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
-
-    def done(self):
-        return self.future.done()
-
-    def set_result(self, data):
-        if not self.done():
-            self.future.set_result(data)
-
-    def set_exception(self, exc):
-        if not self.done():
-            self.future.set_exception(exc)
-
-    def cancel(self, msg=None):
-        self.future.cancel(msg)
-
-
 class Client:
     @classmethod
     async def create(
-        cls, conn: RobustConnection, worker_queue_name: str, serializer: Serializer
+        cls,
+        conn: RobustConnection,
+        worker_queue_name: str,
+        serializer: Serializer,
+        claim_check: ClaimCheck | None = None,
+        routes: dict[str, PriorityClass] | None = None,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        direct_reply: bool = False,
+        confirms: bool = True,
     ) -> "Client":
-        instance = cls(conn, worker_queue_name, serializer)
+        instance = cls(
+            conn,
+            worker_queue_name,
+            serializer,
+            claim_check,
+            routes,
+            max_in_flight,
+            direct_reply,
+            confirms,
+        )
         await instance.init()
         return instance
 
     def __init__(
-        self, conn: RobustConnection, worker_queue_name: str, serializer: Serializer
+        self,
+        conn: RobustConnection,
+        worker_queue_name: str,
+        serializer: Serializer,
+        claim_check: ClaimCheck | None = None,
+        routes: dict[str, PriorityClass] | None = None,  # method -> class
+        max_in_flight: int = MAX_IN_FLIGHT,
+        # mux options, the first client of the connection sets them
+        direct_reply: bool = False,
+        confirms: bool = True,
     ):
         super().__init__()
         self.conn = conn
-        self.client_queue_name = f"asynctask.clients.{uuid.uuid4().hex}"
+        self.id = uuid.uuid4().hex[:12]
         self.worker_queue_name = worker_queue_name
         self.serializer = serializer
-        self.channel: RobustChannel | None = None
-        self.queue: RobustQueue | None = None
-        self.queue_iterator: AbstractQueueIterator | None = None
-        self.tasks: dict[str, Task] = {}
-        self.consumer_tag: ConsumerTag | None = None
+        self.claim_check = claim_check
+        self.routes = routes or {}
+        self.direct_reply = direct_reply
+        self.confirms = confirms
+        self.mux: RpcMux | None = None
+        self.inflight = InFlight(max_in_flight, worker_queue_name)
+        self.flights: dict[str, asyncio.Future] = {}  # flight key -> shared call
+        self.waiters: dict[asyncio.Future, int] = {}  # shared call -> callers
 
     async def init(self):
-        self.channel = await self.conn.channel()
-
-        self.queue = await self.channel.declare_queue(
-            name=self.client_queue_name,
-            auto_delete=True,
-        )
-
-        self.consumer_tag = await self.queue.consume(
-            self.on_message,
-            no_ack=False,
+        # the reply queue and channels are shared with the other clients
+        self.mux = await RpcMux.get(self.conn, self.direct_reply, self.confirms)
+        await self.mux.declare_exchange(cancel_exchange_name(self.worker_queue_name))
+        self.mux.register(self)
+        queue = self.worker_queue_name
+        metrics.RPC_IN_FLIGHT.labels(queue=queue).set_function(self.inflight.__len__)
+        metrics.RPC_OLDEST_SECONDS.labels(queue=queue).set_function(
+            self.inflight.oldest_age
         )
-
-        self.channel.close_callbacks.add(self.on_close)
-        self.channel.return_callbacks.add(self.on_message_returned)
         logger.info(f"Client initialised for queue {self.worker_queue_name}")
 
     async def close(self):
-        for task in self.tasks.values():
+        tasks = list(self.inflight.tasks.values())
+        for task in tasks:
             task.cancel()
-        if self.tasks:
-            await asyncio.wait([i.future for i in self.tasks.values()])
-        self.tasks = {}
-
-        if self.consumer_tag:
-            await self.queue.cancel(self.consumer_tag)
-        self.consumer_tag = None
-
-        if self.queue:
-            await self.queue.delete(if_unused=False, if_empty=False)
-        self.queue = None
-
-        if self.channel:
-            await self.channel.close()
+        if tasks:
+            await asyncio.wait([i.future for i in tasks])
+        self.inflight.close()
+        metrics.RPC_IN_FLIGHT.remove(self.worker_queue_name)
+        metrics.RPC_OLDEST_SECONDS.remove(self.worker_queue_name)
+
+        if self.mux:
+            await self.mux.unregister(self)
+        self.mux = None
         logger.info(f"Client for queue {self.worker_queue_name} closed")
 
     async def call(
@@ -141,77 +137,215 @@ class Client:
         priority: int | None = None,
         expiration: int | None = None,
         nullable_response: bool = False,
+        single_flight: bool = False,
+    ) -> Any:
+        """
+        With `single_flight` identical calls of an idempotent method share
+        one request while it is in flight, the worker coalesces them too
+        """
+        with (
+            metrics.RPC_SECONDS.labels(method=method).time(),
+            tracing.span(f"rpc {method}", method=method),
+        ):
+            try:
+                return await self._call_or_join(
+                    method,
+                    data,
+                    response_class,
+                    priority,
+                    expiration,
+                    nullable_response,
+                    single_flight,
+                )
+            except Exception as e:
+                error = e.__class__.__name__
+                metrics.RPC_ERRORS.labels(method=method, error=error).inc()
+                raise
+
+    async def _call_or_join(
+        self,
+        method: str,
+        data: ModelClass | None,
+        response_class: Type[ModelClass] | None,
+        priority: int | None,
+        expiration: int | None,
+        nullable_response: bool,
+        single_flight: bool,
+    ) -> Any:
+        body = self.serializer.pack(data)
+        if not single_flight:
+            return await self._call(
+                method, body, response_class, priority, expiration, nullable_response
+            )
+
+        key = flight_key(method, body)
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(
+                self._call(
+                    method,
+                    body,
+                    response_class,
+                    priority,
+                    expiration,
+                    nullable_response,
+                    flight=key,
+                )
+            )
+            self.flights[key] = flight
+            self.waiters[flight] = 0
+            flight.add_done_callback(functools.partial(self._land, key))
+        self.waiters[flight] += 1
+        try:
+            # one caller giving up must not cancel the others
+            return await asyncio.shield(flight)
+        finally:
+            self._leave(key, flight)
+
+    def _leave(self, key: str, flight: asyncio.Future):
+        if flight.done():
+            return
+        self.waiters[flight] -= 1
+        if not self.waiters[flight]:
+            # the last caller gave up, the call sends the cancel to the worker
+            flight.cancel()
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    def _land(self, key: str, flight: asyncio.Future):
+        self.waiters.pop(flight, None)
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    async def _call(
+        self,
+        method: str,
+        body: bytes,
+        response_class: Type[ModelClass] | None = None,
+        priority: int | None = None,
+        expiration: int | None = None,
+        nullable_response: bool = False,
+        flight: str | None = None,
     ) -> Any:
         task = Task(
             method=method,
-            data=data,
+            prefix=self.id,
             response_class=response_class,
             priority=priority,
             nullable_response=nullable_response,
         )
-        self.tasks[task.id] = task
+        headers = {METHOD_HEADER: method}
+        tracing.inject(headers)
+        # waits while too many calls are outstanding
+        await self.inflight.add(task, expiration)
+        try:
+            if expiration:
+                headers[DEADLINE_HEADER] = time.time() + expiration
+            if flight:
+                headers[FLIGHT_HEADER] = flight
+            if self.claim_check:
+                headers[CLAIM_ACCEPT_HEADER] = 1
+                body = await self.claim_check.offload(
+                    body, headers, task.id, expiration
+                )
+
+            message = Message(
+                body=body,
+                content_type=self.serializer.content_type(),
+                type=MessageType.REQUEST.value,
+                headers=headers,
+                timestamp=time.time(),
+                priority=task.priority,
+                correlation_id=task.id,
+                delivery_mode=DeliveryMode.NOT_PERSISTENT,
+                reply_to=self.mux.reply_to,
+                app_id=socket.gethostname(),
+                expiration=expiration,
+            )
+            confirm = await self.mux.publish(
+                message, routing_key=self.routing_key(method), mandatory=True
+            )
+            # no round trip per call, a nack fails the call instead
+            confirm.add_done_callback(functools.partial(self._on_confirm, task))
+
+            # the registry fails the future at the deadline
+            return await task.future
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            await self.cancel(task)
+            raise
+        finally:
+            self.inflight.pop(task.id)
+            if self.claim_check:
+                await self.claim_check.release(headers)
+
+    @staticmethod
+    def _on_confirm(task: Task, confirm: asyncio.Future):
+        if not confirm.cancelled() and (exc := confirm.exception()):
+            task.set_exception(exc)
 
+    async def cancel(self, task: Task):
+        """Tell the workers the caller gave up, so the handler is stopped"""
         message = Message(
-            body=self.serializer.pack(data),
-            content_type=self.serializer.content_type(),
-            type=MessageType.REQUEST.value,
-            headers={METHOD_HEADER: method},
-            timestamp=time.time(),
-            priority=task.priority,
+            body=b"",
+            type=MessageType.CANCEL.value,
             correlation_id=task.id,
             delivery_mode=DeliveryMode.NOT_PERSISTENT,
-            reply_to=self.queue.name,
+            timestamp=time.time(),
             app_id=socket.gethostname(),
-            expiration=expiration,
         )
+        try:
+            await self.mux.publish(
+                message,
+                routing_key="",
+                exchange=cancel_exchange_name(self.worker_queue_name),
+            )
+        except Exception as e:
+            logger.error(f"Failed to cancel task {task.id}: {e}")
 
-        await self.channel.default_exchange.publish(
-            message,
-            routing_key=self.worker_queue_name,
-            mandatory=True,
-        )
+    def metrics(self) -> dict[str, Any]:
+        """In-flight count, age of the oldest call, expired and late replies"""
+        return self.inflight.metrics()
 
-        return await asyncio.wait_for(task.future, timeout=expiration)
+    def routing_key(self, method: str) -> str:
+        priority_class = self.routes.get(method, PriorityClass.DEFAULT)
+        return class_queue_name(self.worker_queue_name, priority_class)
 
     async def on_message(
         self, incoming_message: IncomingMessage | AbstractIncomingMessage
     ):
-        task = self.tasks.pop(incoming_message.correlation_id, None)
+        """Reply routed by the mux, which acks it"""
+        task = self.inflight.pop(incoming_message.correlation_id)
         if not task:
-            logger.error(
-                f"Task {incoming_message.correlation_id} for message {incoming_message} not found"
-            )
-            await incoming_message.ack()
+            # the caller gave up already
+            self.inflight.late_reply()
+            if self.claim_check:
+                await self.claim_check.release(incoming_message.headers)
             return
 
         try:
+            body = incoming_message.body
+            if CLAIM_HEADER in (incoming_message.headers or {}):
+                body = await self._restore(incoming_message)
+
             if incoming_message.type == MessageType.SUCCESS:
-                if task.nullable_response and not incoming_message.body:
+                if task.nullable_response and not body:
                     task.set_result(None)
                 else:
-                    data = self.serializer.unpack(
-                        incoming_message.body, task.response_class
-                    )
+                    data = self.serializer.unpack(body, task.response_class)
                     task.set_result(data)
             elif incoming_message.type == MessageType.CANCELED:
                 task.set_exception(TaskCanceled())
             elif incoming_message.type == MessageType.ERROR:
                 task.set_exception(
-                    TaskError(
-                        self.serializer.unpack(incoming_message.body, ErrorData).message
-                    )
+                    TaskError(self.serializer.unpack(body, ErrorData).message)
                 )
             elif incoming_message.type == MessageType.EXCEPTION:
                 task.set_exception(
-                    TaskException(
-                        self.serializer.unpack(incoming_message.body, ExceptionData)
-                    )
+                    TaskException(self.serializer.unpack(body, ExceptionData))
                 )
             elif incoming_message.type == MessageType.NO_HANDLER:
                 task.set_exception(
-                    TaskNoHandler(
-                        self.serializer.unpack(incoming_message.body, ErrorData).message
-                    )
+                    TaskNoHandler(self.serializer.unpack(body, ErrorData).message)
                 )
             else:
                 task.set_exception(
@@ -221,20 +355,25 @@ class Client:
                 )
         except Exception as exc:
             task.set_exception(exc)
+
+    async def _restore(self, incoming_message: IncomingMessage) -> bytes:
+        if not self.claim_check:
+            raise RuntimeError("Claimed reply received without a claim check")
+        try:
+            body = await self.claim_check.restore(
+                incoming_message.body, incoming_message.headers
+            )
         finally:
-            try:
-                await incoming_message.ack()
-            except Exception:
-                logger.exception(
-                    f"Error asking message {incoming_message.body.decode()}"
-                )
-                raise
+            await self.claim_check.release(incoming_message.headers)
+        if body is None:
+            raise TaskError(f"Reply payload {incoming_message.correlation_id} expired")
+        return body
 
     def on_close(
         self,
         exc: ExceptionType | None = None,
     ) -> None:
-        for task in self.tasks.values():
+        for task in self.inflight.tasks.values():
             if not task.done():
                 if exc:
                     task.set_exception(exc)
@@ -243,7 +382,7 @@ class Client:
 
     def on_message_returned(self, returned_message: ReturnedMessage):
         logger.error("Message returned")
-        task = self.tasks.pop(returned_message.correlation_id, None)
+        task = self.inflight.pop(returned_message.correlation_id)
         if task:
             if not task.done():
                 task.set_exception(TaskReturned(f"Task {task.id} message returned"))
@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import time
+import uuid
+from typing import Any, Type
+
+from app.utils import metrics
+from .models import ModelClass
+
+MAX_IN_FLIGHT = 1000
+
+
+class Task:
+    def __init__(
+        self,
+        method: str,
+        response_class: Type[ModelClass],
+        priority: int | None = None,
+        nullable_response: bool = False,
+        prefix: str | None = None,  # routes the reply back to the client
+    ):
+        self.id = f"{prefix}.{uuid.uuid4().hex}" if prefix else uuid.uuid4().hex
+        self.method = method
+        self.priority = priority
+        self.response_class = response_class
+        self.nullable_response = nullable_response
+        self.created = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def done(self):
+        return self.future.done()
+
+    def set_result(self, data):
+        if not self.done():
+            self.future.set_result(data)
+
+    def set_exception(self, exc):
+        if not self.done():
+            self.future.set_exception(exc)
+
+    def cancel(self, msg=None):
+        self.future.cancel(msg)
+
+
+class InFlight:
+    """
+    Outstanding calls of a client.
+
+    At most `limit` calls are registered, `add` waits for a free slot
+    otherwise, but not past the deadline of the call. Deadlines are kept
+    in a heap served by a single timer, a task past its deadline fails
+    with a timeout. The caller removes its task with `pop` once done, so
+    replies coming after that are only counted
+    """
+
+    def __init__(self, limit: int = MAX_IN_FLIGHT, queue: str = ""):
+        self.limit = limit
+        self.queue = queue
+        self.tasks: dict[str, Task] = {}
+        self.expired: int = 0
+        self.late_replies: int = 0
+        self._expired_total = metrics.RPC_EXPIRED.labels(queue=queue)
+        self._late_replies_total = metrics.RPC_LATE_REPLIES.labels(queue=queue)
+        self._slots = asyncio.Semaphore(limit)
+        self._deadlines: list[tuple[float, str]] = []
+        self._timer: asyncio.TimerHandle | None = None
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    async def add(self, task: Task, timeout: float | None = None):
+        deadline = asyncio.get_running_loop().time() + timeout if timeout else None
+        try:
+            async with asyncio.timeout_at(deadline):
+                await self._slots.acquire()
+        except TimeoutError:
+            self._expire_one()
+            raise
+        self.tasks[task.id] = task
+        if deadline:
+            heapq.heappush(self._deadlines, (deadline, task.id))
+            self._schedule()
+
+    def pop(self, task_id: str | None) -> Task | None:
+        task = self.tasks.pop(task_id, None)
+        if task:
+            self._slots.release()
+        return task
+
+    def late_reply(self):
+        self.late_replies += 1
+        self._late_replies_total.inc()
+
+    def oldest_age(self) -> float:
+        # dicts keep insertion order, the first task is the oldest one.
+        # The metrics thread reads it too, while the loop changes the dict
+        try:
+            for task in self.tasks.values():
+                return time.monotonic() - task.created
+        except RuntimeError:
+            pass
+        return 0.0
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "in_flight": len(self.tasks),
+            "oldest_age": self.oldest_age(),
+            "limit": self.limit,
+            "expired": self.expired,
+            "late_replies": self.late_replies,
+        }
+
+    def _schedule(self):
+        if not self._deadlines:
+            return
+        when = self._deadlines[0][0]
+        if self._timer:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_at(when, self._expire)
+
+    def _expire(self):
+        self._timer = None
+        now = asyncio.get_running_loop().time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, task_id = heapq.heappop(self._deadlines)
+            task = self.tasks.get(task_id)
+            if task and not task.done():
+                self._expire_one()
+                task.set_exception(asyncio.TimeoutError())
+        self._schedule()
+
+    def _expire_one(self):
+        self.expired += 1
+        self._expired_total.inc()
+
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._deadlines = []
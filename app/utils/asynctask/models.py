@@ -1,3 +1,4 @@
+import hashlib
 from enum import Enum
 from typing import (
     TypeVar,
@@ -8,10 +9,15 @@ ModelClass = TypeVar("ModelClass", bound=BaseModel)
 
 
 METHOD_HEADER = "x-method"
+FLIGHT_HEADER = "x-flight"  # identical requests share the key
+DEADLINE_HEADER = "x-deadline"  # unix time the caller stops waiting at
+
+MAX_PRIORITY = 10
 
 
 class MessageType(str, Enum):
     REQUEST = "request"
+    CANCEL = "cancel"
     SUCCESS = "success"
     CANCELED = "canceled"
     EXCEPTION = "exception"
@@ -19,6 +25,26 @@ class MessageType(str, Enum):
     NO_HANDLER = "no_handler"
 
 
+class PriorityClass(str, Enum):
+    """Every class has its own queue, so bulk jobs don't delay interactive ones"""
+
+    INTERACTIVE = "interactive"
+    DEFAULT = "default"
+    BULK = "bulk"
+
+
+def class_queue_name(queue_name: str, priority_class: PriorityClass) -> str:
+    return f"{queue_name}.{priority_class.value}"
+
+
+def cancel_exchange_name(queue_name: str) -> str:
+    return f"{queue_name}.cancel"
+
+
+def flight_key(method: str, body: bytes) -> str:
+    return hashlib.sha256(method.encode("utf-8") + b"\0" + body).hexdigest()
+
+
 class ExceptionType(str, Enum):
     NETWORK = "network"
     KNOWN = "known"
@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+import logging
+import uuid
+from typing import TYPE_CHECKING
+
+from aio_pika import (
+    ExchangeType,
+    Message,
+    RobustChannel,
+    RobustQueue,
+    IncomingMessage,
+)
+from aio_pika.abc import ConsumerTag, AbstractIncomingMessage
+from aio_pika.message import ReturnedMessage
+from aiormq.abc import ExceptionType
+
+from .publisher import Publisher
+
+if TYPE_CHECKING:
+    from .client import Client
+
+logger = logging.getLogger(__name__)
+
+DIRECT_REPLY_TO = "amq.rabbitmq.reply-to"
+POOL_SIZE = 4
+
+_muxes: dict[int, "RpcMux"] = {}  # id of the connection -> mux
+
+
+def client_id(correlation_id: str | None) -> str:
+    return (correlation_id or "").split(".", 1)[0]
+
+
+class RpcMux:
+    """
+    Reply queue and publish channels shared by all clients of a connection.
+
+    Replies of every client come to one queue and are routed back by the
+    client id prefix of the correlation id. With `direct_reply` the
+    `amq.rabbitmq.reply-to` pseudo queue is used instead, no queue is
+    declared at all, but requests then have to go through the consuming
+    channel. Otherwise requests are spread over a few publish channels.
+    Publishes don't wait for the broker confirm, see `Publisher`. The mux
+    is created with the first client and closed with the last one, so
+    creating a client costs no broker round trips
+    """
+
+    @classmethod
+    async def get(
+        cls, conn, direct_reply: bool = False, confirms: bool = True
+    ) -> "RpcMux":
+        mux = _muxes.get(id(conn))
+        if mux is None:
+            mux = _muxes[id(conn)] = cls(conn, direct_reply, confirms)
+        await mux.init()
+        return mux
+
+    def __init__(
+        self,
+        conn,
+        direct_reply: bool = False,
+        confirms: bool = True,
+        pool_size: int = POOL_SIZE,
+    ):
+        self.conn = conn
+        self.direct_reply = direct_reply
+        self.confirms = confirms
+        self.pool_size = pool_size
+        self.clients: dict[str, "Client"] = {}
+        self.channel: RobustChannel | None = None
+        self.queue: RobustQueue | None = None
+        self.consumer_tag: ConsumerTag | None = None
+        self.exchanges: set[str] = set()
+        self.publishers: list[Publisher] = []
+        self._next_publisher = itertools.cycle(())
+        self._lock = asyncio.Lock()
+
+    @property
+    def reply_to(self) -> str:
+        return DIRECT_REPLY_TO if self.direct_reply else self.queue.name
+
+    async def init(self):
+        async with self._lock:
+            if self.channel:
+                return
+
+            self.channel = await self.conn.channel(publisher_confirms=self.confirms)
+            if self.direct_reply:
+                self.queue = await self.channel.declare_queue(name=DIRECT_REPLY_TO)
+            else:
+                self.queue = await self.channel.declare_queue(
+                    name=f"asynctask.clients.{uuid.uuid4().hex}",
+                    auto_delete=True,
+                )
+            # direct replies can't be acked
+            self.consumer_tag = await self.queue.consume(
+                self.on_message, no_ack=self.direct_reply
+            )
+
+            self.channel.close_callbacks.add(self.on_close)
+            self.channel.return_callbacks.add(self.on_message_returned)
+
+            if self.direct_reply:
+                # direct replies only come to the channel the request was sent with
+                self.publishers = [Publisher(self.channel)]
+            else:
+                self.publishers = [
+                    Publisher(await self._new_channel()) for _ in range(self.pool_size)
+                ]
+            self._next_publisher = itertools.cycle(self.publishers)
+            logger.info(f"RPC mux initialised, replies to {self.reply_to}")
+
+    async def close(self):
+        _muxes.pop(id(self.conn), None)
+        async with self._lock:
+            if self.consumer_tag:
+                await self.queue.cancel(self.consumer_tag)
+            self.consumer_tag = None
+
+            if self.queue and not self.direct_reply:
+                await self.queue.delete(if_unused=False, if_empty=False)
+            self.queue = None
+
+            for publisher in self.publishers:
+                await publisher.flush()
+                if publisher.channel is not self.channel:
+                    await publisher.channel.close()
+            self.publishers = []
+            if self.channel:
+                await self.channel.close()
+            self.channel = None
+        logger.info("RPC mux closed")
+
+    def register(self, client: "Client"):
+        self.clients[client.id] = client
+
+    async def unregister(self, client: "Client"):
+        self.clients.pop(client.id, None)
+        if not self.clients:
+            await self.close()
+
+    async def declare_exchange(self, name: str):
+        if name in self.exchanges:
+            return
+        await self.channel.declare_exchange(name, ExchangeType.FANOUT)
+        self.exchanges.add(name)
+
+    async def _new_channel(self) -> RobustChannel:
+        channel = await self.conn.channel(publisher_confirms=self.confirms)
+        channel.return_callbacks.add(self.on_message_returned)
+        return channel
+
+    async def publish(
+        self,
+        message: Message,
+        routing_key: str,
+        exchange: str | None = None,
+        mandatory: bool = False,
+    ) -> asyncio.Future:
+        """Returns once the message is queued, the future resolves on confirm"""
+        return await next(self._next_publisher).publish(
+            message, routing_key=routing_key, exchange=exchange, mandatory=mandatory
+        )
+
+    async def flush(self):
+        for publisher in self.publishers:
+            await publisher.flush()
+
+    async def on_message(
+        self, incoming_message: IncomingMessage | AbstractIncomingMessage
+    ):
+        client = self.clients.get(client_id(incoming_message.correlation_id))
+        try:
+            if client:
+                await client.on_message(incoming_message)
+            else:
+                logger.info(f"Reply {incoming_message.correlation_id} has no client")
+        finally:
+            if not self.direct_reply:
+                try:
+                    await incoming_message.ack()
+                except Exception:
+                    logger.exception(
+                        f"Error asking message {incoming_message.correlation_id}"
+                    )
+                    raise
+
+    def on_close(self, sender, exc: ExceptionType | None = None):
+        for client in self.clients.values():
+            client.on_close(exc)
+
+    def on_message_returned(self, sender, returned_message: ReturnedMessage):
+        client = self.clients.get(client_id(returned_message.correlation_id))
+        if client:
+            client.on_message_returned(returned_message)
+        else:
+            logger.error(f"Message returned {returned_message}")
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+from aio_pika import Message, RobustChannel
+
+logger = logging.getLogger(__name__)
+
+MAX_UNCONFIRMED = 256
+
+
+class Publisher:
+    """
+    Publishes through a channel without waiting for every confirm in turn.
+
+    `publish` returns as soon as the message is queued for writing, the
+    returned future resolves with the broker confirm. At most
+    `max_unconfirmed` messages are unconfirmed at a time, further
+    publishes wait for a slot, so confirms are collected in batches
+    instead of one round trip per message. `flush` waits for all of them
+    """
+
+    def __init__(self, channel: RobustChannel, max_unconfirmed: int = MAX_UNCONFIRMED):
+        self.channel = channel
+        self.failed: int = 0
+        self._window = asyncio.Semaphore(max_unconfirmed)
+        self._unconfirmed: set[asyncio.Future] = set()
+
+    def __len__(self) -> int:
+        return len(self._unconfirmed)
+
+    async def publish(
+        self,
+        message: Message,
+        routing_key: str,
+        exchange: str | None = None,
+        mandatory: bool = False,
+    ) -> asyncio.Future:
+        await self._window.acquire()
+        try:
+            if exchange:
+                target = await self.channel.get_exchange(exchange, ensure=False)
+            else:
+                target = self.channel.default_exchange
+        except BaseException:
+            self._window.release()
+            raise
+
+        confirm = asyncio.ensure_future(
+            target.publish(message, routing_key=routing_key, mandatory=mandatory)
+        )
+        self._unconfirmed.add(confirm)
+        confirm.add_done_callback(self._confirmed)
+        return confirm
+
+    def _confirmed(self, confirm: asyncio.Future):
+        self._unconfirmed.discard(confirm)
+        self._window.release()
+        if not confirm.cancelled() and (exc := confirm.exception()):
+            self.failed += 1
+            logger.error(f"Publish failed: {exc!r}")
+
+    async def flush(self):
+        if self._unconfirmed:
+            await asyncio.wait(set(self._unconfirmed))
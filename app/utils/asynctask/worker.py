@@ -1,14 +1,17 @@
 import asyncio
+import functools
 import logging
 import socket
 import time
 from typing import (
+    Any,
     Awaitable,
     Type,
     Callable,
 )
 
 from aio_pika import (
+    ExchangeType,
     RobustQueue,
     RobustConnection,
     Connection,
@@ -20,21 +23,33 @@ from aio_pika.abc import ConsumerTag, AbstractRobustConnection, AbstractIncoming
 from aiormq.abc import ExceptionType
 from pydantic import BaseModel
 
+from app.utils import metrics, tracing
+from .publisher import Publisher
+from .claim_check import CLAIM_ACCEPT_HEADER, CLAIM_HEADER, ClaimCheck
 from .serializer import (
     Serializer,
 )
 from .models import (
+    DEADLINE_HEADER,
+    FLIGHT_HEADER,
+    MAX_PRIORITY,
     METHOD_HEADER,
     ErrorData,
     ExceptionData,
     ExceptionType,
     MessageType,
     ModelClass,
+    PriorityClass,
+    cancel_exchange_name,
+    class_queue_name,
 )
 
 logger = logging.getLogger(__name__)
 
 QUEUE_NAME = "tasks"
+FLIGHT_WINDOW = 4  # extra prefetch, so duplicates of a running request arrive
+CANCELED_TTL = 300  # seconds a cancel is kept for requests still queued
+DEPTH_INTERVAL = 15  # seconds between queue depth reports
 
 HandlerCallback = Callable[["Context"], Awaitable[None]]
 
@@ -51,6 +66,38 @@ class Handler:
         await self.handler(context)
 
 
+class ClassStats:
+    """Queue wait and handling time of one priority class"""
+
+    def __init__(self):
+        self.handled: int = 0
+        self.skipped: int = 0  # expired or canceled before start
+        self.joined: int = 0  # replied with the result of an identical request
+        self.wait_total: float = 0.0
+        self.wait_max: float = 0.0
+        self.duration_total: float = 0.0
+        self.duration_max: float = 0.0
+
+    def add(self, wait: float, duration: float):
+        self.handled += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.duration_total += duration
+        self.duration_max = max(self.duration_max, duration)
+
+    def dict(self) -> dict[str, Any]:
+        handled = self.handled or 1
+        return {
+            "handled": self.handled,
+            "skipped": self.skipped,
+            "joined": self.joined,
+            "wait_avg": self.wait_total / handled,
+            "wait_max": self.wait_max,
+            "duration_avg": self.duration_total / handled,
+            "duration_max": self.duration_max,
+        }
+
+
 class Context:
     def __init__(
         self, incoming_message: IncomingMessage, data: ModelClass, worker: "Worker"
@@ -59,6 +106,7 @@ class Context:
         self.data = data
         self.worker = worker
         self.replied: bool = False
+        self.result: tuple[MessageType, ModelClass | None] | None = None
         self.lock: asyncio.Lock = asyncio.Lock()
 
     async def success(self, data: ModelClass | None = None):
@@ -77,6 +125,7 @@ class Context:
         async with self.lock:
             if not self.replied:
                 self.replied = True
+                self.result = (t, data)
                 await self.worker.reply_to(
                     incoming_message=self.incoming_message, data=data, t=t
                 )
@@ -91,8 +140,20 @@ class Worker:
         serializer: Serializer,
         prefetch_count: int = 1,
         enable_reply: bool = True,
+        claim_check: ClaimCheck | None = None,
+        flight_window: int = 0,
+        class_limits: dict[PriorityClass, int] | None = None,
     ) -> "Worker":
-        instance = cls(conn, queue_name, serializer, prefetch_count, enable_reply)
+        instance = cls(
+            conn,
+            queue_name,
+            serializer,
+            prefetch_count,
+            enable_reply,
+            claim_check,
+            flight_window,
+            class_limits,
+        )
         await instance.init()
         return instance
 
@@ -103,43 +164,106 @@ class Worker:
         serializer: Serializer,
         prefetch_count: int = 1,
         enable_reply: bool = True,
+        claim_check: ClaimCheck | None = None,
+        flight_window: int = 0,
+        class_limits: dict[PriorityClass, int] | None = None,
     ):
+        """
+        `prefetch_count` requests are handled at a time, of all classes
+        together. A class in `class_limits` gets that many handlers of its
+        own, so it doesn't wait behind the others.
+        With `flight_window` that many more are taken from the queue, so a
+        duplicate of a running single flight request is seen and joins it
+        instead of waiting behind it
+        """
         super().__init__()
         self.conn = conn
         self.queue_name = queue_name
         self.serializer = serializer
         self.prefetch_count = prefetch_count
+        self.flight_window = flight_window
         self.enable_reply = enable_reply
+        self.claim_check = claim_check
         self.channel: RobustChannel | None = None
-        self.queue: RobustQueue | None = None
+        self.publisher: Publisher | None = None
+        self.queues: dict[PriorityClass, RobustQueue] = {}
         self.handlers: dict[str, Handler] = {}
-        self.consumer_tag: ConsumerTag | None = None
+        self.consumer_tags: dict[PriorityClass, ConsumerTag] = {}
+        self.cancel_queue: RobustQueue | None = None
+        self.cancel_consumer_tag: ConsumerTag | None = None
+        self.running: dict[str, asyncio.Task] = {}  # correlation id -> handler
+        self.canceled: dict[str, float] = {}  # correlation id -> forget at
+        self.stats: dict[PriorityClass, ClassStats] = {
+            c: ClassStats() for c in PriorityClass
+        }
+        self.class_limits = class_limits or {}
+        shared = asyncio.Semaphore(prefetch_count)
+        self.slots: dict[PriorityClass, asyncio.Semaphore] = {
+            c: (
+                asyncio.Semaphore(self.class_limits[c])
+                if c in self.class_limits
+                else shared
+            )
+            for c in PriorityClass
+        }
+        self.depth_task: asyncio.Task | None = None
+        # flight key -> reply of the request received first
+        self.flights: dict[str, asyncio.Future] = {}
         self.lock: asyncio.Lock = asyncio.Lock()
 
     async def init(self):
         self.channel = await self.conn.channel()
-        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+        # per consumer, so every class gets its own prefetch window. The
+        # slots bound the handlers, the rest of the window waits for them
+        limit = max([self.prefetch_count, *self.class_limits.values()])
+        await self.channel.set_qos(prefetch_count=limit + self.flight_window)
+        self.publisher = Publisher(self.channel)
+
+        for priority_class in PriorityClass:
+            queue = await self.channel.declare_queue(
+                name=class_queue_name(self.queue_name, priority_class),
+                auto_delete=False,
+                arguments={"x-max-priority": MAX_PRIORITY},
+            )
+            self.queues[priority_class] = queue
+            self.consumer_tags[priority_class] = await queue.consume(
+                functools.partial(self.on_message, priority_class=priority_class),
+                no_ack=False,
+            )
 
-        self.queue = await self.channel.declare_queue(
-            name=self.queue_name,
-            auto_delete=False,
+        # fanout, so a cancel reaches whichever worker took the request
+        cancel_exchange = await self.channel.declare_exchange(
+            cancel_exchange_name(self.queue_name), ExchangeType.FANOUT
         )
-
-        self.consumer_tag = await self.queue.consume(
-            self.on_message,
-            no_ack=False,
+        self.cancel_queue = await self.channel.declare_queue(
+            exclusive=True, auto_delete=True
+        )
+        await self.cancel_queue.bind(cancel_exchange)
+        self.cancel_consumer_tag = await self.cancel_queue.consume(
+            self.on_cancel, no_ack=True
         )
 
+        self.depth_task = asyncio.create_task(self.report_depth())
         logger.info(f"Worker initialised for queue {self.queue_name}")
 
     async def close(self):
         # async with self.lock:
-        if self.consumer_tag:
-            await self.queue.cancel(self.consumer_tag)
-        self.consumer_tag = None
-
-        self.queue = None
-
+        if self.depth_task:
+            self.depth_task.cancel()
+        self.depth_task = None
+        for priority_class, consumer_tag in self.consumer_tags.items():
+            await self.queues[priority_class].cancel(consumer_tag)
+        self.consumer_tags = {}
+
+        if self.cancel_consumer_tag:
+            await self.cancel_queue.cancel(self.cancel_consumer_tag)
+        self.cancel_consumer_tag = None
+        self.cancel_queue = None
+
+        self.queues = {}
+
+        if self.publisher:
+            await self.publisher.flush()
         if self.channel:
             await self.channel.close()
         logger.info(f"Worker for queue {self.queue_name} closed")
@@ -156,15 +280,65 @@ class Worker:
             f'Handler {method}[{model_class.__name__ if model_class else "None"}] registered'
         )
 
+    async def metrics(self) -> dict[str, Any]:
+        """Queue depth and latency of every priority class"""
+        data = {}
+        for priority_class, stats in self.stats.items():
+            data[priority_class.value] = stats.dict()
+            if self.channel and not self.channel.is_closed:
+                queue = await self.channel.declare_queue(
+                    class_queue_name(self.queue_name, priority_class), passive=True
+                )
+                depth = queue.declaration_result.message_count
+                data[priority_class.value]["depth"] = depth
+                metrics.RPC_QUEUE_DEPTH.labels(
+                    queue=self.queue_name, priority_class=priority_class.value
+                ).set(depth)
+        return data
+
+    async def report_depth(self):
+        """The depth needs a round trip, so it is polled rather than scraped"""
+        while True:
+            try:
+                await self.metrics()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Queue depth of {self.queue_name} not read: {e}")
+            await asyncio.sleep(DEPTH_INTERVAL)
+
     async def on_message(
-        self, incoming_message: IncomingMessage | AbstractIncomingMessage
+        self,
+        incoming_message: IncomingMessage | AbstractIncomingMessage,
+        priority_class: PriorityClass = PriorityClass.DEFAULT,
     ):
+        started = time.time()
+        skipped = False
+        key = (incoming_message.headers or {}).get(FLIGHT_HEADER)
+        flight = None
+        context = None
         try:
-            if not self.queue:
+            if not self.queues:
                 await incoming_message.reject(requeue=True)
                 return
 
-            await self.handle(incoming_message)
+            if key and await self.join(incoming_message, key):
+                skipped = True
+                self.stats[priority_class].joined += 1
+                return
+            if key:
+                # duplicates received from now on wait for this request
+                flight = self.flights[key] = asyncio.get_running_loop().create_future()
+
+            async with self.slots[priority_class]:
+                started = time.time()
+                if self.expired(incoming_message):
+                    # nobody waits for the reply
+                    skipped = True
+                    self.stats[priority_class].skipped += 1
+                    return
+
+                context = await self.run(incoming_message, priority_class)
         except (GeneratorExit, asyncio.CancelledError):
             await self.reply_to(
                 incoming_message=incoming_message,
@@ -182,6 +356,15 @@ class Worker:
                 ),
             )
         finally:
+            if flight is not None:
+                self._land(key, flight, context.result if context else None)
+            if not skipped:
+                sent_at = incoming_message.timestamp
+                wait = max(started - sent_at.timestamp(), 0.0) if sent_at else 0.0
+                self.stats[priority_class].add(wait, time.time() - started)
+                metrics.RPC_WAIT_SECONDS.labels(
+                    queue=self.queue_name, priority_class=priority_class.value
+                ).observe(wait)
             try:
                 await incoming_message.ack()
             except Exception:
@@ -190,7 +373,72 @@ class Worker:
                 )
                 raise
 
-    async def handle(self, incoming_message: IncomingMessage):
+    def expired(self, incoming_message: IncomingMessage) -> bool:
+        correlation_id = incoming_message.correlation_id
+        if correlation_id in self.canceled:
+            logger.info(f"Task {correlation_id} skipped, canceled by the client")
+            return True
+        deadline = (incoming_message.headers or {}).get(DEADLINE_HEADER)
+        if deadline and deadline < time.time():
+            logger.info(f"Task {correlation_id} skipped, deadline passed")
+            return True
+        return False
+
+    async def run(
+        self,
+        incoming_message: IncomingMessage,
+        priority_class: PriorityClass = PriorityClass.DEFAULT,
+    ) -> Context | None:
+        """
+        Handle the message in a task of its own, so a cancel from the
+        client or the deadline can stop it
+        """
+        correlation_id = incoming_message.correlation_id
+        deadline = (incoming_message.headers or {}).get(DEADLINE_HEADER)
+        timeout = deadline - time.time() if deadline else None
+
+        method = (incoming_message.headers or {}).get(METHOD_HEADER)
+        timer = metrics.RPC_HANDLER_SECONDS.labels(
+            queue=self.queue_name, priority_class=priority_class.value, method=method
+        )
+        # continues the trace of the caller, the handler task inherits the span
+        with tracing.span(
+            f"handle {method}",
+            parent=tracing.extract(incoming_message.headers),
+            queue=self.queue_name,
+        ):
+            task = asyncio.ensure_future(self.handle(incoming_message))
+            if correlation_id:
+                self.running[correlation_id] = task
+            try:
+                with timer.time():
+                    await asyncio.wait([task], timeout=timeout)
+                    if not task.done():
+                        logger.info(f"Task {correlation_id} canceled, deadline passed")
+                        task.cancel()
+                    return await task
+            finally:
+                self.running.pop(correlation_id, None)
+                if not task.done():
+                    task.cancel()
+
+    async def on_cancel(self, incoming_message: IncomingMessage):
+        correlation_id = incoming_message.correlation_id
+        task = self.running.get(correlation_id)
+        if task:
+            logger.info(f"Task {correlation_id} canceled by the client")
+            task.cancel()
+            return
+
+        # the request may still be queued, skip it when it comes
+        now = time.time()
+        for key, forget_at in list(self.canceled.items()):
+            if forget_at > now:
+                break
+            del self.canceled[key]
+        self.canceled[correlation_id] = now + CANCELED_TTL
+
+    async def handle(self, incoming_message: IncomingMessage) -> Context | None:
         method = incoming_message.headers.get(METHOD_HEADER, None)
         if not method:
             await self.reply_to(
@@ -209,13 +457,56 @@ class Worker:
             )
             return
 
-        await handler.handle(
-            context=Context(
-                incoming_message=incoming_message,
-                data=self.serializer.unpack(incoming_message.body, handler.model_class),
-                worker=self,
-            )
+        return await self._handle(incoming_message, handler)
+
+    async def _handle(
+        self, incoming_message: IncomingMessage, handler: Handler
+    ) -> Context | None:
+        body = incoming_message.body
+        if CLAIM_HEADER in incoming_message.headers:
+            body = None
+            if self.claim_check:
+                body = await self.claim_check.restore(
+                    incoming_message.body, incoming_message.headers
+                )
+            if body is None:
+                await self.reply_to(
+                    incoming_message=incoming_message,
+                    t=MessageType.ERROR,
+                    data=ErrorData(
+                        message=f"Payload of {handler.method} is not available"
+                    ),
+                )
+                return None
+
+        context = Context(
+            incoming_message=incoming_message,
+            data=self.serializer.unpack(body, handler.model_class),
+            worker=self,
         )
+        await handler.handle(context=context)
+        return context
+
+    async def join(self, incoming_message: IncomingMessage, key: str) -> bool:
+        """Replies with the result of an identical request being handled"""
+        while (flight := self.flights.get(key)) is not None:
+            result = await asyncio.shield(flight)
+            if result:
+                t, data = result
+                await self.reply_to(incoming_message=incoming_message, t=t, data=data)
+                return True
+            # the first request got no reply, the next one is waited for
+        return False
+
+    def _land(
+        self,
+        key: str,
+        flight: asyncio.Future,
+        result: tuple[MessageType, ModelClass | None] | None,
+    ):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        flight.set_result(result)
 
     async def reply_to(
         self,
@@ -227,17 +518,24 @@ class Worker:
             return None
 
         body = self.serializer.pack(data)
+        headers = {}
+        if self.claim_check and (incoming_message.headers or {}).get(
+            CLAIM_ACCEPT_HEADER
+        ):
+            body = await self.claim_check.offload(
+                body, headers, f"{incoming_message.correlation_id}.reply"
+            )
         reply_message = Message(
             type=t.value,
             body=body,
+            headers=headers,
             content_type=self.serializer.content_type(),
             correlation_id=incoming_message.correlation_id,
             delivery_mode=incoming_message.delivery_mode,
             timestamp=time.time(),
             app_id=socket.gethostname(),
         )
-        await self.channel.default_exchange.publish(
-            message=reply_message,
-            routing_key=incoming_message.reply_to,
-            mandatory=False,
+        # the confirm is not awaited, so the next request starts earlier
+        await self.publisher.publish(
+            reply_message, routing_key=incoming_message.reply_to, mandatory=False
         )
@@ -0,0 +1,47 @@
+import os
+import uuid
+
+from fastapi import UploadFile
+from pydantic import BaseModel
+
+from app.utils.s3 import S3Client
+
+UPLOADS_PREFIX = "uploads"
+
+
+class BlobRef(BaseModel):
+    """Reference to a payload stored in S3, sent over AMQP instead of the bytes"""
+
+    bucket: str
+    key: str
+    size: int
+    filename: str | None = None
+    content_type: str | None = None
+
+
+async def put_upload(
+    client: S3Client,
+    bucket: str,
+    file: UploadFile,
+    prefix: str = UPLOADS_PREFIX,
+) -> BlobRef:
+    ext = os.path.splitext(file.filename or "")[-1]
+    key = f"{prefix}/{uuid.uuid4().hex}{ext}"
+    size = await client.upload_stream(bucket, key, file.read)
+    return BlobRef(
+        bucket=bucket,
+        key=key,
+        size=size,
+        filename=file.filename,
+        content_type=file.content_type,
+    )
+
+
+async def download(
+    client: S3Client, ref: BlobRef, folder: str = "static"
+) -> str | None:
+    return await client.download(ref.bucket, ref.key, folder)
+
+
+async def delete(client: S3Client, ref: BlobRef):
+    await client.delete_file(ref.bucket, ref.key)
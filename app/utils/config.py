@@ -14,6 +14,17 @@ logger = logging.getLogger(__name__)
 
 class PostgresqlConfig(BaseModel):
     dsn: str
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 256
+    jit: bool = False
+    slow_statement_seconds: float | None = 1.0
+    read_dsn: str | None = None
+    max_replica_lag_seconds: float = 10
+    replica_check_seconds: float = 5
 
 
 class RedisConfig(BaseModel):
@@ -37,6 +48,11 @@ class FoldersConfig(BaseModel):
     templates: str
 
 
+class MediaCacheConfig(BaseModel):
+    path: str = "cache/media"
+    max_bytes: int = 2 * 1024 * 1024 * 1024  # 2 GB
+
+
 class VkConfig(BaseModel):
     vk_token: str
     user_token: str
@@ -45,6 +61,7 @@ class VkConfig(BaseModel):
     timeout: int = 60
     main_group_alias: str = ""
     api_version: str = "5.199"
+    user_api: bool = False  # calls and wall uploads with the user token
 
 
 class KafkaConfig(BaseModel):
@@ -56,6 +73,7 @@ class KafkaConfig(BaseModel):
 class DiscordConfig(BaseModel):
     token: str
     main_user_id: int = 358590015531646977
+    sessions_retention_months: int | None = None
 
 
 class DumperConfig(BaseModel):
@@ -76,6 +94,8 @@ class SftpConfig(BaseModel):
     password: str
     host: str
     port: int
+    pool_size: int = 4
+    keepalive_seconds: int = 30
 
 
 class S3Config(BaseModel):
@@ -84,9 +104,35 @@ class S3Config(BaseModel):
     endpoint_url: str
 
 
+class BlobsConfig(BaseModel):
+    bucket: str = "blobs"
+    inline_limit: int = 1024 * 1024  # larger payloads are sent as a BlobRef
+
+
+class MetricsConfig(BaseModel):
+    enabled: bool = True
+    port: int = 9100  # services only, the web apps serve /metrics themselves
+
+
+class TracingConfig(BaseModel):
+    enabled: bool = False
+    folder: str = "logs/traces"  # <service>.jsonl
+    sample_rate: float = 1.0
+
+
+class ProfilingConfig(BaseModel):
+    loop_monitor: bool = True
+    lag_interval: float = 0.5
+    slow_callback: float = 0.1  # seconds the loop may be blocked without a warning
+    asyncio_debug: bool = False  # asyncio debug mode, slows the loop down
+    folder: str = "logs/profiles"
+    sample_interval: float = 0.005
+
+
 class SteamConfig(BaseModel):
     key: str
     user_ids: list[str] = Field(default_factory=list)
+    sessions_retention_months: int | None = None
 
 
 class Config(BaseModel):
@@ -106,6 +152,11 @@ class Config(BaseModel):
     amqp: str
     s3: S3Config
     steam: SteamConfig
+    media_cache: MediaCacheConfig = MediaCacheConfig()
+    blobs: BlobsConfig = BlobsConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    tracing: TracingConfig = TracingConfig()
+    profiling: ProfilingConfig = ProfilingConfig()
 
 
 def read_config(path: str) -> Config:
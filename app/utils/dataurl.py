@@ -3,9 +3,9 @@ import re
 import textwrap
 import hashlib
 
-from base64 import b64decode as decode64
 from base64 import b64encode as encode64
-from typing import Any
+from binascii import a2b_base64
+from typing import Any, Iterator
 
 from urllib.parse import quote, unquote
 
@@ -28,6 +28,15 @@ DATA_URI_REGEX = (
 )
 _DATA_URI_RE = re.compile(r"^{}$".format(DATA_URI_REGEX), re.DOTALL)
 
+# header only, so validation doesn't scan the payload
+_DATA_URI_HEADER_RE = re.compile(r"^{}".format(DATA_URI_REGEX.split(r"(?P<data>")[0]))
+
+# the alphabet and padding, matched in place so the payload is not copied
+_BASE64_WHITESPACE = "\r\n\t "
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/\r\n\t ]*(?:=[\r\n\t ]*){0,2}")
+
+CHUNK_SIZE = 1024 * 1024  # multiple of 4, so base64 chunks decode separately
+
 
 class InvalidMimeType(ValueError):
     pass
@@ -46,7 +55,7 @@ class DataURL(str):
     def __get_pydantic_core_schema__(
         cls, source_type: Any, handler: GetCoreSchemaHandler
     ):
-        return core_schema.no_info_after_validator_function(cls, handler(str))
+        return core_schema.no_info_after_validator_function(cls.validate, handler(str))
 
     @classmethod
     def __get_pydantic_json_schema__(
@@ -59,6 +68,17 @@ class DataURL(str):
         )
         return json_schema
 
+    @classmethod
+    def validate(cls, value: str) -> "DataURL":
+        """
+        Checks the header and the base64 alphabet and length, so a malformed
+        payload fails validation. Only the decoding is left for later
+        """
+        uri = cls(value)
+        if uri.is_base64:
+            uri._check_base64()
+        return uri
+
     @classmethod
     def make(cls, mimetype, charset, base64, data):
         parts = ["data:"]
@@ -94,7 +114,8 @@ class DataURL(str):
     def __new__(cls, *args, **kwargs):
         uri = super(DataURL, cls).__new__(cls, *args, **kwargs)
         uri._parsed = uri._parse  # Trigger any ValueErrors on instantiation.
-        uri._md5 = hashlib.md5(uri.data).hexdigest()
+        uri._data = None
+        uri._md5 = None
         return uri
 
     def __repr__(self):
@@ -124,7 +145,41 @@ class DataURL(str):
 
     @property
     def data(self):
-        return self._parsed[4]
+        """Decoded on first access"""
+        if self._data is None:
+            self._data = self._decode()
+        return self._data
+
+    def view(self) -> memoryview:
+        data = self.data
+        if isinstance(data, str):
+            data = data.encode(self.charset or "utf-8")
+        return memoryview(data)
+
+    def iter_data(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Decode by chunks, without holding the whole payload in memory"""
+        if self._data is not None or not self.is_base64:
+            view = self.view()
+            for offset in range(0, len(view), chunk_size):
+                yield view[offset : offset + chunk_size].tobytes()
+            return
+
+        pending = ""
+        for start in range(self._parsed[4], len(self), chunk_size):
+            part = pending + self[start : start + chunk_size]
+            if " " in part or not part.isprintable():
+                part = "".join(part.split())  # wrapped payload
+            cut = len(part) - len(part) % 4
+            if cut:
+                yield a2b_base64(part[:cut])
+            pending = part[cut:]
+        if pending:
+            yield a2b_base64(pending)
+
+    def save(self, filepath: str, chunk_size: int = CHUNK_SIZE):
+        with open(filepath, "wb") as f:
+            for chunk in self.iter_data(chunk_size):
+                f.write(chunk)
 
     @property
     def text(self):
@@ -135,25 +190,37 @@ class DataURL(str):
 
     @property
     def md5(self):
+        if self._md5 is None:
+            hasher = hashlib.md5()
+            for chunk in self.iter_data():
+                hasher.update(chunk)
+            self._md5 = hasher.hexdigest()
         return self._md5
 
     @property
     def _parse(self):
-        match = _DATA_URI_RE.match(self)
+        match = _DATA_URI_HEADER_RE.match(self)
         if not match:
-            raise InvalidDataURL("Not a valid data URI: %r" % self)
+            raise InvalidDataURL("Not a valid data URI: %r" % self[:64])
         mimetype = match.group("mimetype") or None
         name = match.group("name") or None
         charset = match.group("charset") or None
 
-        if match.group("base64"):
-            _charset = charset or "utf-8"
-            _data = bytes(match.group("data"), _charset)
-            data = decode64(_data)
-        else:
-            data = unquote(match.group("data"))
-
-        return mimetype, name, charset, bool(match.group("base64")), data
+        return mimetype, name, charset, bool(match.group("base64")), match.end()
+
+    def _check_base64(self):
+        start = self._parsed[4]
+        if not _BASE64_RE.fullmatch(self, start):
+            raise InvalidDataURL("Invalid base64 data: %r" % self[:64])
+        size = len(self) - start - sum(self.count(c, start) for c in _BASE64_WHITESPACE)
+        if size % 4:
+            raise InvalidDataURL("Invalid base64 data length: %r" % self[:64])
+
+    def _decode(self):
+        payload = self[self._parsed[4] :]
+        if self.is_base64:
+            return a2b_base64(payload)
+        return unquote(payload)
 
     def ext(self) -> str:
         return self.get_ext(self.mimetype)
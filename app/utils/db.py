@@ -1,49 +1,298 @@
+import logging
+import time
 from contextlib import asynccontextmanager
+from typing import Any
 
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
     AsyncEngine,
     AsyncSession,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from app.utils import metrics, tracing
 from app.utils.config import PostgresqlConfig
 
+logger = logging.getLogger(__name__)
+
 Session = AsyncSession
 
+STATEMENTS_STATS_LIMIT = 500
+
+# connection record info keys
+CONNECT_SECONDS = "connect_seconds"
+POOL_WAIT_SECONDS = "pool_wait_seconds"
+
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM (now() - pg_last_xact_replay_timestamp())) END"
+)
+
+
+class StatementStats:
+    def __init__(self):
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+        }
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Notes how long a checkout waited for a free connection on the
+    connection record, the checkout event reports it. Opening a new
+    connection and the pre-ping are not part of the wait
+    """
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        record = super()._create_connection()
+        record.info[CONNECT_SECONDS] = time.perf_counter() - started
+        return record
+
+    def _do_get(self):
+        started = time.perf_counter()
+        record = super()._do_get()
+        connect = record.info.pop(CONNECT_SECONDS, 0.0)
+        record.info[POOL_WAIT_SECONDS] = time.perf_counter() - started - connect
+        return record
+
+
+class DBMetrics:
+    """Pool and statement stats of one engine, `pool` labels the exported ones"""
+
+    def __init__(
+        self, slow_statement_seconds: float | None = None, pool: str = "primary"
+    ):
+        self.slow_statement_seconds = slow_statement_seconds
+        self.pool = pool
+
+        self.connects: int = 0
+        self.checkouts: int = 0
+        self.checked_out: int = 0
+        self.invalidated: int = 0
+        self.wait: StatementStats = StatementStats()
+        self.statements: dict[str, StatementStats] = {}
+        self._wait_seconds = metrics.DB_POOL_WAIT_SECONDS.labels(pool=pool)
+        self._invalidated_total = metrics.DB_POOL_INVALIDATED.labels(pool=pool)
+
+    def export(self, engine: AsyncEngine):
+        """The gauges read the pool counters when scraped"""
+        pool = engine.sync_engine.pool
+        metrics.DB_POOL_CHECKED_OUT.labels(pool=self.pool).set_function(pool.checkedout)
+        # the pool counts the overflow from -pool_size
+        metrics.DB_POOL_OVERFLOW.labels(pool=self.pool).set_function(
+            lambda: max(pool.overflow(), 0)
+        )
+
+    def unexport(self):
+        metrics.DB_POOL_CHECKED_OUT.remove(self.pool)
+        metrics.DB_POOL_OVERFLOW.remove(self.pool)
+
+    def on_connect(self, *args):
+        self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        self.checked_out += 1
+        wait = connection_record.info.pop(POOL_WAIT_SECONDS, None)
+        if wait is not None:
+            self.wait.add(wait)
+            self._wait_seconds.observe(wait)
+
+    def on_checkin(self, *args):
+        self.checked_out = max(self.checked_out - 1, 0)
+
+    def on_invalidate(self, *args):
+        self.invalidated += 1
+        self._invalidated_total.inc()
+
+    def on_before_execute(self, conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def on_after_execute(self, conn, cursor, statement, parameters, context, many):
+        try:
+            started = conn.info["query_start"].pop()
+        except (KeyError, IndexError):
+            return
+        duration = time.perf_counter() - started
+        # the async session copies its context into the greenlet, so the
+        # statement becomes a child of the span that awaited it
+        end = time.time()
+        tracing.record("db.statement", end - duration, end, statement=statement[:200])
+
+        stats = self.statements.get(statement)
+        if stats is None:
+            if len(self.statements) >= STATEMENTS_STATS_LIMIT:
+                statement = "other"
+            stats = self.statements.setdefault(statement, StatementStats())
+        stats.add(duration)
+
+        if self.slow_statement_seconds and duration >= self.slow_statement_seconds:
+            logger.warning(f"Slow statement {duration:.3f}s: {statement}")
+
+    def dict(self, engine: AsyncEngine | None = None) -> dict[str, Any]:
+        data = {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checked_out": self.checked_out,
+            "invalidated": self.invalidated,
+            "wait": self.wait.dict(),
+            "statements": {k: v.dict() for k, v in self.statements.items()},
+        }
+        if engine:
+            pool = engine.pool
+            data["pool"] = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
+        return data
+
 
 class DBHelper:
     def __init__(
         self,
         dsn: str,
+        config: PostgresqlConfig | None = None,
     ):
         self._dsn = dsn
+        self._config = config or PostgresqlConfig(dsn=dsn)
         self.engine: AsyncEngine | None = None
         self.session_maker: async_sessionmaker[Session] | None = None
+        self.metrics: DBMetrics = DBMetrics(self._config.slow_statement_seconds)
+        self.read_metrics: DBMetrics = DBMetrics(
+            self._config.slow_statement_seconds, pool="replica"
+        )
+
+        self.read_engine: AsyncEngine | None = None
+        self.read_session_maker: async_sessionmaker[Session] | None = None
+        self._replica_ok: bool = False
+        self._replica_checked_at: float = 0.0
 
     async def init(self):
-        self.engine = create_async_engine(
-            url=self._dsn,
-            echo=False,
-            pool_recycle=3600,
-        )
+        self.engine = self._create_engine(self._dsn, self.metrics)
         self.session_maker = async_sessionmaker(
             bind=self.engine, expire_on_commit=False, class_=AsyncSession
         )
 
+        if self._config.read_dsn:
+            self.read_engine = self._create_engine(
+                self._config.read_dsn, self.read_metrics
+            )
+            self.read_session_maker = async_sessionmaker(
+                bind=self.read_engine, expire_on_commit=False, class_=AsyncSession
+            )
+
+    def _create_engine(self, dsn: str, db_metrics: DBMetrics) -> AsyncEngine:
+        server_settings = {}
+        if not self._config.jit:
+            server_settings["jit"] = "off"
+
+        engine = create_async_engine(
+            url=dsn,
+            echo=False,
+            poolclass=TimedQueuePool,
+            pool_size=self._config.pool_size,
+            max_overflow=self._config.max_overflow,
+            pool_timeout=self._config.pool_timeout,
+            pool_recycle=self._config.pool_recycle,
+            pool_pre_ping=self._config.pool_pre_ping,
+            connect_args={
+                "prepared_statement_cache_size": self._config.statement_cache_size,
+                "server_settings": server_settings,
+            },
+        )
+        self._register_events(engine, db_metrics)
+        db_metrics.export(engine)
+        return engine
+
+    @staticmethod
+    def _register_events(engine: AsyncEngine, db_metrics: DBMetrics):
+        pool = engine.sync_engine.pool
+        event.listen(pool, "connect", db_metrics.on_connect)
+        event.listen(pool, "checkout", db_metrics.on_checkout)
+        event.listen(pool, "checkin", db_metrics.on_checkin)
+        event.listen(pool, "invalidate", db_metrics.on_invalidate)
+        event.listen(
+            engine.sync_engine, "before_cursor_execute", db_metrics.on_before_execute
+        )
+        event.listen(
+            engine.sync_engine, "after_cursor_execute", db_metrics.on_after_execute
+        )
+
     async def close(self):
+        if self.read_engine:
+            self.read_metrics.unexport()
+            await self.read_engine.dispose(close=True)
+            self.read_engine = None
+            self.read_session_maker = None
         if self.engine:
+            self.metrics.unexport()
             await self.engine.dispose(close=True)
             self.engine = None
             self.session_maker = None
 
+    async def replica_available(self) -> bool:
+        if not self.read_session_maker:
+            return False
+
+        now = time.monotonic()
+        if now - self._replica_checked_at < self._config.replica_check_seconds:
+            return self._replica_ok
+        self._replica_checked_at = now
+
+        try:
+            async with self.read_engine.connect() as conn:
+                lag = await conn.scalar(REPLICA_LAG_QUERY)
+        except Exception as e:
+            logger.error(f"Replica is unavailable: {e}")
+            self._replica_ok = False
+            return self._replica_ok
+
+        self._replica_ok = lag is None or lag <= self._config.max_replica_lag_seconds
+        if not self._replica_ok:
+            logger.warning(f"Replica lag {lag:.1f}s, reading from primary")
+        return self._replica_ok
+
     @asynccontextmanager
-    async def get_session(self) -> Session:
-        async with self.session_maker() as session:
-            yield session
+    async def get_session(self, readonly: bool = False) -> Session:
+        session_maker = self.session_maker
+        if readonly and await self.replica_available():
+            session_maker = self.read_session_maker
+
+        readonly = session_maker is self.read_session_maker
+        with (
+            metrics.DB_SESSION_SECONDS.labels(readonly=readonly).time(),
+            tracing.span("db.session", readonly=readonly),
+        ):
+            # the connection is checked out on the first statement
+            async with session_maker() as session:
+                yield session
+
+    def get_metrics(self) -> dict[str, Any]:
+        data = self.metrics.dict(self.engine)
+        if self.read_engine:
+            data["replica"] = self.read_metrics.dict(self.read_engine)
+        return data
 
 
 async def init_db(config: PostgresqlConfig) -> DBHelper:
-    db_helper = DBHelper(config.dsn)
+    db_helper = DBHelper(config.dsn, config)
     await db_helper.init()
     return db_helper
@@ -11,9 +11,20 @@ logger = logging.getLogger(__name__)
 async def get(request: fastapi.Request) -> db.Session:
     state: State = request.app.state
     try:
-        sm = state.db_helper.session_maker
+        db_helper = state.db_helper
     except AttributeError:
         raise RuntimeError("Application state has no db pool")
     else:
-        async with sm(expire_on_commit=False) as session:
+        async with db_helper.get_session() as session:
+            yield session
+
+
+async def get_readonly(request: fastapi.Request) -> db.Session:
+    state: State = request.app.state
+    try:
+        db_helper = state.db_helper
+    except AttributeError:
+        raise RuntimeError("Application state has no db pool")
+    else:
+        async with db_helper.get_session(readonly=True) as session:
             yield session
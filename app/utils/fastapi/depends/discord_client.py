@@ -0,0 +1,12 @@
+import fastapi
+
+from app.services.discord.client import DiscordClient
+
+
+async def get(request: fastapi.Request) -> DiscordClient | None:
+    try:
+        discord_client = request.app.state.discord_client
+    except AttributeError:
+        raise RuntimeError("Application state has no discord client")
+    else:
+        return discord_client
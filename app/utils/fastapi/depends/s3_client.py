@@ -0,0 +1,12 @@
+import fastapi
+
+from app.utils.s3 import S3Client
+
+
+async def get(request: fastapi.Request) -> S3Client:
+    try:
+        s3_client = request.app.state.s3_client
+    except AttributeError:
+        raise RuntimeError("Application state has no s3 client")
+    else:
+        return s3_client
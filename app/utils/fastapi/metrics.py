@@ -0,0 +1,23 @@
+import time
+
+from fastapi import FastAPI, Request
+from prometheus_client import make_asgi_app
+
+from app.utils import metrics
+
+
+def register_metrics(app: FastAPI):
+    app.mount("/metrics", make_asgi_app())
+
+    @app.middleware("http")
+    async def observe_request(request: Request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        # route templates, so path parameters don't blow up the label set
+        route = request.scope.get("route")
+        metrics.HTTP_SECONDS.labels(
+            method=request.method,
+            route=getattr(route, "path", "other"),
+            status=response.status_code,
+        ).observe(time.perf_counter() - started)
+        return response
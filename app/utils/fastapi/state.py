@@ -4,11 +4,13 @@ import aio_pika
 from fastapi import FastAPI
 from jinja2 import Environment
 
+from app.services.discord.client import DiscordClient
 from app.services.utils.client import UtilsClient
 from app.utils import redis, smtp
 from app.utils.config import Config
 from app.services.vk_bot.client import VkBotClient
 from app.utils.db import DBHelper
+from app.utils.s3 import S3Client
 
 
 class State:
@@ -26,3 +28,5 @@ class State:
         self.amqp: aio_pika.RobustConnection | aio_pika.Connection | None = None
         self.vk_bot_client: VkBotClient | None = None
         self.utils_client: UtilsClient | None = None
+        self.discord_client: DiscordClient | None = None
+        self.s3_client: S3Client | None = None
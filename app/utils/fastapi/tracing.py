@@ -0,0 +1,19 @@
+from fastapi import FastAPI, Request
+
+from app.utils import tracing
+
+
+def register_tracing(app: FastAPI):
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        # a trace started by the caller is continued
+        parent = tracing.extract(dict(request.headers))
+        with tracing.span(f"http {request.method}", parent=parent) as span:
+            response = await call_next(request)
+            # an unsampled request shares the no-op span, it is left as is
+            if span.sampled:
+                route = request.scope.get("route")
+                path = getattr(route, "path", "other")
+                span.name = f"http {request.method} {path}"
+                span.set(status=response.status_code)
+            return response
@@ -1,15 +1,19 @@
 import asyncio
 import base64
+import hashlib
 import logging
 import os
 import uuid
 from typing import Any
 
+import aiofiles
 import aiohttp
 from fastapi import UploadFile
 from pydantic import BaseModel
 
+from app.utils import http
 from app.utils.dataurl import DataURL
+from app.utils.media_cache import MediaCache
 from app.utils.s3 import S3Client
 from app.utils.sftp import SftpClient
 
@@ -21,10 +25,17 @@ filepath_alias = str
 
 DOWNLOADS_DIR = "downloads"
 
+CHUNK_SIZE = 256 * 1024
+
+
+class FileTooLarge(Exception):
+    pass
+
 
 class TempFileModel(BaseModel):
     filepath: filepath_alias
     content_type: str | None = None
+    hash: str | None = None
 
 
 class TempFileBase:
@@ -56,21 +67,63 @@ class TempUploadFile(TempFileBase):
             filepath=f"static/{uuid.uuid4().hex}_{self.file_obj.filename}",
             content_type=self.file_obj.content_type,
         )
-        with open(self.file_model.filepath, "wb") as f:
-            data = await self.file_obj.read()
-            await asyncio.to_thread(f.write, data)
+        async with aiofiles.open(self.file_model.filepath, "wb") as f:
+            while chunk := await self.file_obj.read(CHUNK_SIZE):
+                await f.write(chunk)
         return self.file_model
 
 
 class TempUrlFile(TempFileBase):
 
-    def __init__(self, file_obj: url_alias):
+    def __init__(
+        self,
+        file_obj: url_alias,
+        hash_name: str | None = None,
+        cache: MediaCache | None = None,
+    ):
         super().__init__(file_obj)
+        self.hash_name = hash_name
+        self._cache = cache
 
     async def __aenter__(self) -> TempFileModel | None:
+        if self._cache:
+            return await self._from_cache()
+        self.file_model = await download_file(
+            self.file_obj,
+            folder="static",
+            basename=uuid.uuid4().hex,
+            hash_name=self.hash_name,
+        )
+        return self.file_model
+
+    async def _from_cache(self) -> TempFileModel | None:
+        cached = await self._cache.get_url(self.file_obj)
+        if cached:
+            ext = os.path.splitext(os.path.basename(self.file_obj).split("?")[0])[-1]
+            filepath = f"static/{uuid.uuid4().hex}{ext}"
+            await self._cache.checkout(cached.filepath, filepath)
+            self.file_model = TempFileModel(
+                filepath=filepath,
+                content_type=cached.content_type,
+                hash=cached.sha256 if self.hash_name == "sha256" else None,
+            )
+            return self.file_model
+
         self.file_model = await download_file(
-            self.file_obj, folder="static", basename=uuid.uuid4().hex
+            self.file_obj,
+            folder="static",
+            basename=uuid.uuid4().hex,
+            hash_name="sha256",
         )
+        if self.file_model:
+            await self._cache.put(
+                self.file_model.filepath,
+                self.file_model.hash,
+                self.file_obj,
+                self.file_model.content_type,
+            )
+            if self.hash_name != "sha256":
+                self.file_model.hash = None
         return self.file_model
 
 
@@ -90,11 +143,12 @@ class TempBase64File(TempFileBase):
             filepath=f"static/{uuid.uuid4().hex}.{self.file_obj.ext()}",
             content_type=self.file_obj.mimetype,
         )
-        data = self.file_obj.data
         if self.decode:
-            data = base64.b64decode(data)
-        with open(self.file_model.filepath, "wb") as f:
-            await asyncio.to_thread(f.write, data)
+            data = base64.b64decode(self.file_obj.view())
+            with open(self.file_model.filepath, "wb") as f:
+                await asyncio.to_thread(f.write, data)
+        else:
+            await asyncio.to_thread(self.file_obj.save, self.file_model.filepath)
         return self.file_model
 
 
@@ -141,7 +195,7 @@ class TempS3File(TempFileBase):
         self._bucket = bucket
         self._auto_remove = auto_remove
 
-    async def __aenter__(self) -> TempFileModel:
+    async def __aenter__(self) -> TempFileModel | None:
         self.file_obj: str
 
         stat = await self._client.head_file(self._bucket, self.file_obj)
@@ -151,9 +205,10 @@ class TempS3File(TempFileBase):
             )
 
         fp = await self._client.download(self._bucket, self.file_obj)
-        self.file_model = TempFileModel(
-            filepath=fp,
-        )
+        if fp:
+            self.file_model = TempFileModel(
+                filepath=fp,
+            )
         return self.file_model
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -167,6 +222,7 @@ async def download_file(
     folder: str = "static",
     basename: str | None = None,  # name without ext
     max_length: int = 104857600,  # 100 MB
+    hash_name: str | None = None,  # hashlib algorithm, e.g. "sha256"
 ) -> TempFileModel | None:
     filename = os.path.basename(url)
     if "?" in filename:
@@ -174,24 +230,42 @@ async def download_file(
     if basename:
         filename = f"{basename}{os.path.splitext(filename)[-1]}"
     filepath = os.path.join(folder, filename)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
+    hasher = hashlib.new(hash_name) if hash_name else None
+
+    try:
+        async with http.get_session().get(url) as resp:
             if resp.status >= 400:
                 logger.error(f"Status code: {resp.status}")
                 return None
 
-            length = int(resp.headers.get("Content-Length", 0))
+            length = resp.content_length
             content_type = resp.headers.get("Content-Type", None)
-            if not length:
-                logger.info(f"Response has no 'Content-Length'")
-                return None
-            if length > max_length:
+            if length and length > max_length:
                 logger.info(f"File is too large: {url=} {length=}")
                 return None
 
-            with open(filepath, "wb") as f:
-                f.write(await resp.read())
-    return TempFileModel(filepath=filepath, content_type=content_type)
+            received = 0
+            async with aiofiles.open(filepath, "wb") as f:
+                async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                    received += len(chunk)
+                    if received > max_length:
+                        raise FileTooLarge(f"File is too large: {url=} {received=}")
+                    if hasher:
+                        hasher.update(chunk)
+                    await f.write(chunk)
+    except (aiohttp.ClientError, asyncio.TimeoutError, FileTooLarge) as e:
+        logger.error(e)
+        await asyncio.to_thread(_remove_silent, filepath)
+        return None
+    except BaseException:
+        await asyncio.to_thread(_remove_silent, filepath)
+        raise
+
+    return TempFileModel(
+        filepath=filepath,
+        content_type=content_type,
+        hash=hasher.hexdigest() if hasher else None,
+    )
 
 
 async def clear_dir(path: str = DOWNLOADS_DIR):
@@ -199,3 +273,10 @@ async def clear_dir(path: str = DOWNLOADS_DIR):
         fp = os.path.join(path, f)
         if os.path.isfile(fp):
             await asyncio.to_thread(os.remove, fp)
+
+
+def _remove_silent(filepath: str):
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
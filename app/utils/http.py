@@ -0,0 +1,36 @@
+import aiohttp
+
+from app.utils import tracing
+
+LIMIT = 100
+LIMIT_PER_HOST = 10
+DNS_CACHE_TTL = 300
+TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+
+_session: aiohttp.ClientSession | None = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Process-wide session, so connections and DNS lookups are reused
+    between downloads. Must be called from a running event loop
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=LIMIT,
+                limit_per_host=LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+            ),
+            timeout=TIMEOUT,
+            trace_configs=[tracing.aiohttp_trace_config()],
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
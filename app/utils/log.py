@@ -1,9 +1,202 @@
+import atexit
+import datetime
+import decimal
+import enum
+import json
 import logging
-from logging.config import fileConfig
 import os
+import queue
+import random
+import threading
+import time
+import uuid
+from logging.config import fileConfig
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable
+
+from app.utils import tracing
 
 logger = logging.getLogger(__name__)
 LOG_ENV_KEY = "SRVC_LOG"
+LOG_FORMAT_ENV_KEY = "SRVC_LOG_FORMAT"  # "json" for structured output
+
+# arguments the listener may format, nobody can change them meanwhile
+_IMMUTABLE_TYPES = (
+    str,
+    bytes,
+    int,
+    float,
+    complex,
+    type(None),
+    enum.Enum,
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+    decimal.Decimal,
+    uuid.UUID,
+)
+
+# attributes every record has, the rest came with `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class Lazy:
+    """
+    Formatted only if the record passes the level and the filters:
+
+        logger.info("%s", Lazy(lambda: pformat(model.model_dump())))
+
+    It is called by the logging call itself, in the caller thread, never
+    by the listener, so it may read objects the caller changes afterwards
+    """
+
+    __slots__ = ("func", "args", "kwargs")
+
+    def __init__(self, func: Callable[..., Any], *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        return str(self.func(*self.args, **self.kwargs))
+
+    __repr__ = __str__
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        data.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in _RECORD_ATTRS
+        )
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class ThrottleFilter(logging.Filter):
+    """
+    Samples records below WARNING and limits them with a token bucket of
+    `rate` records per second. The number of records dropped since the
+    last emitted one is attached to it as `dropped`
+    """
+
+    def __init__(self, rate: float | None = None, burst: int = 1, sample: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+        self.dropped: int = 0
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            if not self._allow():
+                self.dropped += 1
+                return False
+            if self.dropped:
+                record.dropped = self.dropped
+                self.dropped = 0
+        return True
+
+    def _allow(self) -> bool:
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return False
+        if self.rate is None:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+def throttle(
+    name: str, rate: float | None = None, burst: int = 1, sample: float = 1.0
+) -> logging.Logger:
+    """Logger for high-volume dumps, records below WARNING are throttled"""
+    throttled = logging.getLogger(name)
+    for f in throttled.filters:
+        if isinstance(f, ThrottleFilter):
+            throttled.removeFilter(f)
+    throttled.addFilter(ThrottleFilter(rate, burst, sample))
+    return throttled
+
+
+def _immutable(value: Any) -> bool:
+    if isinstance(value, tuple):
+        return all(_immutable(i) for i in value)
+    return isinstance(value, _IMMUTABLE_TYPES)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread, which formats and writes them.
+    Records with immutable arguments only are formatted by the listener.
+    Others, Lazy included, are formatted here, as the listener would race
+    the caller changing them
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args and not (
+            isinstance(record.msg, str) and _immutable(record.args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        # still in the logging thread, the current span is known here
+        span = tracing.current()
+        if span.sampled and not hasattr(record, "trace_id"):
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return record
+
+
+_listener: QueueListener | None = None
+
+
+def start_listener(log_format: str | None = None):
+    """Moves the handlers of the root logger behind a queue"""
+    global _listener
+    root = logging.getLogger()
+    handlers = [h for h in root.handlers if not isinstance(h, QueueHandler)]
+    if _listener or not handlers:
+        return
+    if log_format == "json":
+        for handler in handlers:
+            handler.setFormatter(JsonFormatter())
+
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(AsyncQueueHandler(q))
+    _listener = QueueListener(q, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_listener)
+
+
+def stop_listener():
+    """Flushes the queued records"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
 
 kafka_logger = logging.getLogger("aiokafka")
 kafka_logger.setLevel(logging.CRITICAL)
@@ -13,6 +206,9 @@ for handler in kafka_logger.handlers:
 try:
     log_path = os.environ[LOG_ENV_KEY]
     if os.path.exists(log_path):
-        fileConfig(log_path)
+        # loggers of the modules imported above stay enabled
+        fileConfig(log_path, disable_existing_loggers=False)
 except:
     logger.error(f"Configuration file path not provided at environment [{LOG_ENV_KEY}]")
+
+start_listener(os.environ.get(LOG_FORMAT_ENV_KEY))
@@ -0,0 +1,354 @@
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Any
+
+import aiofiles
+import aiohttp
+from aiohttp.payload import AsyncIterablePayload
+
+from app.schemas.base import AttachmentType
+from app.utils import http
+from app.utils.dataurl import DataURL
+from app.utils.media_cache import MediaCache
+from app.utils.s3 import S3Client
+from app.utils.sftp import SftpClient
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+MAX_LENGTH = 104857600  # 100 MB
+UPLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+
+
+class MediaSource:
+    """
+    Media file which is read by chunks instead of being saved to disk.
+
+    Only one chunk is held in memory at a time: the upload request pulls
+    the next one when the previous one has been written to the socket.
+    Sources with unknown size can't be posted with Content-Length and are
+    spooled to a temp file first, see `open_media`
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        content_type: str | None = None,
+        size: int | None = None,
+    ):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+
+    async def __aenter__(self) -> "MediaSource":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @property
+    def streamable(self) -> bool:
+        return self.size is not None
+
+    def ext(self) -> str:
+        return os.path.splitext(self.filename)[-1].lstrip(".")
+
+    def attachment_type(self) -> AttachmentType:
+        if self.content_type:
+            return AttachmentType.by_content_type(self.content_type)
+        return AttachmentType.by_ext(self.ext())
+
+    def iter_chunks(self) -> AsyncIterator[bytes]:
+        raise NotImplementedError()
+
+
+class BytesMediaSource(MediaSource):
+
+    def __init__(
+        self,
+        data: bytes | memoryview,
+        filename: str,
+        content_type: str | None = None,
+    ):
+        super().__init__(filename, content_type, len(data))
+        self._data = memoryview(data)
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        for offset in range(0, len(self._data), CHUNK_SIZE):
+            yield self._data[offset : offset + CHUNK_SIZE].tobytes()
+
+    @classmethod
+    def from_dataurl(cls, dataurl: DataURL) -> "BytesMediaSource":
+        return cls(
+            dataurl.view(), f"{uuid.uuid4().hex}.{dataurl.ext()}", dataurl.mimetype
+        )
+
+
+class FileMediaSource(MediaSource):
+
+    def __init__(
+        self,
+        filepath: str,
+        content_type: str | None = None,
+        auto_remove: bool = False,
+    ):
+        super().__init__(os.path.basename(filepath), content_type)
+        self.filepath = filepath
+        self._auto_remove = auto_remove
+
+    async def open(self):
+        self.size = await asyncio.to_thread(os.path.getsize, self.filepath)
+
+    async def close(self):
+        if self._auto_remove:
+            try:
+                await asyncio.to_thread(os.remove, self.filepath)
+            except FileNotFoundError as e:
+                logger.exception(e)
+
+    def iter_chunks(self) -> AsyncIterator[bytes]:
+        return _iter_file(self.filepath)
+
+
+class S3MediaSource(MediaSource):
+
+    def __init__(
+        self,
+        path: str,  # s3 relative path
+        bucket: str,
+        client: S3Client,
+        auto_remove: bool = False,
+    ):
+        super().__init__(os.path.basename(path))
+        self.path = path
+        self._bucket = bucket
+        self._client = client
+        self._auto_remove = auto_remove
+
+    async def open(self):
+        stat = await self._client.head_file(self._bucket, self.path)
+        if stat:
+            self.size = stat.get("ContentLength")
+            logger.info(f"{self._bucket} {self.path} size: {self.size}")
+
+    async def close(self):
+        if self._auto_remove:
+            await self._client.delete_file(self._bucket, self.path)
+
+    def iter_chunks(self) -> AsyncIterator[bytes]:
+        return self._client.iter_chunks(self._bucket, self.path, CHUNK_SIZE)
+
+
+class SftpMediaSource(MediaSource):
+
+    def __init__(
+        self,
+        path: str,  # sftp relative path
+        client: SftpClient,
+        auto_remove: bool = False,
+    ):
+        super().__init__(os.path.basename(path))
+        self.path = path
+        self._client = client
+        self._auto_remove = auto_remove
+        self._iterators: list[AsyncGenerator[bytes, None]] = []
+
+    async def open(self):
+        stat = await self._client.stat(self.path)
+        self.size = stat.st_size
+        logger.info(f"{self.path} size: {self.size}")
+
+    async def close(self):
+        # an abandoned iterator holds a pool slot until it is closed
+        for iterator in self._iterators:
+            await iterator.aclose()
+        self._iterators = []
+        if self._auto_remove:
+            await self._client.remove(self.path)
+
+    def iter_chunks(self) -> AsyncIterator[bytes]:
+        iterator = self._client.iter_chunks(self.path, CHUNK_SIZE)
+        self._iterators.append(iterator)
+        return iterator
+
+
+class UrlMediaSource(MediaSource):
+    """
+    With `cache` a cached copy is used when present, otherwise the
+    response is written to the cache while it is streamed
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_length: int = MAX_LENGTH,
+        cache: MediaCache | None = None,
+    ):
+        filename = os.path.basename(url).split("?")[0]
+        super().__init__(f"{uuid.uuid4().hex}{os.path.splitext(filename)[-1]}")
+        self.url = url
+        self._max_length = max_length
+        self._cache = cache
+        self._checkout: str | None = None
+        self._response: aiohttp.ClientResponse | None = None
+
+    async def open(self):
+        if self._cache and (cached := await self._cache.get_url(self.url)):
+            self._checkout = self._cache.tmp_path()
+            await self._cache.checkout(cached.filepath, self._checkout)
+            self.content_type = cached.content_type
+            self.size = await asyncio.to_thread(os.path.getsize, self._checkout)
+            return
+
+        self._response = await http.get_session().get(self.url)
+        self._response.raise_for_status()
+
+        self.content_type = self._response.content_type
+        length = self._response.content_length
+        if length and length > self._max_length:
+            raise ValueError(f"File is too large: {self.url} {length=}")
+        self.size = length
+
+    async def close(self):
+        if self._checkout:
+            await asyncio.to_thread(_remove_silent, self._checkout)
+            self._checkout = None
+        if self._response:
+            self._response.release()
+            self._response = None
+
+    async def iter_chunks(self) -> AsyncIterator[bytes]:
+        if self._checkout:
+            async for chunk in _iter_file(self._checkout):
+                yield chunk
+            return
+
+        if not self._cache:
+            async for chunk in self._iter_response():
+                yield chunk
+            return
+
+        tmp = self._cache.tmp_path()
+        hasher = hashlib.sha256()
+        try:
+            async with aiofiles.open(tmp, "wb") as f:
+                async for chunk in self._iter_response():
+                    hasher.update(chunk)
+                    await f.write(chunk)
+                    yield chunk
+            await self._cache.put(tmp, hasher.hexdigest(), self.url, self.content_type)
+        finally:
+            await asyncio.to_thread(_remove_silent, tmp)
+
+    async def _iter_response(self) -> AsyncIterator[bytes]:
+        received = 0
+        async for chunk in self._response.content.iter_chunked(CHUNK_SIZE):
+            received += len(chunk)
+            if received > self._max_length:
+                raise ValueError(f"File is too large: {self.url}")
+            yield chunk
+
+
+async def spool(source: MediaSource, folder: str = "static") -> FileMediaSource:
+    """Save a source that can't be streamed to a temp file"""
+    filepath = os.path.join(folder, f"{uuid.uuid4().hex}_{source.filename}")
+    try:
+        async with (
+            aiofiles.open(filepath, "wb") as f,
+            aclosing(source.iter_chunks()) as chunks,
+        ):
+            async for chunk in chunks:
+                await f.write(chunk)
+    except BaseException:
+        await asyncio.to_thread(_remove_silent, filepath)
+        raise
+    media = FileMediaSource(filepath, source.content_type, auto_remove=True)
+    await media.open()
+    return media
+
+
+class open_media:
+    """
+    Opens a source, spooling it to a temp file only when it is not
+    streamable. The original source is closed on exit in both cases
+    """
+
+    def __init__(self, source: MediaSource, folder: str = "static"):
+        self._source = source
+        self._folder = folder
+        self._spooled: FileMediaSource | None = None
+
+    async def __aenter__(self) -> MediaSource:
+        try:
+            await self._source.open()
+            if self._source.streamable:
+                return self._source
+            logger.info(f"{self._source.filename} size is unknown, using temp file")
+            self._spooled = await spool(self._source, self._folder)
+            return self._spooled
+        except BaseException:
+            await self._source.close()
+            raise
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._spooled:
+            await self._spooled.close()
+            self._spooled = None
+        await self._source.close()
+
+
+class _SizedPayload(AsyncIterablePayload):
+    """Async iterable payload with known size, so it is sent with Content-Length"""
+
+    def __init__(self, source: MediaSource, **kwargs):
+        super().__init__(
+            source.iter_chunks(),
+            filename=source.filename,
+            content_type=source.content_type or "application/octet-stream",
+            **kwargs,
+        )
+        self._size = source.size
+
+
+async def post_multipart(
+    url: str,
+    field: str,
+    source: MediaSource,
+    session: aiohttp.ClientSession | None = None,
+) -> Any:
+    """Stream the source to the upload server as a multipart form field"""
+    if not source.streamable:
+        raise ValueError(f"{source.filename} size is unknown")
+
+    with aiohttp.MultipartWriter("form-data") as writer:
+        part = writer.append_payload(_SizedPayload(source))
+        part.set_content_disposition("form-data", name=field, filename=source.filename)
+
+    session = session or http.get_session()
+    async with session.post(url, data=writer, timeout=UPLOAD_TIMEOUT) as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
+
+
+async def _iter_file(filepath: str) -> AsyncIterator[bytes]:
+    async with aiofiles.open(filepath, "rb") as f:
+        while chunk := await f.read(CHUNK_SIZE):
+            yield chunk
+
+
+def _remove_silent(filepath: str):
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+
+import aiofiles
+from pydantic import BaseModel, ValidationError
+
+from app.utils.config import MediaCacheConfig
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = "blobs"
+URLS_DIR = "urls"
+TMP_DIR = "tmp"
+# eviction goes below the limit, so it doesn't run again on the next put
+LOW_WATERMARK = 0.9
+
+
+class CachedFile(BaseModel):
+    filepath: str
+    sha256: str
+    content_type: str | None = None
+
+
+class UrlEntry(BaseModel):
+    sha256: str
+    content_type: str | None = None
+
+
+class MediaCache:
+    """
+    Content-addressed disk cache of downloaded media.
+
+    Files are stored once under their sha256 and looked up either by that
+    hash or by the source URL. Writes go to a temp file which is renamed
+    into place, so readers never see a partial file. Least recently used
+    blobs are evicted when the cache grows above `max_bytes`, URL entries
+    of evicted blobs go with them. The size is kept as a running total,
+    the tree is only walked to evict, which also corrects the total for
+    files added by other services sharing the directory
+    """
+
+    def __init__(self, config: MediaCacheConfig):
+        self._path = config.path
+        self._max_bytes = config.max_bytes
+        self._evict_lock = asyncio.Lock()
+        self._size: int | None = None  # bytes of blobs, counted on first put
+        for folder in (BLOBS_DIR, URLS_DIR, TMP_DIR):
+            os.makedirs(os.path.join(self._path, folder), exist_ok=True)
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self._path, BLOBS_DIR, sha256[:2], sha256)
+
+    def _url_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self._path, URLS_DIR, key)
+
+    def tmp_path(self) -> str:
+        """Path on the cache filesystem, so `put` can link it without a copy"""
+        return os.path.join(self._path, TMP_DIR, uuid.uuid4().hex)
+
+    async def get(self, sha256: str) -> CachedFile | None:
+        filepath = await asyncio.to_thread(self._touch, self._blob_path(sha256))
+        if filepath:
+            return CachedFile(filepath=filepath, sha256=sha256)
+        return None
+
+    async def get_url(self, url: str) -> CachedFile | None:
+        try:
+            async with aiofiles.open(self._url_path(url), "r") as f:
+                entry = UrlEntry.model_validate_json(await f.read())
+        except (FileNotFoundError, ValidationError):
+            return None
+        cached = await self.get(entry.sha256)
+        if cached is None:
+            # the blob was evicted by another service sharing the cache
+            await asyncio.to_thread(_remove_silent, self._url_path(url))
+            return None
+        cached.content_type = entry.content_type
+        return cached
+
+    async def put(
+        self,
+        filepath: str,
+        sha256: str | None = None,
+        url: str | None = None,
+        content_type: str | None = None,
+    ) -> CachedFile:
+        """Add a file to the cache, the file itself is left in place"""
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(_file_sha256, filepath)
+        blob_path = self._blob_path(sha256)
+        added = await asyncio.to_thread(self._store, filepath, blob_path)
+        if url:
+            entry = UrlEntry(sha256=sha256, content_type=content_type)
+            await self._write_atomic(
+                self._url_path(url), entry.model_dump_json().encode("utf-8")
+            )
+        await self._evict(added)
+        return CachedFile(filepath=blob_path, sha256=sha256, content_type=content_type)
+
+    async def checkout(self, cached_path: str, filepath: str):
+        """Give a private copy of a cached file, e.g. for the temp file classes"""
+        await asyncio.to_thread(_link_or_copy, cached_path, filepath)
+
+    def _touch(self, path: str) -> str | None:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _store(self, filepath: str, blob_path: str) -> int:
+        """Bytes added to the cache"""
+        if self._touch(blob_path):
+            return 0
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp = self.tmp_path()
+        try:
+            _link_or_copy(filepath, tmp)
+            size = os.stat(tmp).st_size
+            os.replace(tmp, blob_path)
+        finally:
+            _remove_silent(tmp)
+        return size
+
+    async def _write_atomic(self, path: str, data: bytes):
+        tmp = self.tmp_path()
+        try:
+            async with aiofiles.open(tmp, "wb") as f:
+                await f.write(data)
+            await asyncio.to_thread(os.replace, tmp, path)
+        finally:
+            await asyncio.to_thread(_remove_silent, tmp)
+
+    async def _evict(self, added: int = 0):
+        async with self._evict_lock:
+            if self._size is None:
+                self._size = await asyncio.to_thread(self._blobs_size)
+            else:
+                self._size += added
+            if self._size <= self._max_bytes:
+                return
+            self._size, removed = await asyncio.to_thread(self._evict_sync)
+        logger.info(f"Media cache evicted {removed} files")
+
+    def _scan_blobs(self) -> list[tuple[float, int, str]]:
+        blobs = []
+        for root, _, files in os.walk(os.path.join(self._path, BLOBS_DIR)):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+        return blobs
+
+    def _blobs_size(self) -> int:
+        return sum(size for _, size, _ in self._scan_blobs())
+
+    def _evict_sync(self) -> tuple[int, int]:
+        """Evicts down to the low watermark, gives the size left and files removed"""
+        blobs = self._scan_blobs()
+        total = sum(size for _, size, _ in blobs)
+        target = self._max_bytes * LOW_WATERMARK
+
+        removed = 0
+        for _, size, path in sorted(blobs):
+            if total <= target:
+                break
+            _remove_silent(path)
+            total -= size
+            removed += 1
+        if removed:
+            self._prune_urls()
+        return total, removed
+
+    def _prune_urls(self):
+        """Removes the URL entries whose blob is gone"""
+        with os.scandir(os.path.join(self._path, URLS_DIR)) as entries:
+            for entry in entries:
+                try:
+                    with open(entry.path, "r") as f:
+                        url_entry = UrlEntry.model_validate_json(f.read())
+                except FileNotFoundError:
+                    continue
+                except ValidationError:
+                    _remove_silent(entry.path)
+                    continue
+                if not os.path.exists(self._blob_path(url_entry.sha256)):
+                    _remove_silent(entry.path)
+
+
+def _file_sha256(filepath: str) -> str:
+    hasher = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _remove_silent(filepath: str):
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,94 @@
+import logging
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from app.utils.config import MetricsConfig
+
+logger = logging.getLogger(__name__)
+
+VK_EVENTS = Counter("vk_events_total", "VK long poll events", ["type"])
+HANDLER_SECONDS = Histogram(
+    "handler_seconds", "Event handler latency", ["service", "handler"]
+)
+QUEUE_DEPTH = Gauge("queue_depth", "Items waiting in a service queue", ["service"])
+RPC_SECONDS = Histogram("rpc_seconds", "asynctask call latency", ["method"])
+RPC_ERRORS = Counter("rpc_errors_total", "Failed asynctask calls", ["method", "error"])
+RPC_IN_FLIGHT = Gauge("rpc_in_flight", "Outstanding asynctask calls", ["queue"])
+RPC_OLDEST_SECONDS = Gauge(
+    "rpc_oldest_in_flight_seconds", "Age of the oldest asynctask call", ["queue"]
+)
+RPC_EXPIRED = Counter(
+    "rpc_expired_total", "asynctask calls failed at their deadline", ["queue"]
+)
+RPC_LATE_REPLIES = Counter(
+    "rpc_late_replies_total", "asynctask replies after the caller gave up", ["queue"]
+)
+RPC_HANDLER_SECONDS = Histogram(
+    "rpc_handler_seconds",
+    "asynctask handler latency",
+    ["queue", "priority_class", "method"],
+)
+RPC_WAIT_SECONDS = Histogram(
+    "rpc_wait_seconds",
+    "Time an asynctask request waits before its handler starts",
+    ["queue", "priority_class"],
+)
+RPC_QUEUE_DEPTH = Gauge(
+    "rpc_queue_depth", "asynctask requests waiting", ["queue", "priority_class"]
+)
+DB_SESSION_SECONDS = Histogram(
+    "db_session_seconds", "Time a DB session is held", ["readonly"]
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections checked out of the pool", ["pool"]
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections opened over the pool size", ["pool"]
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Wait for a free pool connection",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_POOL_INVALIDATED = Counter(
+    "db_pool_invalidated_total", "Pool connections invalidated", ["pool"]
+)
+SELENIUM_SECONDS = Histogram(
+    "selenium_seconds",
+    "Selenium scrape duration",
+    ["operation"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 90),
+)
+HTTP_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop heartbeat",
+    ["service"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total", "Callbacks blocking the event loop", ["service"]
+)
+PARTITION_MAINTENANCE_FAILURES = Counter(
+    "partition_maintenance_failures_total", "Failed session partition maintenance runs"
+)
+
+_started: bool = False
+
+
+def start(config: MetricsConfig):
+    """Serve /metrics from a thread, so scrapes don't touch the event loop"""
+    global _started
+    if not config.enabled or _started:
+        return
+    try:
+        start_http_server(config.port)
+    except OSError as e:
+        # e.g. another service of the host took the port, it runs without metrics
+        logger.error(f"Metrics are not served on port {config.port}: {e}")
+        return
+    _started = True
+    logger.info(f"Metrics are served on port {config.port}")
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+
+from app.utils import metrics
+from app.utils.config import ProfilingConfig
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Measures the event loop lag with a heartbeat task. A watchdog thread
+    logs the stack of the loop thread while a callback blocks it for longer
+    than `slow_callback`, so the blocking code is named while it runs
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, config: ProfilingConfig, service: str
+    ):
+        self.loop = loop
+        self.config = config
+        self.service = service
+        self.blocked: int = 0
+        self._thread_id: int | None = None
+        self._beat: float = time.monotonic()
+        self._reported: float | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Called from the loop thread"""
+        if self._task:
+            return
+        if self.config.asyncio_debug:
+            # asyncio logs every callback slower than this, with its source
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = self.config.slow_callback
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = self.loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _heartbeat(self):
+        lag_seconds = metrics.LOOP_LAG_SECONDS.labels(service=self.service)
+        interval = self.config.lag_interval
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(interval)
+            lag_seconds.observe(max(time.monotonic() - self._beat - interval, 0.0))
+
+    def _watch(self):
+        interval = self.config.lag_interval
+        while not self._stop.wait(self.config.slow_callback / 2):
+            beat = self._beat
+            blocked = time.monotonic() - beat - interval
+            if blocked < self.config.slow_callback or self._reported == beat:
+                continue
+            # once per beat, the stack of a long block is logged only once
+            self._reported = beat
+            self.blocked += 1
+            metrics.LOOP_BLOCKED.labels(service=self.service).inc()
+            frame = sys._current_frames().get(self._thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            logger.warning(f"Event loop blocked for {blocked:.3f}s at:\n{stack}")
+
+
+def _fold(frame: FrameType | None) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        names.append(f"{code.co_qualname} ({filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the loop thread, or of all threads, from a
+    thread of its own. The result is written in the folded format
+    (`frame;frame;frame count` per line), which flamegraph.pl and
+    speedscope read
+    """
+
+    def __init__(
+        self,
+        config: ProfilingConfig,
+        service: str,
+        seconds: float,
+        all_threads: bool = False,
+    ):
+        self.config = config
+        self.seconds = seconds
+        self.all_threads = all_threads
+        self.path = os.path.join(
+            config.folder, f"{service}-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        )
+        self.samples: int = 0
+        self._stacks: collections.Counter[str] = collections.Counter()
+        self._thread_id: int | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Called from the loop thread"""
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Profiling for {self.seconds}s to {self.path}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        until = time.monotonic() + self.seconds
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.config.sample_interval):
+            if time.monotonic() >= until:
+                break
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id == self._thread_id:
+                    self._stacks[_fold(frame)] += 1
+                elif self.all_threads:
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    name = names.get(thread_id, thread_id)
+                    self._stacks[f"{name};{_fold(frame)}"] += 1
+            self.samples += 1
+        self._write()
+
+    def _write(self):
+        os.makedirs(self.config.folder, exist_ok=True)
+        with open(self.path, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Profile of {self.samples} samples written to {self.path}")
@@ -1,18 +1,32 @@
+import asyncio
 import logging
 import os
 import uuid
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
+from typing import AsyncIterator, Awaitable, Callable
 
 import aiofiles
+from aiobotocore.config import AioConfig
 from aiobotocore.session import (
     get_session,
     AioSession,
     AioBaseClient,
 )
 from aiohttp import ClientError
+from botocore.exceptions import BotoCoreError, ClientError as BotoClientError
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+
+CHUNK_SIZE = 1 * MB
+PART_SIZE = 8 * MB  # S3 requires at least 5 MB for all parts but the last one
+MULTIPART_THRESHOLD = PART_SIZE
+MAX_CONCURRENCY = 4
+MAX_POOL_CONNECTIONS = 10
+
+S3_ERRORS = (ClientError, BotoClientError, BotoCoreError)
+
 
 class S3Client:
 
@@ -21,6 +35,8 @@ class S3Client:
         access_key: str,
         secret_key: str,
         endpoint_url: str,
+        part_size: int = PART_SIZE,
+        max_concurrency: int = MAX_CONCURRENCY,
     ):
         self._access_key = access_key
         self._secret_key = secret_key
@@ -30,18 +46,35 @@ class S3Client:
             "aws_secret_access_key": secret_key,
             "endpoint_url": endpoint_url,
         }
+        self._part_size = part_size
+        self._max_concurrency = max_concurrency
         self._session: AioSession | None = None
+        self._exit_stack: AsyncExitStack | None = None
+        self._client: AioBaseClient | None = None
 
     async def init(self):
         self._session = get_session()
+        self._exit_stack = AsyncExitStack()
+        self._client = await self._exit_stack.enter_async_context(
+            self._session.create_client(
+                "s3",
+                config=AioConfig(max_pool_connections=MAX_POOL_CONNECTIONS),
+                **self._config,
+            )
+        )
 
     async def close(self):
+        if self._exit_stack:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+        self._client = None
         self._session = None
 
     @asynccontextmanager
     async def get_client(self) -> AioBaseClient:
-        async with self._session.create_client("s3", **self._config) as client:
-            yield client
+        if not self._client:
+            raise RuntimeError("S3 client is not initialised")
+        yield self._client
 
     async def upload_file(
             self,
@@ -52,15 +85,129 @@ class S3Client:
         filename = os.path.basename(filepath)
         key = os.path.join(path, filename)
         try:
-            async with self.get_client() as client:
-                async with aiofiles.open(filepath, "rb") as f:
-                    data = await f.read()
-                    return await client.put_object(Bucket=bucket, Key=key, Body=data)
-        except ClientError as e:
+            size = await asyncio.to_thread(os.path.getsize, filepath)
+            if size <= MULTIPART_THRESHOLD:
+                async with self.get_client() as client:
+                    async with aiofiles.open(filepath, "rb") as f:
+                        data = await f.read()
+                        return await client.put_object(
+                            Bucket=bucket, Key=key, Body=data
+                        )
+            return await self._upload_multipart(bucket, key, filepath, size)
+        except S3_ERRORS as e:
             logger.error(e)
         except FileNotFoundError as e:
             logger.error(e)
 
+    async def upload_stream(
+        self,
+        bucket: str,
+        key: str,
+        read: Callable[[int], Awaitable[bytes]],
+    ) -> int:
+        """
+        Upload from an async `read(size)` callable, e.g. `UploadFile.read`.
+        Only one part is held in memory. Returns the uploaded size
+        """
+        async with self.get_client() as client:
+            data = await read(self._part_size)
+            if len(data) < self._part_size:
+                await client.put_object(Bucket=bucket, Key=key, Body=data)
+                return len(data)
+
+            upload = await client.create_multipart_upload(Bucket=bucket, Key=key)
+            upload_id = upload["UploadId"]
+            parts, size = [], 0
+            try:
+                while data:
+                    response = await client.upload_part(
+                        Bucket=bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=len(parts) + 1,
+                        Body=data,
+                    )
+                    parts.append(
+                        {"PartNumber": len(parts) + 1, "ETag": response["ETag"]}
+                    )
+                    size += len(data)
+                    data = await read(self._part_size)
+                await client.complete_multipart_upload(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+            except BaseException:
+                await client.abort_multipart_upload(
+                    Bucket=bucket, Key=key, UploadId=upload_id
+                )
+                raise
+            return size
+
+    async def create_bucket(self, bucket: str):
+        try:
+            async with self.get_client() as client:
+                await client.head_bucket(Bucket=bucket)
+        except BotoClientError:
+            async with self.get_client() as client:
+                await client.create_bucket(Bucket=bucket)
+
+    async def _upload_multipart(
+        self,
+        bucket: str,
+        key: str,
+        filepath: str,
+        size: int,
+    ) -> dict:
+        """
+        Reads and uploads parts concurrently, so at most
+        `max_concurrency` parts are held in memory
+        """
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async with self.get_client() as client:
+            upload = await client.create_multipart_upload(Bucket=bucket, Key=key)
+            upload_id = upload["UploadId"]
+
+            async def upload_part(number: int, offset: int) -> dict:
+                async with semaphore:
+                    async with aiofiles.open(filepath, "rb") as f:
+                        await f.seek(offset)
+                        data = await f.read(self._part_size)
+                    response = await client.upload_part(
+                        Bucket=bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=number,
+                        Body=data,
+                    )
+                    return {"PartNumber": number, "ETag": response["ETag"]}
+
+            try:
+                try:
+                    # a failed part cancels the others and the group waits
+                    # for them, so no part is uploading once it is aborted
+                    async with asyncio.TaskGroup() as group:
+                        tasks = [
+                            group.create_task(upload_part(i + 1, offset))
+                            for i, offset in enumerate(range(0, size, self._part_size))
+                        ]
+                except ExceptionGroup as e:
+                    # callers handle S3_ERRORS, not groups of them
+                    raise e.exceptions[0]
+                parts = [task.result() for task in tasks]
+                return await client.complete_multipart_upload(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+            except BaseException:
+                await client.abort_multipart_upload(
+                    Bucket=bucket, Key=key, UploadId=upload_id
+                )
+                raise
 
     async def download(
         self,
@@ -72,13 +219,24 @@ class S3Client:
         filename = f"{uuid.uuid4().hex}.{ext}"
         filepath = os.path.join(folder, filename)
 
-        file_data = await self.get_file(bucket, path)
-        if not file_data:
-            logger.error(f"No file data: {path}")
+        try:
+            async with self.get_client() as client:
+                response = await client.get_object(Bucket=bucket, Key=path)
+                # entering the body yields the raw aiohttp response, whose
+                # read() takes no size, so the StreamingBody itself is read
+                body = response["Body"]
+                async with body:
+                    async with aiofiles.open(filepath, "wb") as f:
+                        while chunk := await body.read(CHUNK_SIZE):
+                            await f.write(chunk)
+        except (*S3_ERRORS, asyncio.TimeoutError) as e:
+            logger.error(f"No file data: {path} {e}")
+            await asyncio.to_thread(_remove_silent, filepath)
             return None
-
-        async with aiofiles.open(filepath, "wb") as f:
-            await f.write(file_data)
+        except BaseException:
+            # no truncated file is left behind, e.g. when cancelled mid-stream
+            await asyncio.to_thread(_remove_silent, filepath)
+            raise
         return filepath
 
     async def get_file(
@@ -89,16 +247,31 @@ class S3Client:
         try:
             async with self.get_client() as client:
                 response = await client.get_object(Bucket=bucket, Key=path)
-                return await response["Body"].read()
-        except ClientError as e:
+                body = response["Body"]
+                async with body:
+                    return await body.read()
+        except S3_ERRORS as e:
             logger.error(e)
 
+    async def iter_chunks(
+        self,
+        bucket: str,
+        path: str,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> AsyncIterator[bytes]:
+        async with self.get_client() as client:
+            response = await client.get_object(Bucket=bucket, Key=path)
+            body = response["Body"]
+            async with body:
+                while chunk := await body.read(chunk_size):
+                    yield chunk
+
     async def head_file(self, bucket: str, path: str) -> dict:
         try:
             async with self.get_client() as client:
                 response = await client.head_object(Bucket=bucket, Key=path)
                 return response
-        except ClientError as e:
+        except S3_ERRORS as e:
             logger.error(e)
 
     async def delete_file(self, bucket: str, path: str) -> None:
@@ -106,5 +279,12 @@ class S3Client:
             async with self.get_client() as client:
                 response = await client.delete_object(Bucket=bucket, Key=path)
                 return response
-        except ClientError as e:
+        except S3_ERRORS as e:
             logger.error(e)
+
+
+def _remove_silent(filepath: str):
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,168 @@
+"""
+Transfer benchmark of S3Client against a running S3, e.g. the MinIO of
+docker-compose.
+
+Files of every size are uploaded and downloaded `--parallel` at a time,
+`--rounds` times. The `pooled` mode goes through S3Client, one client,
+multipart uploads and streamed downloads. The `baseline` mode does what
+S3Client did before: a client per call and whole bodies in memory.
+Python allocations are traced, so the peak shows the bodies held:
+
+    SRVC_CONFIG=etc/local.json python s3_bench.py \\
+        --sizes 0.1,8,64 --parallel 1,8 --modes pooled,baseline --out s3.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Any
+
+import aiofiles
+from aiobotocore.session import get_session
+
+from app.utils.config import Config
+from app.utils.s3 import MB, S3Client
+
+MODES = ("pooled", "baseline")
+
+
+class BaselineClient:
+    """A client per call and whole bodies in memory, as before pooling"""
+
+    def __init__(self, conf: Config):
+        self._session = get_session()
+        self._config = {
+            "aws_access_key_id": conf.s3.access_key,
+            "aws_secret_access_key": conf.s3.secret_key,
+            "endpoint_url": conf.s3.endpoint_url,
+        }
+
+    async def upload_file(self, bucket: str, path: str, filepath: str):
+        key = os.path.join(path, os.path.basename(filepath))
+        async with self._session.create_client("s3", **self._config) as client:
+            async with aiofiles.open(filepath, "rb") as f:
+                data = await f.read()
+            return await client.put_object(Bucket=bucket, Key=key, Body=data)
+
+    async def download(self, bucket: str, path: str, folder: str) -> str:
+        filepath = os.path.join(folder, uuid.uuid4().hex)
+        async with self._session.create_client("s3", **self._config) as client:
+            response = await client.get_object(Bucket=bucket, Key=path)
+            data = await response["Body"].read()
+        async with aiofiles.open(filepath, "wb") as f:
+            await f.write(data)
+        return filepath
+
+
+def make_file(folder: str, size: int) -> str:
+    filepath = os.path.join(folder, f"{size}.bin")
+    with open(filepath, "wb") as f:
+        left = size
+        while left:
+            chunk = min(left, MB)
+            f.write(os.urandom(chunk))
+            left -= chunk
+    return filepath
+
+
+async def run_one(
+    client: S3Client | BaselineClient,
+    args: argparse.Namespace,
+    mode: str,
+    filepath: str,
+    parallel: int,
+    folder: str,
+) -> dict[str, Any]:
+    size = os.path.getsize(filepath)
+    prefix = f"s3bench/{uuid.uuid4().hex[:8]}"
+
+    async def upload(i: int):
+        if await client.upload_file(args.bucket, f"{prefix}/{i}", filepath) is None:
+            raise RuntimeError(f"Upload of {filepath} failed")
+
+    async def download(i: int):
+        key = f"{prefix}/{i}/{os.path.basename(filepath)}"
+        downloaded = await client.download(args.bucket, key, folder=folder)
+        if downloaded is None:
+            raise RuntimeError(f"Download of {key} failed")
+        os.remove(downloaded)
+
+    result: dict[str, Any] = {"mode": mode, "size": size, "parallel": parallel}
+    for name, transfer in (("upload", upload), ("download", download)):
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            await asyncio.gather(*[transfer(i) for i in range(parallel)])
+        elapsed = time.perf_counter() - started
+        transferred = size * parallel * args.rounds
+        result[f"{name}_mb_s"] = transferred / MB / elapsed if elapsed else 0.0
+        result[f"{name}_peak_mb"] = tracemalloc.get_traced_memory()[1] / MB
+    return result
+
+
+async def run(args: argparse.Namespace, conf: Config) -> list[dict[str, Any]]:
+    pooled = S3Client(
+        conf.s3.access_key,
+        conf.s3.secret_key,
+        conf.s3.endpoint_url,
+        part_size=int(args.part_size * MB),
+        max_concurrency=args.max_concurrency,
+    )
+    await pooled.init()
+    await pooled.create_bucket(args.bucket)
+    clients = {"pooled": pooled, "baseline": BaselineClient(conf)}
+
+    folder = tempfile.mkdtemp(prefix="s3bench")
+    tracemalloc.start()
+    results = []
+    try:
+        for size in [int(float(i) * MB) for i in args.sizes.split(",")]:
+            filepath = make_file(folder, size)
+            for parallel in [int(i) for i in args.parallel.split(",")]:
+                for mode in args.modes.split(","):
+                    result = await run_one(
+                        clients[mode], args, mode, filepath, parallel, folder
+                    )
+                    print(
+                        f"{mode} size={size / MB:.1f}MB parallel={parallel}: "
+                        f"upload {result['upload_mb_s']:.1f}MB/s "
+                        f"peak {result['upload_peak_mb']:.1f}MB, "
+                        f"download {result['download_mb_s']:.1f}MB/s "
+                        f"peak {result['download_peak_mb']:.1f}MB"
+                    )
+                    results.append(result)
+            os.remove(filepath)
+    finally:
+        tracemalloc.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+        await pooled.close()
+    return results
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="S3 transfer benchmark")
+    parser.add_argument("--config", default=os.environ.get("SRVC_CONFIG"))
+    parser.add_argument("--bucket", default="bench")
+    parser.add_argument("--sizes", default="0.1,8,64", help="MB, e.g. 0.1,8,64")
+    parser.add_argument("--parallel", default="1,8", help="transfers at a time")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--modes", default=",".join(MODES), help="pooled,baseline")
+    parser.add_argument("--part-size", type=float, default=8, help="MB")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="parts")
+    parser.add_argument("--out", help="JSON results file")
+    return parser
+
+
+def main(args: argparse.Namespace, conf: Config):
+    results = asyncio.run(run(args, conf))
+    if args.out:
+        with open(args.out, "w") as f:
+            report = {"timestamp": time.time(), "args": vars(args), "runs": results}
+            json.dump(report, f, indent=2)
+    return results
@@ -9,6 +9,8 @@ from typing import (
 
 import aio_pika
 
+from app.utils import metrics, tracing
+from app.utils.profiling import LoopMonitor, SamplingProfiler
 from app.utils.config import (
     Config,
 )
@@ -45,9 +47,18 @@ class BaseService:
         self.stopping: bool = False
         self.amqp: aio_pika.Connection | None = None
         self.on_closed: list[OnCloseCallback] = []
+        self.loop_monitor: LoopMonitor | None = None
+        self.profiler: SamplingProfiler | None = None
 
     async def setup(self):
         try:
+            metrics.start(self.config.metrics)
+            tracing.init(self.config.tracing, self.controller_name)
+            if self.config.profiling.loop_monitor:
+                self.loop_monitor = LoopMonitor(
+                    self.loop, self.config.profiling, self.controller_name
+                )
+                self.loop_monitor.start()
             self.amqp = await asyncio.wait_for(
                 aio_pika.connect_robust(
                     str(self.config.amqp), loop=self.loop, timeout=300
@@ -70,6 +81,20 @@ class BaseService:
     def register_on_closed(self, callback: OnCloseCallback):
         self.on_closed.append(callback)
 
+    async def start_profiler(self, seconds: float = 30, all_threads: bool = False):
+        """Samples the stacks for `seconds`, the profile is written after that"""
+        if self.profiler and self.profiler.running:
+            logger.info(f"Profiler is already running, see {self.profiler.path}")
+            return
+        self.profiler = SamplingProfiler(
+            self.config.profiling, self.controller_name, seconds, all_threads
+        )
+        self.profiler.start()
+
+    async def stop_profiler(self):
+        if self.profiler:
+            self.profiler.stop()
+
     def stop(self):
         if not self.stopping:
             logger.info(f"Service {self.controller_name} stopping was planned")
@@ -88,6 +113,14 @@ class BaseService:
             await self.amqp.close()
         self.amqp = None
 
+        tracing.close()
+
+        if self.profiler:
+            self.profiler.stop()
+        if self.loop_monitor:
+            self.loop_monitor.stop()
+            self.loop_monitor = None
+
         for on_closed in self.on_closed:
             if inspect.isawaitable(on_closed):
                 await on_closed()  # noqa
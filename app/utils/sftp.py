@@ -1,18 +1,95 @@
 import asyncio
 import os
 import uuid
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
-from paramiko import Transport, SFTPClient
+from paramiko import Transport, SFTPClient, SSHException
 
 from app.utils.config import SftpConfig
 
+CHUNK_SIZE = 256 * 1024
+MAX_PREFETCH_REQUESTS = 64
+
+SFTP_ERRORS = (SSHException, EOFError, OSError)
+
+
+class _Connection:
+    def __init__(self, transport: Transport, client: SFTPClient):
+        self.transport = transport
+        self.client = client
+
+    @property
+    def active(self) -> bool:
+        return self.transport.is_active()
+
+    def close(self):
+        self.client.close()
+        self.transport.close()
+
 
 class SftpClient:
+    """
+    Pool of authenticated SFTP sessions.
+
+    Connections are opened lazily up to `pool_size`, kept alive between
+    calls and replaced when the transport drops. All paramiko calls run
+    in threads
+    """
+
     def __init__(self, config: SftpConfig):
         self._config = config
-        self._transport: Transport | None = None
-        self.client: SFTPClient | None = None
+        self._idle: asyncio.Queue[_Connection] = asyncio.Queue()
+        self._slots = asyncio.Semaphore(config.pool_size)
+
+    def _connect(self) -> _Connection:
+        transport = Transport((self._config.host, self._config.port))
+        try:
+            transport.connect(
+                username=self._config.username, password=self._config.password
+            )
+            transport.set_keepalive(self._config.keepalive_seconds)
+            return _Connection(transport, SFTPClient.from_transport(transport))
+        except BaseException:
+            transport.close()
+            raise
+
+    async def _discard(self, conn: _Connection):
+        await asyncio.to_thread(conn.close)
+
+    @asynccontextmanager
+    async def acquire(self) -> SFTPClient:
+        async with self._slots:
+            conn = None
+            while not self._idle.empty():
+                conn = self._idle.get_nowait()
+                if conn.active:
+                    break
+                await self._discard(conn)
+                conn = None
+
+            if conn is None:
+                conn = await asyncio.to_thread(self._connect)
+
+            try:
+                yield conn.client
+            except SFTP_ERRORS:
+                if not conn.active:
+                    await self._discard(conn)
+                    conn = None
+                raise
+            except GeneratorExit:
+                # a generator closed between reads, the client is not in use
+                raise
+            except BaseException:
+                # e.g. a cancelled to_thread call, whose thread may still
+                # use the client, so it is never handed to the next borrower
+                await self._discard(conn)
+                conn = None
+                raise
+            finally:
+                if conn is not None:
+                    self._idle.put_nowait(conn)
 
     async def download(
         self,
@@ -23,22 +100,46 @@ class SftpClient:
         filename = f"{uuid.uuid4().hex}.{ext}"
         filepath = os.path.join(folder, filename)
 
-        # self.client.get(path, filepath)
-        await asyncio.to_thread(self.client.get, path, filepath, None, True, None)
+        async with self.acquire() as client:
+            await asyncio.to_thread(
+                client.get,
+                path,
+                filepath,
+                None,
+                True,
+                MAX_PREFETCH_REQUESTS,
+            )
         return filepath
 
+    async def iter_chunks(
+        self, path: str, chunk_size: int = CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """
+        Holds a pool slot until the generator is done, so one that is left
+        before the end has to be closed, e.g. with `contextlib.aclosing`
+        """
+        async with self.acquire() as client:
+            f = await asyncio.to_thread(client.open, path, "rb")
+            try:
+                # pipelined reads instead of a round trip per chunk
+                await asyncio.to_thread(f.prefetch, None, MAX_PREFETCH_REQUESTS)
+                while chunk := await asyncio.to_thread(f.read, chunk_size):
+                    yield chunk
+            finally:
+                await asyncio.to_thread(f.close)
+
     async def stat(self, path: str) -> Any:
-        return await asyncio.to_thread(self.client.stat, path)
+        async with self.acquire() as client:
+            return await asyncio.to_thread(client.stat, path)
 
     async def remove(self, path: str) -> None:
-        self.client.remove(path)
+        async with self.acquire() as client:
+            await asyncio.to_thread(client.remove, path)
 
     async def init(self):
-        self._transport = Transport((self._config.host, self._config.port))
-        self._transport.connect(
-            username=self._config.username, password=self._config.password
-        )
-        self.client = SFTPClient.from_transport(self._transport)
+        # open the first session eagerly, so bad credentials fail on start
+        async with self.acquire():
+            pass
 
     async def __aenter__(self):
         await self.init()
@@ -48,9 +149,5 @@ class SftpClient:
         await self.close()
 
     async def close(self):
-        if self.client:
-            self.client.close()
-            self.client = None
-        if self._transport:
-            self._transport.close()
-            self._transport = None
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
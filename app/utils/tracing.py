@@ -0,0 +1,229 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import aiohttp
+
+from app.utils.config import TracingConfig
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"  # W3C trace context
+_TRACEPARENT_RE = re.compile(
+    r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})"
+)
+
+
+class SpanContext:
+    def __init__(self, trace_id: str, span_id: str, sampled: bool = True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+class Span(SpanContext):
+    def __init__(
+        self,
+        name: str,
+        parent: SpanContext | None = None,
+        sampled: bool = True,
+        **attributes,
+    ):
+        super().__init__(
+            parent.trace_id if parent else os.urandom(16).hex(),
+            os.urandom(8).hex(),
+            sampled,
+        )
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start = time.time()
+        self.end: float | None = None
+        self.error: str | None = None
+        self.attributes: dict[str, Any] = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, end: float | None = None):
+        if not self.sampled or self.end is not None:
+            return
+        self.end = end or time.time()
+        if _exporter:
+            _exporter.export(self)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def dict(self) -> dict[str, Any]:
+        return {
+            "service": _service,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": (self.end or self.start) - self.start,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlExporter:
+    """Writes finished spans as JSON lines from a thread, off the event loop"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue[dict | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name="tracing-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span.dict())
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while (item := self._queue.get()) is not None:
+                f.write(json.dumps(item, default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self):
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# returned while tracing is off or the trace is not sampled, never exported
+_NOOP = Span("noop", sampled=False)
+
+_current: contextvars.ContextVar[Span] = contextvars.ContextVar(
+    "tracing_span", default=_NOOP
+)
+_exporter: JsonlExporter | None = None
+_service: str = ""
+_sample_rate: float = 1.0
+
+
+def init(config: TracingConfig, service: str):
+    global _exporter, _service, _sample_rate
+    if not config.enabled or _exporter:
+        return
+    _service = service
+    _sample_rate = config.sample_rate
+    _exporter = JsonlExporter(os.path.join(config.folder, f"{service}.jsonl"))
+    _exporter.start()
+    logger.info(f"Tracing to {_exporter.path}")
+
+
+def close():
+    global _exporter
+    if _exporter:
+        _exporter.close()
+        _exporter = None
+
+
+def current() -> Span:
+    return _current.get()
+
+
+def start_span(name: str, parent: SpanContext | None = None, **attributes) -> Span:
+    """Child of `parent` or of the current span, a new trace otherwise"""
+    if _exporter is None:
+        return _NOOP
+    parent = parent or _current.get()
+    if parent is _NOOP:
+        # new trace, sampled once for all of its spans
+        if random.random() >= _sample_rate:
+            return _NOOP
+        return Span(name, **attributes)
+    if not parent.sampled:
+        return _NOOP
+    return Span(name, parent, **attributes)
+
+
+@contextmanager
+def span(name: str, parent: SpanContext | None = None, **attributes) -> Iterator[Span]:
+    s = start_span(name, parent, **attributes)
+    if s is _NOOP:
+        yield s
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.finish()
+
+
+def record(name: str, start: float, end: float, **attributes):
+    """Finished child span of the current one, e.g. from a sync event hook"""
+    parent = _current.get()
+    if parent is _NOOP:
+        return
+    s = Span(name, parent, **attributes)
+    s.start = start
+    s.finish(end)
+
+
+def inject(headers: dict):
+    s = _current.get()
+    if s is not _NOOP:
+        headers[TRACEPARENT_HEADER] = s.traceparent()
+
+
+def extract(headers: dict | None) -> SpanContext | None:
+    value = (headers or {}).get(TRACEPARENT_HEADER)
+    if isinstance(value, bytes):
+        value = value.decode()
+    match = _TRACEPARENT_RE.match(value) if isinstance(value, str) else None
+    if not match:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+def aiohttp_trace_config() -> aiohttp.TraceConfig:
+    """Client span per request, the trace context is sent along"""
+
+    async def on_request_start(session, ctx, params):
+        ctx.span = start_span(
+            f"http {params.method}", url=str(params.url.with_query(None))
+        )
+        if ctx.span is not _NOOP:
+            params.headers[TRACEPARENT_HEADER] = ctx.span.traceparent()
+
+    async def on_request_end(session, ctx, params):
+        if ctx.span is not _NOOP:
+            ctx.span.set(status=params.response.status)
+            ctx.span.finish()
+
+    async def on_request_exception(session, ctx, params):
+        if ctx.span is not _NOOP:
+            ctx.span.error = repr(params.exception)
+            ctx.span.finish()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
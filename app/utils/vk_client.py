@@ -9,7 +9,9 @@ from vk_api.bot_longpoll import VkBotLongPoll, VkBotEvent
 from vk_api.keyboard import VkKeyboard
 from vk_api.utils import get_random_id
 
+from app.utils import tracing
 from app.utils.config import VkConfig
+from app.utils.media import MediaSource, post_multipart
 from app.schemas.vk import Message, WallPost
 from app.services.vk_bot.models.vk import WallItemFilter, WallItem, Poll
 
@@ -47,14 +49,15 @@ class BaseMethod:
 
     @with_retries
     async def _call_group(self, method: str, values: dict | None = None, **kwargs):
-        return await asyncio.to_thread(
-            self._session_group.method, method, values, **kwargs
-        )
+        with tracing.span(f"vk.api {method}"):
+            return await asyncio.to_thread(
+                self._session_group.method, method, values, **kwargs
+            )
 
     @with_retries
     async def _call_user(self, method: str, values: dict | None = None, **kwargs):
-        # disabled
-        return 1
+        if not self._config.user_api:
+            return 1
         return await asyncio.to_thread(
             self._session_user.method, method, values, **kwargs
         )
@@ -190,8 +193,8 @@ class Upload(BaseMethod):
     async def photo_wall(
         self, photo_paths: list[str]
     ) -> list[str]:  # list 'attachment' str
-        # disabled
-        return []
+        if not self._config.user_api:
+            return []
         response = await asyncio.to_thread(
             self._upload_user.photo_wall,
             photo_paths,
@@ -205,8 +208,8 @@ class Upload(BaseMethod):
     async def video_wall_and_post(
         self, path: str | None = None, name: str | None = None, link: str | None = None
     ) -> Mapping:
-        # disabled
-        return {}
+        if not self._config.user_api:
+            return {}
         if not path and not link:
             raise ValueError("Either path or link is required")
 
@@ -227,6 +230,46 @@ class Upload(BaseMethod):
         response = await asyncio.to_thread(self._upload_user.video, **args)
         return response
 
+    async def photo_wall_stream(
+        self, source: MediaSource
+    ) -> list[str]:  # list 'attachment' str
+        if not self._config.user_api:
+            return []
+        server = await self._call_user(
+            "photos.getWallUploadServer", dict(group_id=self._config.main_group_id)
+        )
+        # not retried as a whole: a stream may not be readable twice
+        uploaded = await post_multipart(server["upload_url"], "photo", source)
+        response = await self._call_user(
+            "photos.saveWallPhoto",
+            dict(
+                user_id=self._config.main_user_id,
+                group_id=self._config.main_group_id,
+                photo=uploaded["photo"],
+                server=uploaded["server"],
+                hash=uploaded["hash"],
+            ),
+        )
+        return [f"photo{r['owner_id']}_{r['id']}_{r['access_key']}" for r in response]
+
+    async def video_wall_and_post_stream(
+        self, source: MediaSource, name: str | None = None
+    ) -> Mapping:
+        if not self._config.user_api:
+            return {}
+        response = await self._call_user(
+            "video.save",
+            dict(
+                name=name,
+                is_private=0,
+                wallpost=1,
+                group_id=self._config.main_group_id,
+            ),
+        )
+        uploaded = await post_multipart(response["upload_url"], "video_file", source)
+        response.update(uploaded)
+        return response
+
 
 class Polls(BaseMethod):
 
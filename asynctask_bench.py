@@ -0,0 +1,7 @@
+from app.utils import log
+from app.utils.asynctask import bench
+
+from app.utils import ctrl
+
+if __name__ == "__main__":
+    ctrl.main_with_parses(bench.make_parser(), bench.main)
@@ -0,0 +1,158 @@
+"""partition sessions
+
+Revision ID: 062a8f4aa007
+Revises: 72eb476c678f
+Create Date: 2026-10-19 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '062a8f4aa007'
+down_revision: Union[str, None] = '72eb476c678f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SESSION_TABLES = (
+    'discord_activity_sessions',
+    'discord_status_sessions',
+    'steam_activity_sessions',
+    'steam_status_sessions',
+)
+STEAM_TABLES = (
+    'steam_activity_sessions',
+    'steam_status_sessions',
+)
+MONTHS_AHEAD = 3
+
+CREATE_MONTHLY_PARTITIONS = """
+CREATE OR REPLACE FUNCTION create_monthly_partitions(
+    parent text, from_ts timestamp, months_ahead integer
+) RETURNS SETOF text AS $$
+DECLARE
+    month_start date := date_trunc(
+        'month', coalesce(from_ts, now() at time zone 'utc')
+    )::date;
+    last_month date := (
+        date_trunc('month', now() at time zone 'utc')
+        + make_interval(months => months_ahead)
+    )::date;
+    partition_name text;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := parent || '_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                parent,
+                month_start,
+                (month_start + interval '1 month')::date
+            );
+            RETURN NEXT partition_name;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_MONTHLY_PARTITIONS = """
+CREATE OR REPLACE FUNCTION drop_monthly_partitions(
+    parent text, keep_months integer
+) RETURNS SETOF text AS $$
+DECLARE
+    boundary date := (
+        date_trunc('month', now() at time zone 'utc')
+        - make_interval(months => keep_months)
+    )::date;
+    partition_name text;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent::regclass
+          AND CASE
+              WHEN c.relname ~ ('^' || parent || '_p[0-9]{6}$')
+              THEN to_date(right(c.relname, 6), 'YYYYMM') < boundary
+              ELSE false
+          END
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('DROP TABLE %I', partition_name);
+        RETURN NEXT partition_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(CREATE_MONTHLY_PARTITIONS)
+    op.execute(DROP_MONTHLY_PARTITIONS)
+
+    for table in SESSION_TABLES:
+        op.drop_index(f'ix_{table}_user_id', table_name=table)
+        op.rename_table(table, f'{table}_old')
+        op.execute(
+            f'ALTER TABLE {table}_old '
+            f'RENAME CONSTRAINT {table}_pkey TO {table}_old_pkey'
+        )
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+        op.execute(
+            f'CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (started_at)'
+        )
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        op.create_primary_key(f'{table}_pkey', table, ['id', 'started_at'])
+        if table in STEAM_TABLES:
+            op.create_foreign_key(
+                f'{table}_user_id_fkey', table, 'steam_users', ['user_id'], ['id']
+            )
+        op.create_index(
+            op.f(f'ix_{table}_user_id_started_at'),
+            table,
+            ['user_id', 'started_at'],
+            unique=False,
+        )
+        op.execute(
+            sa.text(
+                f'SELECT create_monthly_partitions('
+                f"'{table}', (SELECT min(started_at) FROM {table}_old), {MONTHS_AHEAD})"
+            )
+        )
+        op.execute(f'INSERT INTO {table} SELECT * FROM {table}_old')
+        op.drop_table(f'{table}_old')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in SESSION_TABLES:
+        op.rename_table(table, f'{table}_old')
+        op.execute(
+            f'ALTER TABLE {table}_old '
+            f'RENAME CONSTRAINT {table}_pkey TO {table}_old_pkey'
+        )
+        op.drop_index(f'ix_{table}_user_id_started_at', table_name=f'{table}_old')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+        op.execute(f'CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS)')
+        op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        op.create_primary_key(f'{table}_pkey', table, ['id'])
+        if table in STEAM_TABLES:
+            op.create_foreign_key(
+                f'{table}_user_id_fkey', table, 'steam_users', ['user_id'], ['id']
+            )
+        op.create_index(op.f(f'ix_{table}_user_id'), table, ['user_id'], unique=False)
+        op.execute(f'INSERT INTO {table} SELECT * FROM {table}_old')
+        op.drop_table(f'{table}_old')
+
+    op.execute('DROP FUNCTION IF EXISTS drop_monthly_partitions(text, integer)')
+    op.execute(
+        'DROP FUNCTION IF EXISTS create_monthly_partitions(text, timestamp, integer)'
+    )
@@ -0,0 +1,45 @@
+"""unfinished sessions indexes
+
+Revision ID: 27b20f2ccfd7
+Revises: 062a8f4aa007
+Create Date: 2026-10-19 11:02:17.845112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '27b20f2ccfd7'
+down_revision: Union[str, None] = '062a8f4aa007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+UNFINISHED_INDEXES = (
+    ('discord_activity_sessions', 'activity_name'),
+    ('discord_status_sessions', 'status'),
+    ('steam_activity_sessions', 'activity_name'),
+    ('steam_status_sessions', 'status'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in UNFINISHED_INDEXES:
+        op.create_index(
+            op.f(f'ix_{table}_user_id_{column}_unfinished'),
+            table,
+            ['user_id', column],
+            unique=False,
+            postgresql_where=sa.text('finished_at IS NULL'),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in UNFINISHED_INDEXES:
+        op.drop_index(
+            op.f(f'ix_{table}_user_id_{column}_unfinished'), table_name=table
+        )
@@ -0,0 +1,62 @@
+"""triggers history trgm
+
+Revision ID: 9f08b4d3392b
+Revises: 27b20f2ccfd7
+Create Date: 2026-10-19 11:48:05.113472
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f08b4d3392b'
+down_revision: Union[str, None] = '27b20f2ccfd7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_triggers_answers_trigger_trgm',
+        'triggers_answers',
+        ['trigger'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'trigger': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_triggers_answers_answer_trgm',
+        'triggers_answers',
+        ['answer'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'answer': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_triggers_history_vk_id_trgm',
+        'triggers_history',
+        [sa.text('(vk_id::text) gin_trgm_ops')],
+        unique=False,
+        postgresql_using='gin',
+    )
+    op.create_index(
+        op.f('ix_triggers_history_trigger_answer_id'),
+        'triggers_history',
+        ['trigger_answer_id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        op.f('ix_triggers_history_trigger_answer_id'), table_name='triggers_history'
+    )
+    op.drop_index('ix_triggers_history_vk_id_trgm', table_name='triggers_history')
+    op.drop_index('ix_triggers_answers_answer_trgm', table_name='triggers_answers')
+    op.drop_index('ix_triggers_answers_trigger_trgm', table_name='triggers_answers')
@@ -0,0 +1,141 @@
+"""sessions default partitions
+
+Revision ID: b3e71d0c5a42
+Revises: 9f08b4d3392b
+Create Date: 2026-10-19 21:14:36.402517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e71d0c5a42'
+down_revision: Union[str, None] = '9f08b4d3392b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SESSION_TABLES = (
+    'discord_activity_sessions',
+    'discord_status_sessions',
+    'steam_activity_sessions',
+    'steam_status_sessions',
+)
+
+# rows of a month without a partition wait in the DEFAULT one, they are
+# moved to the monthly partition when it is created
+CREATE_MONTHLY_PARTITIONS = """
+CREATE OR REPLACE FUNCTION create_monthly_partitions(
+    parent text, from_ts timestamp, months_ahead integer
+) RETURNS SETOF text AS $$
+DECLARE
+    month_start date := date_trunc(
+        'month', coalesce(from_ts, now() at time zone 'utc')
+    )::date;
+    last_month date := (
+        date_trunc('month', now() at time zone 'utc')
+        + make_interval(months => months_ahead)
+    )::date;
+    default_name text := parent || '_default';
+    partition_name text;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := parent || '_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NOT NULL THEN
+            NULL;
+        ELSIF to_regclass(default_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                parent,
+                month_start,
+                (month_start + interval '1 month')::date
+            );
+            RETURN NEXT partition_name;
+        ELSE
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)',
+                partition_name,
+                parent
+            );
+            EXECUTE format(
+                'WITH moved AS ('
+                'DELETE FROM %I WHERE started_at >= %L AND started_at < %L '
+                'RETURNING *'
+                ') INSERT INTO %I SELECT * FROM moved',
+                default_name,
+                month_start,
+                (month_start + interval '1 month')::date,
+                partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                parent,
+                partition_name,
+                month_start,
+                (month_start + interval '1 month')::date
+            );
+            RETURN NEXT partition_name;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+PREVIOUS_CREATE_MONTHLY_PARTITIONS = """
+CREATE OR REPLACE FUNCTION create_monthly_partitions(
+    parent text, from_ts timestamp, months_ahead integer
+) RETURNS SETOF text AS $$
+DECLARE
+    month_start date := date_trunc(
+        'month', coalesce(from_ts, now() at time zone 'utc')
+    )::date;
+    last_month date := (
+        date_trunc('month', now() at time zone 'utc')
+        + make_interval(months => months_ahead)
+    )::date;
+    partition_name text;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := parent || '_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                parent,
+                month_start,
+                (month_start + interval '1 month')::date
+            );
+            RETURN NEXT partition_name;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(CREATE_MONTHLY_PARTITIONS)
+    for table in SESSION_TABLES:
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(PREVIOUS_CREATE_MONTHLY_PARTITIONS)
+    for table in SESSION_TABLES:
+        op.execute(f'ALTER TABLE {table} DETACH PARTITION {table}_default')
+        # the rows come back through monthly partitions, or the downgrade fails
+        op.execute(
+            sa.text(
+                f'SELECT create_monthly_partitions('
+                f"'{table}', (SELECT min(started_at) FROM {table}_default), 0)"
+            )
+        )
+        op.execute(f'INSERT INTO {table} SELECT * FROM {table}_default')
+        op.drop_table(f'{table}_default')
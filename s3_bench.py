@@ -0,0 +1,7 @@
+from app.utils import log
+from app.utils import s3_bench
+
+from app.utils import ctrl
+
+if __name__ == "__main__":
+    ctrl.main_with_parses(s3_bench.make_parser(), s3_bench.main)
@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.db import triggers_history as triggers_history_db
+
+VK_ID_INDEX = "ix_triggers_history_vk_id_trgm"
+
+
+def compile_stmt(stmt) -> str:
+    return str(
+        stmt.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_vk_id_cast_matches_index_expression():
+    # the index is built on (vk_id::text), a VARCHAR cast doesn't match it
+    sql = compile_stmt(triggers_history_db.list_stmt(["123"]))
+    assert "CAST(triggers_history.vk_id AS TEXT)" in sql
+
+
+async def test_vk_id_search_uses_trigram_index(db_session):
+    if not await db_session.scalar(text(f"SELECT to_regclass('{VK_ID_INDEX}')")):
+        pytest.skip("Migrations with the trigram indexes are not applied")
+
+    # the tables of a test database are small enough for a sequential scan
+    await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    sql = compile_stmt(triggers_history_db.list_stmt(["123"]))
+    plan = "\n".join((await db_session.execute(text(f"EXPLAIN {sql}"))).scalars())
+
+    assert "Bitmap Index Scan on " + VK_ID_INDEX in plan
@@ -0,0 +1,50 @@
+import os
+from typing import AsyncIterator
+
+import httpx
+import pytest
+from asgi_lifespan import LifespanManager
+from sqlalchemy.exc import DBAPIError
+
+from app.utils import db
+from app.utils.config import CONFIG_ENV_KEY, Config, read_config
+
+
+@pytest.fixture(scope="session")
+def config() -> Config:
+    """Tests needing the services are skipped without a config"""
+    path = os.environ.get(CONFIG_ENV_KEY)
+    if not path or not os.path.exists(path):
+        pytest.skip(f"Config is not provided at environment [{CONFIG_ENV_KEY}]")
+    return read_config(path)
+
+
+@pytest.fixture
+async def db_session(config: Config) -> AsyncIterator[db.Session]:
+    db_helper = await db.init_db(config.db)
+    try:
+        async with db_helper.get_session() as session:
+            try:
+                await session.connection()
+            except (OSError, DBAPIError) as e:
+                pytest.skip(f"Database is unavailable: {e}")
+            yield session
+            await session.rollback()
+    finally:
+        await db_helper.close()
+
+
+@pytest.fixture
+async def app(config: Config):
+    from app.services.rest_api.main import main
+
+    app = main(None, config)
+    async with LifespanManager(app):
+        yield app
+
+
+@pytest.fixture
+async def client(app) -> AsyncIterator[httpx.AsyncClient]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
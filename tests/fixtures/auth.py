@@ -0,0 +1,14 @@
+import httpx
+import pytest
+
+from app.services.rest_api.routers import API_PREFIX
+from app.utils.fastapi.session import HEADERS_SESSION_NAME
+
+
+@pytest.fixture
+async def anonymous_client(client: httpx.AsyncClient) -> httpx.AsyncClient:
+    """Client with the token of a new anonymous session"""
+    response = await client.get(f"{API_PREFIX}/auth/me")
+    response.raise_for_status()
+    client.headers[HEADERS_SESSION_NAME] = response.json()["data"]["token"]
+    return client
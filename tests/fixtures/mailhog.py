@@ -0,0 +1,20 @@
+from typing import AsyncIterator
+
+import httpx
+import pytest
+
+from app.utils.config import Config
+
+MAILHOG_API_PORT = 8025
+
+
+@pytest.fixture
+async def mailhog(config: Config) -> AsyncIterator[httpx.AsyncClient]:
+    """HTTP API of the MailHog the services send mail to, emptied for the test"""
+    base_url = f"http://{config.smtp.transport.hostname}:{MAILHOG_API_PORT}"
+    async with httpx.AsyncClient(base_url=base_url) as mailhog_client:
+        try:
+            await mailhog_client.delete("/api/v1/messages")
+        except httpx.HTTPError as e:
+            pytest.skip(f"MailHog is unavailable: {e}")
+        yield mailhog_client
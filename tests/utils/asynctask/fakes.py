@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from app.utils.asynctask.claim_check import ClaimStore
+
+
+class MemoryClaimStore(ClaimStore):
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+
+    async def put(self, key: str, data: bytes, ttl: int):
+        self.data[key] = data
+
+    async def get(self, key: str) -> bytes | None:
+        return self.data.get(key)
+
+    async def delete(self, key: str):
+        self.data.pop(key, None)
+
+
+class FakePublisher:
+    def __init__(self):
+        self.messages = []
+
+    async def publish(self, message, routing_key: str, **kwargs):
+        self.messages.append(message)
+
+
+def make_message(
+    body: bytes, headers: dict, correlation_id: str = "client.1"
+) -> SimpleNamespace:
+    async def ack():
+        pass
+
+    return SimpleNamespace(
+        body=body,
+        headers=headers,
+        correlation_id=correlation_id,
+        reply_to="replies",
+        delivery_mode=None,
+        timestamp=None,
+        ack=ack,
+    )
@@ -0,0 +1,74 @@
+from pydantic import BaseModel
+
+from app.utils.asynctask.claim_check import (
+    CLAIM_ACCEPT_HEADER,
+    CLAIM_HEADER,
+    ClaimCheck,
+)
+from app.utils.asynctask.models import METHOD_HEADER, MessageType, PriorityClass
+from app.utils.asynctask.serializer import JsonSerializer
+from app.utils.asynctask.worker import Context, Worker
+from .fakes import FakePublisher, MemoryClaimStore, make_message
+
+
+class Echo(BaseModel):
+    payload: str
+
+
+async def on_echo(context: Context):
+    await context.success(context.data)
+
+
+def make_worker(claim_check: ClaimCheck) -> Worker:
+    worker = Worker(None, "tasks", JsonSerializer(), claim_check=claim_check)
+    worker.publisher = FakePublisher()
+    worker.queues = {c: None for c in PriorityClass}
+    worker.register("echo", on_echo, Echo)
+    return worker
+
+
+async def test_small_bodies_stay_in_the_message():
+    claim_check = ClaimCheck(MemoryClaimStore(), threshold=1024)
+    headers = {}
+
+    assert await claim_check.offload(b"small", headers, "1") == b"small"
+    assert headers == {}
+    assert await claim_check.restore(b"small", headers) == b"small"
+
+
+async def test_large_request_and_reply_round_trip():
+    store = MemoryClaimStore()
+    claim_check = ClaimCheck(store, threshold=1024)
+    worker = make_worker(claim_check)
+    request = Echo(payload="x" * 4096)
+
+    # the client side of a call
+    headers = {METHOD_HEADER: "echo", CLAIM_ACCEPT_HEADER: True}
+    body = await claim_check.offload(
+        JsonSerializer().pack(request), headers, "client.1"
+    )
+    assert body == b""
+    assert CLAIM_HEADER in headers
+
+    await worker.on_message(make_message(body, headers))
+
+    [reply] = worker.publisher.messages
+    assert reply.type == MessageType.SUCCESS.value
+    assert reply.body == b""
+    reply_body = await claim_check.restore(reply.body, reply.headers)
+    assert JsonSerializer().unpack(reply_body, Echo) == request
+
+    await claim_check.release(reply.headers)
+    await claim_check.release(headers)
+    assert store.data == {}
+
+
+async def test_expired_request_payload_is_an_error_reply():
+    claim_check = ClaimCheck(MemoryClaimStore(), threshold=1024)
+    worker = make_worker(claim_check)
+    headers = {METHOD_HEADER: "echo", CLAIM_HEADER: "asynctask:claim:gone"}
+
+    await worker.on_message(make_message(b"", headers))
+
+    [reply] = worker.publisher.messages
+    assert reply.type == MessageType.ERROR.value
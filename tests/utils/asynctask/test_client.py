@@ -0,0 +1,72 @@
+import asyncio
+
+from app.utils.asynctask.client import Client
+from app.utils.asynctask.serializer import JsonSerializer
+
+
+class FakeCall:
+    """Stands for Client._call, the reply comes when `reply` is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.reply = asyncio.Event()
+
+    async def __call__(self, method: str, body: bytes, *args, **kwargs):
+        self.calls += 1
+        try:
+            await self.reply.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "tags"
+
+
+def make_client() -> tuple[Client, FakeCall]:
+    client = Client(None, "tasks", JsonSerializer())
+    client._call = call = FakeCall()
+    return client, call
+
+
+def single_flight(client: Client) -> asyncio.Task:
+    return asyncio.create_task(
+        client._call_or_join("tags", None, None, None, None, False, True)
+    )
+
+
+async def test_one_caller_giving_up_keeps_the_shared_call():
+    client, call = make_client()
+    first, second = single_flight(client), single_flight(client)
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    call.reply.set()
+
+    assert await second == "tags"
+    assert first.cancelled()
+    assert (call.calls, call.cancelled) == (1, 0)
+    assert client.flights == {}
+    assert client.waiters == {}
+
+
+async def test_last_caller_giving_up_cancels_the_shared_call():
+    client, call = make_client()
+    first, second = single_flight(client), single_flight(client)
+    await asyncio.sleep(0)
+
+    first.cancel()
+    second.cancel()
+    await asyncio.gather(first, second, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert (call.calls, call.cancelled) == (1, 1)
+    assert client.flights == {}
+    assert client.waiters == {}
+
+    # the next caller starts a call of its own
+    third = single_flight(client)
+    await asyncio.sleep(0)
+    call.reply.set()
+    assert await third == "tags"
+    assert call.calls == 2
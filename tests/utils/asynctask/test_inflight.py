@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.utils.asynctask.inflight import InFlight, Task
+
+
+def make_task() -> Task:
+    return Task("method", dict)
+
+
+async def test_tasks_expire_by_deadline():
+    inflight = InFlight()
+    slow, fast, done = make_task(), make_task(), make_task()
+    await inflight.add(slow, timeout=0.05)
+    await inflight.add(fast, timeout=0.01)
+    await inflight.add(done, timeout=0.01)
+    inflight.pop(done.id)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await fast.future
+    assert not slow.done()
+    assert inflight.expired == 1
+
+    with pytest.raises(asyncio.TimeoutError):
+        await slow.future
+    assert inflight.expired == 2
+    assert inflight._timer is None
+    inflight.close()
+
+
+async def test_earlier_deadline_reschedules_the_timer():
+    inflight = InFlight()
+    await inflight.add(make_task(), timeout=10)
+    timer = inflight._timer
+    await inflight.add(make_task(), timeout=0.01)
+
+    assert timer.cancelled()
+    assert inflight._timer.when() < timer.when()
+    inflight.close()
+    assert inflight._timer is None
+
+
+async def test_add_waits_for_a_free_slot():
+    inflight = InFlight(limit=1)
+    first, second = make_task(), make_task()
+    await inflight.add(first)
+
+    adding = asyncio.create_task(inflight.add(second))
+    await asyncio.sleep(0)
+    assert not adding.done()
+
+    inflight.pop(first.id)
+    await adding
+    assert list(inflight.tasks) == [second.id]
+    assert inflight.metrics()["in_flight"] == 1
+
+
+async def test_slot_wait_is_bounded_by_the_deadline():
+    inflight = InFlight(limit=1)
+    await inflight.add(make_task())
+
+    with pytest.raises(asyncio.TimeoutError):
+        await inflight.add(make_task(), timeout=0.01)
+    assert len(inflight) == 1
+    assert inflight.expired == 1
+    inflight.close()
+
+
+async def test_counters_are_exported_by_queue():
+    inflight = InFlight(queue="metrics-test")
+    await inflight.add(make_task(), timeout=0.01)
+    inflight.late_reply()
+    await asyncio.sleep(0.02)
+
+    labels = {"queue": "metrics-test"}
+    assert REGISTRY.get_sample_value("rpc_expired_total", labels) == 1
+    assert REGISTRY.get_sample_value("rpc_late_replies_total", labels) == 1
+    inflight.close()
@@ -0,0 +1,112 @@
+import asyncio
+
+from pydantic import BaseModel
+
+from app.utils.asynctask.models import (
+    FLIGHT_HEADER,
+    METHOD_HEADER,
+    MessageType,
+    PriorityClass,
+)
+from app.utils.asynctask.serializer import JsonSerializer
+from app.utils.asynctask.worker import Context, Worker
+from .fakes import FakePublisher, make_message
+
+
+class Tags(BaseModel):
+    tags: list[str]
+
+
+def make_worker(handler, prefetch_count: int = 1, class_limits=None) -> Worker:
+    worker = Worker(
+        None,
+        "tasks",
+        JsonSerializer(),
+        prefetch_count=prefetch_count,
+        flight_window=4,
+        class_limits=class_limits,
+    )
+    worker.publisher = FakePublisher()
+    worker.queues = {c: None for c in PriorityClass}
+    worker.register("tags", handler, None)
+    return worker
+
+
+async def test_duplicate_joins_the_running_request():
+    release = asyncio.Event()
+    calls = 0
+
+    async def on_tags(context: Context):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        await context.success(Tags(tags=["cat"]))
+
+    worker = make_worker(on_tags)
+    headers = {METHOD_HEADER: "tags", FLIGHT_HEADER: "key"}
+    first = asyncio.create_task(worker.on_message(make_message(b"", headers, "a.1")))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(worker.on_message(make_message(b"", headers, "b.1")))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, second)
+
+    assert calls == 1
+    replies = worker.publisher.messages
+    assert sorted(r.correlation_id for r in replies) == ["a.1", "b.1"]
+    assert {r.type for r in replies} == {MessageType.SUCCESS.value}
+    assert {r.body for r in replies} == {b'{"tags":["cat"]}'}
+    assert worker.stats[PriorityClass.DEFAULT].joined == 1
+    assert worker.flights == {}
+
+
+async def test_slots_bound_the_handlers_of_a_class():
+    running = 0
+    most = 0
+
+    async def on_tags(context: Context):
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        await context.success(Tags(tags=[]))
+
+    worker = make_worker(on_tags, prefetch_count=2)
+    headers = {METHOD_HEADER: "tags"}
+    await asyncio.gather(
+        *[worker.on_message(make_message(b"", headers, f"a.{i}")) for i in range(5)]
+    )
+
+    assert most == 2
+    assert len(worker.publisher.messages) == 5
+
+
+async def test_prefetch_count_bounds_all_classes_together():
+    running = 0
+    most = 0
+
+    async def on_tags(context: Context):
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        await context.success(Tags(tags=[]))
+
+    async def most_running(worker: Worker) -> int:
+        nonlocal most
+        most = 0
+        headers = {METHOD_HEADER: "tags"}
+        await asyncio.gather(
+            *[
+                worker.on_message(make_message(b"", headers, f"{c.value}.1"), c)
+                for c in PriorityClass
+            ]
+        )
+        return most
+
+    assert await most_running(make_worker(on_tags)) == 1
+    # the interactive class has a handler of its own
+    limits = {PriorityClass.INTERACTIVE: 1}
+    assert await most_running(make_worker(on_tags, class_limits=limits)) == 2
@@ -0,0 +1,47 @@
+import base64
+
+import pytest
+from pydantic import BaseModel, ValidationError
+
+from app.utils.dataurl import DataURL
+
+
+class File(BaseModel):
+    file: DataURL
+
+
+def test_valid_payload_is_decoded_on_access():
+    data = b"\x89PNG" * 100
+    url = "data:image/png;base64," + base64.b64encode(data).decode()
+
+    file = File(file=url).file
+
+    assert file._data is None
+    assert file.mimetype == "image/png"
+    assert file.data == data
+    assert b"".join(file.iter_data(chunk_size=8)) == data
+
+
+def test_wrapped_payload_is_valid():
+    encoded = base64.encodebytes(b"x" * 100).decode()  # lines of 76
+
+    assert File(file="data:text/plain;base64," + encoded).file.data == b"x" * 100
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "image/png;base64,AAAA",  # no scheme
+        "data:image/png;base64",  # no payload separator
+        "data:image/png;base64,AA!A",  # not the base64 alphabet
+        "data:image/png;base64,AAAAA",  # truncated
+        "data:image/png;base64,AA==AA",  # padding inside
+    ],
+)
+def test_malformed_payload_fails_validation(url):
+    with pytest.raises(ValidationError):
+        File(file=url)
+
+
+def test_plain_payload_is_not_checked_as_base64():
+    assert File(file="data:text/plain,hello%20world").file.data == "hello world"
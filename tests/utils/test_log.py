@@ -0,0 +1,90 @@
+import logging
+import queue
+
+import pytest
+
+from app.utils import log
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(log, "time", clock)
+    return clock
+
+
+def record(level: int = logging.INFO, msg: str = "%s", *args) -> logging.LogRecord:
+    return logging.makeLogRecord(
+        {
+            "levelno": level,
+            "levelname": logging.getLevelName(level),
+            "msg": msg,
+            "args": args,
+        }
+    )
+
+
+def test_throttle_refills_tokens_at_rate(clock):
+    throttle = log.ThrottleFilter(rate=2, burst=2)
+
+    assert [throttle.filter(record()) for _ in range(3)] == [True, True, False]
+    clock.now += 0.5  # one token back
+    emitted = record()
+    assert throttle.filter(emitted)
+    assert emitted.dropped == 1
+    assert not throttle.filter(record())
+
+
+def test_throttle_lets_warnings_through(clock):
+    throttle = log.ThrottleFilter(rate=1, burst=1)
+    throttle.filter(record())
+
+    assert not throttle.filter(record())
+    assert throttle.filter(record(logging.WARNING))
+
+
+def test_throttle_sample_drops_everything_at_zero(clock):
+    throttle = log.ThrottleFilter(sample=0.0)
+
+    assert not any(throttle.filter(record()) for _ in range(10))
+    assert throttle.dropped == 10
+
+
+def test_mutable_args_are_formatted_when_queued():
+    handler = log.AsyncQueueHandler(queue.SimpleQueue())
+    items = [1]
+
+    prepared = handler.prepare(record(logging.INFO, "%s", items))
+    items.append(2)
+
+    assert prepared.args is None
+    assert prepared.getMessage() == "[1]"
+
+
+def test_immutable_args_are_left_to_the_listener():
+    handler = log.AsyncQueueHandler(queue.SimpleQueue())
+
+    prepared = handler.prepare(record(logging.INFO, "%s %d", "a", 1))
+
+    assert prepared.args == ("a", 1)
+    assert prepared.getMessage() == "a 1"
+
+
+def test_lazy_is_called_when_queued():
+    handler = log.AsyncQueueHandler(queue.SimpleQueue())
+    state = {"value": 1}
+
+    prepared = handler.prepare(
+        record(logging.INFO, "%s", log.Lazy(lambda: state["value"]))
+    )
+    state["value"] = 2
+
+    assert prepared.getMessage() == "1"
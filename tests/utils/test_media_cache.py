@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from app.utils.config import MediaCacheConfig
+from app.utils.media_cache import URLS_DIR, MediaCache
+
+
+@pytest.fixture
+def cache(tmp_path) -> MediaCache:
+    return MediaCache(MediaCacheConfig(path=str(tmp_path / "cache"), max_bytes=250))
+
+
+@pytest.fixture
+def make_file(tmp_path):
+    def make(name: str, size: int = 100) -> str:
+        path = tmp_path / name
+        path.write_bytes(name.encode().ljust(size, b"\0"))
+        return str(path)
+
+    return make
+
+
+async def put(cache: MediaCache, filepath: str, url: str, mtime: int):
+    cached = await cache.put(filepath, url=url)
+    # mtime resolution of the filesystem is too coarse for the LRU order
+    os.utime(cached.filepath, (mtime, mtime))
+    return cached
+
+
+async def test_evicts_least_recently_used_with_url_entries(cache, make_file):
+    first = await put(cache, make_file("first"), "https://a/first", 1)
+    second = await put(cache, make_file("second"), "https://a/second", 2)
+    third = await put(cache, make_file("third"), "https://a/third", 3)
+
+    assert await cache.get(first.sha256) is None
+    assert await cache.get(second.sha256) is not None
+    assert await cache.get(third.sha256) is not None
+    assert sorted(os.listdir(os.path.join(cache._path, URLS_DIR))) == sorted(
+        os.path.basename(cache._url_path(url))
+        for url in ("https://a/second", "https://a/third")
+    )
+    assert cache._size == 200
+
+
+async def test_put_keeps_a_running_size(cache, make_file, monkeypatch):
+    await cache.put(make_file("first"))
+    scans = []
+    scan_blobs = cache._scan_blobs
+    monkeypatch.setattr(cache, "_scan_blobs", lambda: scans.append(1) or scan_blobs())
+
+    await cache.put(make_file("second"))
+    await cache.put(make_file("second"))  # already cached, adds nothing
+
+    assert scans == []
+    assert cache._size == 200
+
+
+async def test_get_url_drops_entry_of_missing_blob(cache, make_file):
+    cached = await cache.put(make_file("first"), url="https://a/first")
+    os.remove(cached.filepath)
+
+    assert await cache.get_url("https://a/first") is None
+    assert not os.path.exists(cache._url_path("https://a/first"))
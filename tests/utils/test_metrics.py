@@ -0,0 +1,17 @@
+import socket
+
+from app.utils import metrics
+from app.utils.config import MetricsConfig
+
+
+def test_port_clash_does_not_stop_the_service(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "_started", False)
+    with socket.socket() as taken:
+        taken.bind(("", 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+
+        metrics.start(MetricsConfig(port=port))
+
+    assert not metrics._started
+    assert f"Metrics are not served on port {port}" in caplog.text
@@ -0,0 +1,103 @@
+import asyncio
+
+import aiohttp
+import pytest
+from botocore.exceptions import ClientError
+
+from app.utils.s3 import S3Client
+
+
+class FakeClient:
+    """Part 2 fails while the others are still uploading"""
+
+    def __init__(self):
+        self.uploading: set[int] = set()
+        self.uploading_on_abort: set[int] | None = None
+
+    async def create_multipart_upload(self, **kwargs) -> dict:
+        return {"UploadId": "upload"}
+
+    async def upload_part(self, PartNumber: int, **kwargs) -> dict:
+        self.uploading.add(PartNumber)
+        try:
+            if PartNumber == 2:
+                await asyncio.sleep(0.01)
+                raise ClientError({"Error": {"Code": "500"}}, "UploadPart")
+            await asyncio.sleep(1)
+            return {"ETag": f"etag-{PartNumber}"}
+        finally:
+            self.uploading.discard(PartNumber)
+
+    async def complete_multipart_upload(self, **kwargs) -> dict:
+        raise AssertionError("a failed upload is not completed")
+
+    async def abort_multipart_upload(self, **kwargs):
+        self.uploading_on_abort = set(self.uploading)
+
+
+async def test_failed_part_cancels_the_others_before_abort(tmp_path):
+    filepath = tmp_path / "file"
+    filepath.write_bytes(b"\0" * 40)
+    s3 = S3Client("key", "secret", "http://s3", part_size=10, max_concurrency=4)
+    s3._client = client = FakeClient()
+
+    with pytest.raises(ClientError):
+        await s3._upload_multipart("bucket", "key", str(filepath), 40)
+
+    assert client.uploading_on_abort == set()
+
+
+class FakeBody:
+    """Streams one chunk and then fails or hangs"""
+
+    def __init__(self, error: BaseException | None):
+        self.error = error
+        self.chunks = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def read(self, size: int) -> bytes:
+        self.chunks += 1
+        if self.chunks == 1:
+            return b"\0" * size
+        if self.error:
+            raise self.error
+        await asyncio.sleep(10)
+
+
+class FakeGetClient:
+    def __init__(self, body: FakeBody):
+        self.body = body
+
+    async def get_object(self, **kwargs) -> dict:
+        return {"Body": self.body}
+
+
+@pytest.mark.parametrize(
+    "error", [aiohttp.ClientPayloadError("truncated"), asyncio.TimeoutError()]
+)
+async def test_failed_download_removes_the_partial_file(tmp_path, error):
+    s3 = S3Client("key", "secret", "http://s3")
+    s3._client = FakeGetClient(FakeBody(error))
+
+    assert await s3.download("bucket", "file.bin", folder=str(tmp_path)) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_cancelled_download_removes_the_partial_file(tmp_path):
+    s3 = S3Client("key", "secret", "http://s3")
+    s3._client = FakeGetClient(FakeBody(None))
+
+    download = asyncio.create_task(
+        s3.download("bucket", "file.bin", folder=str(tmp_path))
+    )
+    await asyncio.sleep(0.05)
+    assert len(list(tmp_path.iterdir())) == 1
+    download.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await download
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,102 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import tracing
+from app.utils.fastapi.tracing import register_tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.spans: list[tracing.Span] = []
+
+    def export(self, span: tracing.Span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def exporter(monkeypatch) -> MemoryExporter:
+    exporter = MemoryExporter()
+    monkeypatch.setattr(tracing, "_exporter", exporter)
+    monkeypatch.setattr(tracing, "_sample_rate", 1.0)
+    return exporter
+
+
+def test_injected_context_continues_the_trace(exporter):
+    headers = {}
+    with tracing.span("call") as sender:
+        tracing.inject(headers)
+
+    with tracing.span("handle", parent=tracing.extract(headers)) as receiver:
+        pass
+
+    assert (
+        headers[tracing.TRACEPARENT_HEADER]
+        == f"00-{sender.trace_id}-{sender.span_id}-01"
+    )
+    assert receiver.trace_id == sender.trace_id
+    assert receiver.parent_id == sender.span_id
+    assert [s.name for s in exporter.spans] == ["call", "handle"]
+
+
+def test_nothing_is_injected_outside_a_span(exporter):
+    headers = {}
+    tracing.inject(headers)
+
+    assert headers == {}
+
+
+def test_unsampled_parent_is_not_traced(exporter):
+    parent = tracing.extract({"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-00"})
+
+    with tracing.span("handle", parent=parent) as s:
+        pass
+
+    assert not parent.sampled
+    assert not s.sampled
+    assert exporter.spans == []
+
+
+def test_extract_reads_bytes_headers():
+    parent = tracing.extract({"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-01".encode()})
+
+    assert (parent.trace_id, parent.span_id, parent.sampled) == (
+        TRACE_ID,
+        SPAN_ID,
+        True,
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        42,
+        "",
+        "garbage",
+        f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01",  # short trace id
+        f"00-{TRACE_ID.upper()}-{SPAN_ID}-01",
+        f"00-{'0' * 32}-{SPAN_ID}-01",  # all zero ids are invalid
+        f"00-{TRACE_ID}-{'0' * 16}-01",
+    ],
+)
+def test_extract_ignores_invalid_traceparent(value):
+    assert tracing.extract({"traceparent": value}) is None
+
+
+def test_unsampled_request_leaves_the_noop_span(exporter, monkeypatch):
+    monkeypatch.setattr(tracing, "_sample_rate", 0.0)
+    app = FastAPI()
+    register_tracing(app)
+
+    @app.get("/items")
+    async def items():
+        return []
+
+    assert TestClient(app).get("/items").status_code == 200
+    assert tracing._NOOP.name == "noop"
+    assert tracing._NOOP.attributes == {}
+    assert exporter.spans == []
@@ -0,0 +1,76 @@
+import pytest
+
+from app.utils import vk_client
+from app.utils.config import VkConfig
+from app.utils.media import MediaSource
+
+
+class FakeVkApi:
+    def __init__(self, responses: dict):
+        self.responses = responses
+        self.calls: list[tuple[str, dict]] = []
+
+    def method(self, method: str, values: dict | None = None, **kwargs):
+        self.calls.append((method, values))
+        return self.responses[method]
+
+
+def make_upload(user_api: bool, responses: dict) -> vk_client.Upload:
+    config = VkConfig(
+        vk_token="token",
+        user_token="token",
+        main_user_id=1,
+        main_group_id=2,
+        user_api=user_api,
+    )
+    return vk_client.Upload(config, None, FakeVkApi(responses), None, None)
+
+
+@pytest.fixture
+def uploads(monkeypatch) -> list[tuple[str, str, MediaSource]]:
+    posted = []
+
+    async def post_multipart(url: str, field: str, source: MediaSource):
+        posted.append((url, field, source))
+        return {"photo": "[]", "server": 3, "hash": "abc", "video_id": 5}
+
+    monkeypatch.setattr(vk_client, "post_multipart", post_multipart)
+    return posted
+
+
+async def test_photo_is_streamed_to_the_wall_upload_server(uploads):
+    upload = make_upload(
+        True,
+        {
+            "photos.getWallUploadServer": {"upload_url": "https://upload/photo"},
+            "photos.saveWallPhoto": [{"owner_id": -2, "id": 7, "access_key": "k"}],
+        },
+    )
+    source = MediaSource("cat.jpg", "image/jpeg", 3)
+
+    assert await upload.photo_wall_stream(source) == ["photo-2_7_k"]
+    assert uploads == [("https://upload/photo", "photo", source)]
+    method, values = upload._session_user.calls[-1]
+    assert method == "photos.saveWallPhoto"
+    assert values["server"] == 3 and values["hash"] == "abc"
+
+
+async def test_video_is_streamed_to_the_upload_url(uploads):
+    upload = make_upload(
+        True, {"video.save": {"upload_url": "https://upload/video", "owner_id": -2}}
+    )
+    source = MediaSource("cat.mp4", "video/mp4", 3)
+
+    response = await upload.video_wall_and_post_stream(source, name="cat")
+    assert response["video_id"] == 5
+    assert uploads == [("https://upload/video", "video_file", source)]
+
+
+async def test_wall_uploads_are_off_without_the_user_api(uploads):
+    upload = make_upload(False, {})
+    source = MediaSource("cat.jpg", "image/jpeg", 3)
+
+    assert await upload.photo_wall_stream(source) == []
+    assert await upload.video_wall_and_post_stream(source) == {}
+    assert uploads == []
+    assert upload._session_user.calls == []